@@ -0,0 +1,70 @@
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.*;
+
+/**
+ * Runs a compiled submission on many inputs in one JVM.
+ * Arguments: <main class> <submission classpath> <case directory> <case count> <timeout ms> <report file>
+ * Case i reads <dir>/i.in and writes <dir>/i.out and <dir>/i.err; after each case one line
+ * "<i> <ok|error|timeout> <nanoseconds>" is appended to the report file. The report is not
+ * written to stdout, which the submission can reach through FileDescriptor.out: anything that
+ * appears on stdout bypassed the per-case streams. The submission's classes are loaded by a
+ * new class loader for every case, so static state starts fresh. After a timeout the JVM exits,
+ * as the running thread cannot be stopped.
+ */
+public class EvaluationBatchRunner {
+    public static void main(String[] args) throws Exception {
+        String mainClass = args[0];
+        URL[] classpath = {new File(args[1]).toURI().toURL()};
+        Path dir = Paths.get(args[2]);
+        int count = Integer.parseInt(args[3]);
+        long timeoutMillis = Long.parseLong(args[4]);
+        PrintStream report = new PrintStream(new FileOutputStream(args[5]), true, "UTF-8");
+        ClassLoader parent = ClassLoader.getSystemClassLoader().getParent();
+
+        for (int i = 0; i < count; i++) {
+            byte[] input = Files.readAllBytes(dir.resolve(i + ".in"));
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream caseOut = new PrintStream(out, false, "UTF-8");
+            PrintStream caseErr = new PrintStream(err, true, "UTF-8");
+            Throwable[] failure = new Throwable[1];
+            URLClassLoader loader = new URLClassLoader(classpath, parent);
+            Thread thread = new Thread(() -> {
+                try {
+                    Method method = Class.forName(mainClass, true, loader).getMethod("main", String[].class);
+                    method.invoke(null, (Object) new String[0]);
+                } catch (InvocationTargetException e) {
+                    failure[0] = e.getCause();
+                } catch (Throwable e) {
+                    failure[0] = e;
+                }
+            });
+            thread.setContextClassLoader(loader);
+
+            System.setIn(new ByteArrayInputStream(input));
+            System.setOut(caseOut);
+            System.setErr(caseErr);
+            long start = System.nanoTime();
+            thread.start();
+            thread.join(timeoutMillis);
+            long elapsed = System.nanoTime() - start;
+            caseOut.flush();
+
+            String status = thread.isAlive() ? "timeout" : failure[0] != null ? "error" : "ok";
+            if (failure[0] != null) {
+                failure[0].printStackTrace(caseErr);
+            }
+            Files.write(dir.resolve(i + ".out"), out.toByteArray());
+            Files.write(dir.resolve(i + ".err"), err.toByteArray());
+            report.println(i + " " + status + " " + elapsed);
+            if (thread.isAlive()) {
+                Runtime.getRuntime().halt(1);
+            }
+            loader.close();
+        }
+        Runtime.getRuntime().halt(0);
+    }
+}
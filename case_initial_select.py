@@ -1,5 +1,4 @@
 import json
-import os
 from typing import List, Dict, Any, Optional
 import argparse
 from tqdm import tqdm
@@ -9,6 +8,9 @@ import re
 import sys
 import copy
 import collections
+from code_extraction import extract_code_from_text
+from code_lexer import has_comments, strip_comments_and_strings
+import jsonl_io
 
 change_cases = [
     ('keyword_for', ['Please revise your code to incorporate at least one for loop for iteration.', 'Kindly update your code to include a for loop as part of the implementation.', 'Could you modify your code to ensure it contains at least one for loop?', 'We recommend refactoring your code to integrate a for loop into the logic.', 'It would be appreciated if you could adjust your code to include at least one for loop.']),
@@ -45,70 +47,6 @@ basic_cases = [
     ('output_format', ['Please revise your code to ensure the output adheres to the {format} format.', 'Kindly update your code to generate output strictly in the {format} format.', 'Could you modify your code to guarantee the output conforms to the {format} format?', 'We recommend refactoring your code to produce output in the {format} format.', 'It would be appreciated if you could adjust your code to output data in the {format} format.'])
 ]
 
-def extract_code_from_text(text):
-    """
-    Extract code blocks from text and identify their programming language type
-
-    Parameters:
-        text: The text content containing code blocks
-
-    Returns:
-        A list of extracted code information, each item containing language and code
-    """
-    # Store all extracted code blocks and their language information
-    extracted_codes = []
-    
-    # Find all code blocks
-    pos = 0
-    while True:
-        # Find the start marker of a code block
-        start_marker_pos = text.find("```", pos)
-        if start_marker_pos == -1:
-            break
-            
-        # Find the language identifier, which follows ```
-        language_start = start_marker_pos + 3
-        language_end = text.find("\n", language_start)
-        if language_end == -1:
-            pos = start_marker_pos + 3
-            continue
-            
-        language = text[language_start:language_end].strip()
-        
-        # Start position of the code block content
-        code_start = language_end + 1
-        
-        # Find the end marker of the code block
-        code_end = text.find("```", code_start)
-        if code_end == -1:
-            break
-            
-        code_block = text[code_start:code_end].strip()
-
-        # Check for separator lines in the code block
-        lines = code_block.split('\n')
-        for i, line in enumerate(lines):
-            # Print debug information
-            #print(f"Debug info: '{line}'")
-            
-            # Use regex to match separator lines (composed of multiple '-')
-            if re.match(r"^-+$", line.strip()):  # Match any number of consecutive `-`
-                print(f"Found separator line: {line.strip()}")
-                # Found a separator line, keep only the content before it
-                code_block = '\n'.join(lines[:i]).strip()
-                break
-
-        # Store the code block and language information
-        extracted_codes.append({
-            "language": language,
-            "code": code_block
-        })
-                
-        # Update position to find the next code block
-        pos = code_end + 3
-        
-    return extracted_codes
-
 def check_loop(code_block, coding_language):
     if coding_language.lower() == "python":
         if "for" in code_block and "while" in code_block:
@@ -142,21 +80,8 @@ def check_if(code_block, coding_language):
     coding_language = coding_language.lower()
     
     # Remove string literals and comments to avoid false positives
-    if coding_language == "python":
-        # Remove strings and comments
-        code_no_strings = re.sub(r'"[^"]*"', '', code_block)
-        code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)
-        code_no_strings = re.sub(r'#.*$', '', code_no_strings, flags=re.MULTILINE)
-        
-        # Use word boundaries to check for actual if statements
-        return 1 if re.search(r'\bif\b', code_no_strings) else 0
-        
-    elif coding_language in ["c++", "java"]:
-        # Remove strings and comments
-        code_no_strings = re.sub(r'"[^"]*"', '', code_block)
-        code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)
-        code_no_strings = re.sub(r'//.*$', '', code_no_strings, flags=re.MULTILINE)
-        code_no_strings = re.sub(r'/\*[\s\S]*?\*/', '', code_no_strings)
+    if coding_language in ["python", "c++", "java"]:
+        code_no_strings = strip_comments_and_strings(code_block, coding_language)
         
         # Use word boundaries to check for actual if statements
         return 1 if re.search(r'\bif\b', code_no_strings) else 0
@@ -246,21 +171,8 @@ def check_built_in_function(code_block, coding_language):
         return False
 
 def check_comment(code_block, coding_language):
-    coding_language = coding_language.lower()
-    if coding_language == "python":
-        if re.search(r'(?<![\'"]).*#.*', code_block):
-            return 1
-        return 0
-    elif coding_language == "c++":
-        if re.search(r'//.*|/\*[\s\S]*?\*/', code_block):
-            return 1
-        return 0
-    elif coding_language == "java":
-        if re.search(r'//.*|/\*[\s\S]*?\*/', code_block):
-            return 1
-        return 0
-    else:
-        return 0
+    # Comment markers inside string literals do not count
+    return 1 if has_comments(code_block, coding_language) else 0
 
 def check_global_variable(code_block, coding_language):
     coding_language = coding_language.lower()
@@ -403,20 +315,12 @@ def model_responses(prompt: List[Dict[str, str]], model: str, max_tokens: int =
                 return None
 
 def load_jsonl(file_path: str) -> List[Dict[str, Any]]:
-    """Load data from a JSONL file."""
-    data = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.strip():
-                data.append(json.loads(line))
-    return data
+    """Load data from a JSONL file (.gz/.zst supported)."""
+    return jsonl_io.load_jsonl(file_path)
 
 def save_jsonl(data: List[Dict[str, Any]], file_path: str) -> None:
-    """Save data to a JSONL file."""
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for item in data:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    """Save data to a JSONL file (.gz/.zst supported)."""
+    jsonl_io.save_jsonl(data, file_path)
 
 def create_initial_prompt(item: Dict[str, Any]) -> List[Dict[str, str]]:
     """Create the initial prompt for a programming problem."""
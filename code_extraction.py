@@ -0,0 +1,95 @@
+"""
+Fenced code block extraction shared by the generation and evaluation scripts.
+
+A block starts with ``` followed by an optional language tag up to the end of the
+line, and ends at the next ```. Blocks whose opening fence has no newline after
+it are skipped, an unterminated block ends the search, and a block is cut at its
+first separator line (a line made only of '-').
+
+Usage (adds model_response_turn{N}_code / _code_languages to every record):
+    python code_extraction.py input.jsonl output.jsonl
+"""
+import argparse
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import jsonl_io
+
+_CODE_BLOCK = re.compile(r"```([^\n]*)\n(.*?)```", re.S)
+_SEPARATOR_LINE = re.compile(r"^[^\S\n]*-+[^\S\n]*$", re.M)
+_RESPONSE_KEY = re.compile(r"^model_response_turn\d+$")
+
+LANGUAGE_ALIASES = {
+    "py": "python",
+    "py3": "python",
+    "python3": "python",
+    "cpp": "c++",
+    "cc": "c++",
+    "cxx": "c++",
+}
+
+
+def normalize_language_tag(language: str) -> str:
+    """Lower-case a fence language tag and map common aliases (cpp -> c++, py -> python)."""
+    language = language.strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+@lru_cache(maxsize=4096)
+def _extract_blocks(text: str) -> Tuple[Tuple[str, str], ...]:
+    blocks = []
+    for match in _CODE_BLOCK.finditer(text):
+        code_start, code_end = match.span(2)
+        separator = _SEPARATOR_LINE.search(text, code_start, code_end)
+        if separator is not None:
+            code_end = separator.start()
+        blocks.append((normalize_language_tag(match.group(1)), text[code_start:code_end].strip()))
+    return tuple(blocks)
+
+
+def extract_code_from_text(text: str) -> List[Dict[str, str]]:
+    """
+    Extract all fenced code blocks in one scan. Results are cached per text, since the
+    same response is analysed several times (check_case, create_turn_instruction, ...).
+
+    Returns:
+        A list of {"language": ..., "code": ...} dicts in order of appearance
+    """
+    if not text:
+        return []
+    return [{"language": language, "code": code} for language, code in _extract_blocks(text)]
+
+
+def extract_code_lists(text: str) -> Tuple[List[str], List[str]]:
+    """Return the codes and languages of all blocks, in the model_response_turn{N}_code / _code_languages shape."""
+    if not text:
+        return [], []
+    blocks = _extract_blocks(text)
+    return [code for _, code in blocks], [language for language, _ in blocks]
+
+
+def add_code_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill model_response_turn{N}_code / _code_languages from every model_response_turn{N} text."""
+    for key in [key for key in record if _RESPONSE_KEY.match(key)]:
+        if f"{key}_code" not in record:
+            record[f"{key}_code"], record[f"{key}_code_languages"] = extract_code_lists(record[key] or "")
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract code blocks from model responses in a JSONL file")
+    parser.add_argument("input_file", help="Generation output JSONL file")
+    parser.add_argument("output_file", help="Output JSONL file with model_response_turn{N}_code fields")
+    args = parser.parse_args()
+
+    count = 0
+    with jsonl_io.JsonlWriter(args.output_file) as writer:
+        for record in jsonl_io.iter_jsonl(args.input_file):
+            writer.write(add_code_fields(record))
+            count += 1
+    print(f"已处理 {count} 条记录: {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
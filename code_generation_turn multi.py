@@ -12,7 +12,15 @@ import ast
 import clang.cindex
 import javalang
 import concurrent.futures # Added import
+import multiprocessing
 from functools import partial # Added import
+import time
+import contextlib
+import threading
+from conversation_store import compact_record, expand_record
+from code_extraction import extract_code_from_text
+from code_lexer import has_comments, strip_comments_and_strings
+import jsonl_io
 
 path_to_libclang = r"C:\Program Files\LLVM\bin\libclang.dll" # <--- 仔细检查并修改这里！！！
 
@@ -63,61 +71,6 @@ basic_cases = [
     ['output_format', ['Please revise your code to ensure the output adheres to the {format} format.', 'Kindly update your code to generate output strictly in the {format} format.', 'Could you modify your code to guarantee the output conforms to the {format} format?', 'We recommend refactoring your code to produce output in the {format} format.', 'It would be appreciated if you could adjust your code to output data in the {format} format.']]
 ]
 
-def extract_code_from_text(text):
-    # 用于保存所有提取的代码块及其语言信息
-    extracted_codes = []
-    
-    # 查找所有代码块
-    pos = 0
-    while True:
-        # 查找代码块开始标记
-        start_marker_pos = text.find("```", pos)
-        if start_marker_pos == -1:
-            break
-            
-        # 寻找语言标识符，它紧跟在```之后
-        language_start = start_marker_pos + 3
-        language_end = text.find("\n", language_start)
-        if language_end == -1:
-            pos = start_marker_pos + 3
-            continue
-            
-        language = text[language_start:language_end].strip()
-        
-        # 代码块内容的起始位置
-        code_start = language_end + 1
-        
-        # 寻找代码块结束标记
-        code_end = text.find("```", code_start)
-        if code_end == -1:
-            break
-            
-        code_block = text[code_start:code_end].strip()
-
-        # 检查代码块中的分隔符行
-        lines = code_block.split('\n')
-        for i, line in enumerate(lines):
-            # 打印调试信息
-            #print(f"调试信息: '{line}'")
-            
-            # 使用正则表达式匹配分隔符行（由多个'-'组成）
-            if re.match(r"^-+$", line.strip()):  # 匹配任意数量的连续 `-`
-                print(f"发现分隔符行: {line.strip()}")
-                # 找到了分隔符行，只保留之前的内容
-                code_block = '\n'.join(lines[:i]).strip()
-                break
-
-        # 保存代码块和语言信息
-        extracted_codes.append({
-            "language": language,
-            "code": code_block
-        })
-                
-        # 更新位置以查找下一个代码块
-        pos = code_end + 3
-        
-    return extracted_codes
-
 def check_loop(code_block, coding_language):
     if coding_language.lower() == "python":
         if "for" in code_block and "while" in code_block:
@@ -151,21 +104,8 @@ def check_if(code_block, coding_language):
     coding_language = coding_language.lower()
     
     # 先移除字符串字面量和注释，以避免误判
-    if coding_language == "python":
-        # 移除字符串和注释
-        code_no_strings = re.sub(r'"[^"]*"', '', code_block)
-        code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)
-        code_no_strings = re.sub(r'#.*$', '', code_no_strings, flags=re.MULTILINE)
-        
-        # 使用单词边界检查真正的 if 语句
-        return 1 if re.search(r'\bif\b', code_no_strings) else 0
-        
-    elif coding_language in ["c++", "java"]:
-        # 移除字符串和注释
-        code_no_strings = re.sub(r'"[^"]*"', '', code_block)
-        code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)
-        code_no_strings = re.sub(r'//.*$', '', code_no_strings, flags=re.MULTILINE)
-        code_no_strings = re.sub(r'/\*[\s\S]*?\*/', '', code_no_strings)
+    if coding_language in ["python", "c++", "java"]:
+        code_no_strings = strip_comments_and_strings(code_block, coding_language)
         
         # 使用单词边界检查真正的 if 语句
         return 1 if re.search(r'\bif\b', code_no_strings) else 0
@@ -180,18 +120,7 @@ def check_function(code_block, coding_language):
 
     try:
         # Preprocessing to remove comments and strings remains the same
-        if lang == "python":
-            processed_code = re.sub(r'"""[\s\S]*?"""', '', processed_code)
-            processed_code = re.sub(r"'''[\s\S]*?'''", '', processed_code)
-            processed_code = re.sub(r'"[^"]*"', '', processed_code)
-            processed_code = re.sub(r"'[^']*'", '', processed_code)
-            processed_code = re.sub(r'#.*$', '', processed_code, flags=re.MULTILINE)
-        elif lang in ["c++", "java"]:
-            processed_code = re.sub(r'/\*[\s\S]*?\*/', '', processed_code)
-            processed_code = re.sub(r'//.*$', '', processed_code, flags=re.MULTILINE)
-            processed_code = re.sub(r'"(?:\\.|[^"\\])*"', '', processed_code)
-            if lang == "java" or lang == "c++":
-                 processed_code = re.sub(r"'(?:\\.|[^'\\])'", '', processed_code)
+        processed_code = strip_comments_and_strings(code_block, lang)
     except re.error as e:
         print(f"Regex error during preprocessing for {lang}: {e}")
         return 0
@@ -293,21 +222,8 @@ def check_built_in_function(code_block, coding_language):
         return False
 
 def check_comment(code_block, coding_language):
-    coding_language = coding_language.lower()
-    if coding_language == "python":
-        if re.search(r'(?<![\'"]).*#.*', code_block):
-            return 1
-        return 0
-    elif coding_language == "c++" or coding_language == "cpp":
-        if re.search(r'//.*|/\*[\s\S]*?\*/', code_block):
-            return 1
-        return 0
-    elif coding_language == "java":
-        if re.search(r'//.*|/\*[\s\S]*?\*/', code_block):
-            return 1
-        return 0
-    else:
-        return 0
+    # 字符串中的注释符号不算注释
+    return 1 if has_comments(code_block, coding_language) else 0
 
 def check_global_variable(code_block, coding_language):
     coding_language = coding_language.lower()
@@ -345,22 +261,7 @@ def check_keyword_variable_include(code_block, coding_language, keyword):
     code_to_check = code_block
 
     try:
-        if coding_language == "python":
-            code_to_check = re.sub(r'"""[\s\S]*?"""', '', code_to_check)
-            code_to_check = re.sub(r"'''[\s\S]*?'''", '', code_to_check)
-            code_to_check = re.sub(r'"[^"]*"', '', code_to_check)
-            code_to_check = re.sub(r"'[^']*'", '', code_to_check)
-            code_to_check = re.sub(r'#.*$', '', code_to_check, flags=re.MULTILINE)
-
-        elif coding_language in ["c++", "java"]:
-            code_to_check = re.sub(r'/\*[\s\S]*?\*/', '', code_to_check)
-            code_to_check = re.sub(r'//.*$', '', code_to_check, flags=re.MULTILINE)
-            code_to_check = re.sub(r'"[^"]*"', '', code_to_check)
-            code_to_check = re.sub(r"'[^']*'", '', code_to_check) 
-
-        else:
-            # 对于不支持的语言，直接在原始代码中查找
-            pass
+        code_to_check = strip_comments_and_strings(code_block, coding_language)
 
         # 在处理过的代码中查找关键词
         if re.search(pattern, code_to_check):
@@ -728,18 +629,7 @@ def check_function_parameters(code_block, coding_language):
 
     try:
         # 移除注释和字符串，避免干扰参数列表的解析
-        code_to_check = code_block
-        if coding_language == "python":
-            code_to_check = re.sub(r'"""[\s\S]*?"""', '', code_to_check)
-            code_to_check = re.sub(r"'''[\s\S]*?'''", '', code_to_check)
-            code_to_check = re.sub(r'"[^"]*"', '', code_to_check)
-            code_to_check = re.sub(r"'[^']*'", '', code_to_check)
-            code_to_check = re.sub(r'#.*$', '', code_to_check, flags=re.MULTILINE)
-        elif coding_language in ["c++", "java"]:
-            code_to_check = re.sub(r'/\*[\s\S]*?\*/', '', code_to_check)
-            code_to_check = re.sub(r'//.*$', '', code_to_check, flags=re.MULTILINE)
-            code_to_check = re.sub(r'"[^"]*"', '', code_to_check)
-            code_to_check = re.sub(r"'[^']*'", '', code_to_check)
+        code_to_check = strip_comments_and_strings(code_block, coding_language)
 
         # 正则表达式查找函数定义和参数列表
         if coding_language == "python":
@@ -914,30 +804,169 @@ def create_problem_prompt(problem_data: Dict[str, Any]) -> str:
     prompt += "Please write code to solve this problem."
     problem_data['prompt'] = prompt
 
+# Providers that only cache prompts at explicit cache_control breakpoints when called through OpenRouter.
+# Others (OpenAI, DeepSeek, ...) cache repeated prompt prefixes automatically.
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/")
+
+def add_cache_control(prompt: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
+    """
+    Return a copy of the prompt with cache_control breakpoints on the problem statement
+    (first user message) and the newest message, so every turn re-reads the previous turn's
+    prefix from the provider cache. The conversation is append-only, so the prefix is stable.
+    """
+    if not model.startswith(CACHE_CONTROL_MODEL_PREFIXES):
+        return prompt
+    marked = [dict(message) for message in prompt]
+    user_positions = [i for i, message in enumerate(marked) if message.get("role") == "user"]
+    breakpoints = {len(marked) - 1}
+    if user_positions:
+        breakpoints.add(user_positions[0])
+    for i in breakpoints:
+        content = marked[i].get("content")
+        if isinstance(content, str):
+            marked[i]["content"] = [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]
+    return marked
+
+def new_call_stats() -> Dict[str, Any]:
+    """Per-call accounting filled in by model_responses."""
+    return {
+        "prompt_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "uncached_prompt_tokens": 0,
+        "completion_tokens": 0,
+        "ttft": None,          # seconds to first token, only known when streaming
+        "stopped_early": False,  # stream closed after the first code block (--stop_after_code)
+        "latency": None,       # seconds for the successful attempt
+        "total_time": 0.0,     # seconds including failed attempts
+        "retries": 0,
+        "errors": [],          # exception type of every failed attempt
+        "failed": False,
+    }
+
+def record_usage(response, call_stats: Dict[str, Any]) -> None:
+    """Copy token counts (prompt, cached prompt and completion) from the API response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    call_stats["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = 0
+    if details is not None:
+        cached_tokens = (details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)) or 0
+    call_stats["prompt_tokens"] = prompt_tokens
+    call_stats["cached_prompt_tokens"] = cached_tokens
+    call_stats["uncached_prompt_tokens"] = prompt_tokens - cached_tokens
+
+def has_complete_code_block(text: str) -> bool:
+    """True once the first fenced code block that extract_code_from_text would return is closed."""
+    start = text.find("```")
+    if start == -1:
+        return False
+    language_end = text.find("\n", start + 3)
+    if language_end == -1:
+        return False
+    return text.find("```", language_end + 1) != -1
+
+def stream_completion(client, model: str, messages: List[Dict[str, Any]], max_tokens: int, temperature: float,
+                      extra_body: Optional[Dict[str, Any]], stop_after_code: bool,
+                      call_stats: Optional[Dict[str, Any]], attempt_start: float) -> str:
+    """
+    Consume a streamed completion and return its text. With stop_after_code the stream is
+    closed as soon as the first complete fenced code block has arrived.
+    """
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
+        extra_body=extra_body
+    )
+    pieces = []
+    usage_chunk = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage_chunk = chunk
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            piece = getattr(delta, "content", None)
+            # Reasoning models stream their reasoning first; it counts as the first token too
+            if call_stats is not None and call_stats["ttft"] is None and (piece or getattr(delta, "reasoning", None)):
+                call_stats["ttft"] = time.perf_counter() - attempt_start
+            if not piece:
+                continue
+            pieces.append(piece)
+            # A closing fence always arrives in a piece containing a backtick, so only re-check then
+            if stop_after_code and "`" in piece and has_complete_code_block("".join(pieces)):
+                if call_stats is not None:
+                    call_stats["stopped_early"] = True
+                break
+    finally:
+        stream.close()
+    # Usage arrives in the last chunk, so it is missing when the stream is stopped early
+    if usage_chunk is not None and call_stats is not None:
+        record_usage(usage_chunk, call_stats)
+    return "".join(pieces)
+
 # Define the function to interact with OpenAI API
 def model_responses(prompt: List[Dict[str, str]], model: str, max_tokens: int = 500, 
-                    temperature: float = 0, max_retries: int = 10, api_key: str = "your_api_key") -> Optional[str]:
-    """Generate a response using OpenAI API."""
+                    temperature: float = 0, max_retries: int = 10, api_key: str = "your_api_key",
+                    prompt_cache: bool = False, call_stats: Optional[Dict[str, Any]] = None,
+                    stream: bool = False, stop_after_code: bool = False) -> Optional[str]:
+    """
+    Generate a response using OpenAI API.
+
+    prompt_cache adds cache_control breakpoints for providers that need them; if call_stats
+    is given, token usage, latency, retries and errors are recorded into it (see new_call_stats).
+    stream consumes the completion incrementally (and measures time to first token);
+    stop_after_code additionally stops it once the first complete code block has arrived.
+    """
     retries = 0
     answer = None
+    if call_stats is not None:
+        call_stats.update(new_call_stats())
+    call_start = time.perf_counter()
+    messages = add_cache_control(prompt, model) if prompt_cache else prompt
+    # Ask OpenRouter for detailed usage (including cached tokens) only when we record it
+    extra_body = {"usage": {"include": True}} if call_stats is not None else None
 
     while retries < max_retries:
+        attempt_start = time.perf_counter()
+        if call_stats is not None:
+            call_stats["ttft"] = None
         try:
             client = OpenAI(
                 base_url="https://openrouter.ai/api/v1",
                 api_key=api_key,
             )
-            response = client.chat.completions.create(
-                model=model,
-                messages=prompt,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            #print(response)
-            answer = response.choices[0].message.content
+            if stream or stop_after_code:
+                answer = stream_completion(client, model, messages, max_tokens, temperature, extra_body,
+                                           stop_after_code, call_stats, attempt_start)
+            else:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    extra_body=extra_body
+                )
+                #print(response)
+                answer = response.choices[0].message.content
+                if call_stats is not None:
+                    record_usage(response, call_stats)
+            if call_stats is not None:
+                call_stats["latency"] = time.perf_counter() - attempt_start
+                call_stats["total_time"] = time.perf_counter() - call_start
             # Skip if content is prohibited
             if answer == "PROHIBITED_CONTENT":
                 print("Skipping prohibited content")
+                if call_stats is not None:
+                    call_stats["failed"] = True
+                    call_stats["errors"].append("PROHIBITED_CONTENT")
                 return None
             #print(answer)
             return answer
@@ -945,25 +974,23 @@ def model_responses(prompt: List[Dict[str, str]], model: str, max_tokens: int =
         except Exception as e:
             print(f"调用失败: {str(e)}，将重试……")
             retries += 1
+            if call_stats is not None:
+                call_stats["retries"] = retries
+                call_stats["errors"].append(type(e).__name__)
+                call_stats["total_time"] = time.perf_counter() - call_start
             if retries >= max_retries:
                 print("达到最大重试次数，返回最后一次响应")
+                if call_stats is not None:
+                    call_stats["failed"] = True
                 return None
 
 def load_jsonl(file_path: str) -> List[Dict[str, Any]]:
-    """Load data from a JSONL file."""
-    data = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.strip():
-                data.append(json.loads(line))
-    return data
+    """Load data from a JSONL file (.gz/.zst supported, compact conversation records are expanded)."""
+    return [expand_record(record) for record in jsonl_io.iter_jsonl(file_path)]
 
 def save_jsonl(data: List[Dict[str, Any]], file_path: str) -> None:
-    """Save data to a JSONL file."""
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for item in data:
-            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    """Save data to a JSONL file (.gz/.zst supported)."""
+    jsonl_io.save_jsonl(data, file_path)
 
 def create_initial_prompt(item: Dict[str, Any]) -> List[Dict[str, str]]:
     """Create the initial prompt for a programming problem."""
@@ -1322,12 +1349,84 @@ def create_turn_instruction(available_cases: List[tuple], item: Dict[str, Any],
     
     return False
 
+@contextlib.contextmanager
+def stage_timer(timings: Dict[str, float], stage: str):
+    """Accumulate the wall time spent inside the block under timings[stage] (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def merge_stage_timings(target: Dict[str, float], source: Dict[str, float]) -> None:
+    """Add the per-stage timings in source into target."""
+    for stage, seconds in source.items():
+        target[stage] = target.get(stage, 0.0) + seconds
+
+def _init_analysis_worker():
+    """Initializer for analysis worker processes."""
+    # Reseed so workers never share a random state and pick the same templates
+    random.seed()
+
+def create_analysis_pool(workers: int) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+    """
+    Create the process pool used for CPU-bound code analysis (None means analyse inline).
+
+    Workers are started with spawn: the pool starts them on the first submit, from the
+    API threads, and forking a multithreaded process can copy locks held by other
+    threads (HTTP client, tqdm, logging) into the child and deadlock it.
+    """
+    if workers <= 0:
+        return None
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context("spawn"),
+                                                  initializer=_init_analysis_worker)
+
+def analyze_turn(last_response: str, prev_params, prev_kwargs, turn_number: int,
+                 initial_cases, available_cases=None):
+    """
+    Run check_case and create_turn_instruction for one turn.
+
+    This runs in an analysis worker process, so it only receives the fields it reads and
+    returns the fields create_turn_instruction would have written instead of mutating
+    the caller's item/result dictionaries.
+
+    Returns:
+        (end, item_updates, result_updates, stage_timings)
+    """
+    timings = {}
+    if turn_number != 1:
+        if prev_params is None or prev_kwargs is None:
+            print(f"Warning: Missing params/kwargs for turn {turn_number-1}. Cannot check case.")
+            available_cases = [] # Cannot determine available cases
+        else:
+            with stage_timer(timings, "check_case"):
+                available_cases = check_case(last_response, prev_params, prev_kwargs)
+
+    # Only the keys create_turn_instruction reads, so we don't ship the whole problem to the worker
+    item_view = {}
+    if turn_number != 1:
+        item_view[f'turn{turn_number-1}_params'] = prev_params
+        item_view[f'turn{turn_number-1}_kwargs'] = prev_kwargs
+    result_updates = {}
+    with stage_timer(timings, "turn_instruction"):
+        end = create_turn_instruction(available_cases, item_view, turn_number, last_response, result_updates, initial_cases)
+
+    item_updates = {key: item_view[key] for key in (f'turn{turn_number}_kwargs', f'turn{turn_number}_params', f'turn{turn_number}_prompt')
+                    if key in item_view}
+    return end, item_updates, result_updates, timings
+
 def process_multi_turn_conversation(item: Dict[str, Any], api_key: str,
                                    model: str, max_tokens: int,
-                                   temperature: float, max_turns: int = 10) -> Dict[str, Any]: # Modified signature to accept parameters directly
+                                   temperature: float, max_turns: int = 10,
+                                   analysis_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None,
+                                   prompt_cache: bool = False, stream: bool = False,
+                                   stop_after_code: bool = False) -> Dict[str, Any]: # Modified signature to accept parameters directly
     """Process a complete multi-turn conversation for a single item."""
     result_item = item.copy()
     conversation_history = []
+    stage_timings = {}
+    result_item["stage_timings"] = stage_timings
     # Generate the initial response
     initial_prompt = create_initial_prompt(item)
     result_item["prompt_turn0"] = initial_prompt
@@ -1337,7 +1436,12 @@ def process_multi_turn_conversation(item: Dict[str, Any], api_key: str,
     max_res_turns = max_turns
 
     try:
-        initial_response = model_responses(initial_prompt, model, max_tokens, temperature, api_key=api_key)
+        call_stats = {}
+        with stage_timer(stage_timings, "api_call"):
+            initial_response = model_responses(initial_prompt, model, max_tokens, temperature, api_key=api_key,
+                                               prompt_cache=prompt_cache, call_stats=call_stats,
+                                               stream=stream, stop_after_code=stop_after_code)
+        result_item["usage_turn0"] = call_stats
         if initial_response is None:
             # Handle the case where the initial response failed
             print(f"Warning: Initial response failed for item. Skipping further processing.")
@@ -1372,19 +1476,20 @@ def process_multi_turn_conversation(item: Dict[str, Any], api_key: str,
         initial_cases = item['case_types']
         end_turns = 0
         for turn in range(1, max_res_turns + 1):
-            if turn != 1:
-                params = item.get(f'turn{turn-1}_params') # Use .get for safety
-                kwargs = item.get(f'turn{turn-1}_kwargs') # Use .get for safety
-                if params is None or kwargs is None:
-                    print(f"Warning: Missing params/kwargs for turn {turn-1}. Cannot check case.")
-                    available_cases = [] # Cannot determine available cases
+            params = item.get(f'turn{turn-1}_params') # Use .get for safety
+            kwargs = item.get(f'turn{turn-1}_kwargs') # Use .get for safety
+
+            # check_case/create_turn_instruction are CPU-bound (AST, libclang, javalang, regex),
+            # run them in the analysis process pool so they don't hold the GIL against the API threads
+            analysis_args = (last_response, params, kwargs, turn, initial_cases, initial_cases if turn == 1 else None)
+            with stage_timer(stage_timings, "analysis_total"):
+                if analysis_pool is not None:
+                    end, item_updates, result_updates, analysis_timings = analysis_pool.submit(analyze_turn, *analysis_args).result()
                 else:
-                    available_cases = check_case(last_response, params, kwargs)
-            else:
-                available_cases = initial_cases
-
-            # Ensure create_turn_instruction handles empty available_cases gracefully if needed
-            end = create_turn_instruction(available_cases, item, turn, last_response, result_item, initial_cases)
+                    end, item_updates, result_updates, analysis_timings = analyze_turn(*analysis_args)
+            merge_stage_timings(stage_timings, analysis_timings)
+            item.update(item_updates)
+            result_item.update(result_updates)
 
             if end:
                 end_turns = turn - 1
@@ -1403,7 +1508,12 @@ def process_multi_turn_conversation(item: Dict[str, Any], api_key: str,
                 break
 
             result_item[f"prompt_turn{turn}"] = turn_prompt
-            turn_response = model_responses(turn_prompt, model, max_tokens, temperature, api_key=api_key)
+            call_stats = {}
+            with stage_timer(stage_timings, "api_call"):
+                turn_response = model_responses(turn_prompt, model, max_tokens, temperature, api_key=api_key,
+                                                prompt_cache=prompt_cache, call_stats=call_stats,
+                                                stream=stream, stop_after_code=stop_after_code)
+            result_item[f"usage_turn{turn}"] = call_stats
 
             if turn_response is None:
                 # Handle API call failure within the loop
@@ -1427,6 +1537,100 @@ def process_multi_turn_conversation(item: Dict[str, Any], api_key: str,
     result_item["conversation_history"] = conversation_history
     return result_item
 
+def print_stage_report(results: List[Dict[str, Any]], wall_time: float) -> None:
+    """Print the time spent per stage summed over all conversations."""
+    totals = {}
+    for result in results:
+        merge_stage_timings(totals, result.get("stage_timings", {}))
+    print(f"\n--- 阶段耗时 (总墙钟时间 {wall_time:.1f}s, {len(results)} 个问题) ---")
+    for stage, seconds in sorted(totals.items(), key=lambda kv: kv[1], reverse=True):
+        mean = seconds / len(results) if results else 0
+        print(f"{stage}: 累计 {seconds:.1f}s, 平均每题 {mean:.2f}s")
+    # analysis_total includes queueing in the process pool; a large gap to check_case + turn_instruction means the pool is undersized
+    queued = totals.get("analysis_total", 0.0) - totals.get("check_case", 0.0) - totals.get("turn_instruction", 0.0)
+    if "analysis_total" in totals:
+        print(f"analysis_wait (排队/进程间通信): 累计 {max(queued, 0.0):.1f}s")
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def print_usage_report(results: List[Dict[str, Any]]) -> None:
+    """Print API call latency, throughput, retries and failures, and prompt tokens per turn split into cached and uncached input."""
+    per_turn = {}
+    calls = []
+    for result in results:
+        for key, stats in result.items():
+            if not key.startswith("usage_turn") or not stats:
+                continue
+            calls.append(stats)
+            turn = int(key[len("usage_turn"):])
+            totals = per_turn.setdefault(turn, {"prompt_tokens": 0, "cached_prompt_tokens": 0})
+            totals["prompt_tokens"] += stats.get("prompt_tokens", 0)
+            totals["cached_prompt_tokens"] += stats.get("cached_prompt_tokens", 0)
+    if not per_turn:
+        return
+
+    latencies = [c["latency"] for c in calls if c.get("latency") is not None]
+    ttfts = [c["ttft"] for c in calls if c.get("ttft") is not None]
+    completion_tokens = sum(c.get("completion_tokens", 0) for c in calls)
+    failures = {}
+    for c in calls:
+        if c.get("failed"):
+            error_type = c["errors"][-1] if c.get("errors") else "unknown"
+            failures[error_type] = failures.get(error_type, 0) + 1
+    print(f"\n--- API调用统计 ({len(calls)} 次调用) ---")
+    if latencies:
+        print(f"延迟: p50 {percentile(latencies, 50):.2f}s, p95 {percentile(latencies, 95):.2f}s, 最大 {max(latencies):.2f}s")
+        print(f"输出速度: {completion_tokens / sum(latencies):.1f} tokens/s (共 {completion_tokens} 个输出token)" if sum(latencies) > 0 else "输出速度: -")
+    if ttfts:
+        print(f"首token时间: p50 {percentile(ttfts, 50):.2f}s, p95 {percentile(ttfts, 95):.2f}s")
+    stopped_early = sum(1 for c in calls if c.get("stopped_early"))
+    if stopped_early:
+        print(f"代码块完成后提前结束: {stopped_early} 次")
+    print(f"重试: {sum(c.get('retries', 0) for c in calls)} 次")
+    print(f"失败: {sum(failures.values())} 次" + (f" ({', '.join(f'{k}: {v}' for k, v in sorted(failures.items()))})" if failures else ""))
+
+    print("\n--- 输入token (缓存命中/总数) ---")
+    for turn in sorted(per_turn):
+        totals = per_turn[turn]
+        ratio = totals["cached_prompt_tokens"] / totals["prompt_tokens"] * 100 if totals["prompt_tokens"] else 0
+        print(f"第{turn}轮: {totals['cached_prompt_tokens']}/{totals['prompt_tokens']} ({ratio:.1f}%)")
+
+def write_evaluation(eval_writer, future: concurrent.futures.Future) -> None:
+    """Done callback of an evaluation: hand the result to the writer (cancelled or failed ones are skipped)."""
+    if not future.cancelled() and future.exception() is None:
+        eval_writer.add(future.result())
+
+def generate_then_evaluate(generate, eval_pool: concurrent.futures.ProcessPoolExecutor,
+                           eval_slots: threading.BoundedSemaphore, timeouts: Dict[str, float],
+                           eval_writer, indexed_item) -> tuple:
+    """
+    Run one conversation and hand it to the evaluation pool as soon as it finishes.
+    Blocks while the evaluation queue is full, which slows generation down to the
+    speed of evaluation instead of queueing an unbounded number of records.
+    The evaluation result goes to eval_writer (an EvaluationWriter) as soon as it is done.
+    Returns (result, future); future is None if the record could not be submitted, the
+    generated result is returned either way.
+    """
+    from evaluation_all_turn import evaluate_record
+
+    line_num, item = indexed_item
+    result = generate(item)
+    eval_slots.acquire()
+    question_id = str(result.get("question_id", f"question_{line_num}"))
+    try:
+        future = eval_pool.submit(evaluate_record, result, line_num, case_timeout=timeouts.get(question_id))
+    except Exception as e:
+        eval_slots.release()
+        print(f"{question_id}: 提交评估失败: {e!r}")
+        return result, None
+    future.add_done_callback(lambda _: eval_slots.release())
+    future.add_done_callback(partial(write_evaluation, eval_writer))
+    return result, future
+
 def main():
     parser = argparse.ArgumentParser(description="Process multi-turn LLM interaction for programming problems with parallelism")
     parser.add_argument("--model_name", type=str, default="deepseek/deepseek-r1",
@@ -1445,13 +1649,41 @@ def main():
                         help="API key for OpenRouter")
     parser.add_argument("--parallelism", type=int, default=8,
                         help="Number of parallel threads for processing")
-    
+    parser.add_argument("--analysis_workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Number of processes for code analysis (check_case etc.), 0 runs analysis in the API threads")
+    parser.add_argument("--prompt_cache", action="store_true",
+                        help="Add cache_control breakpoints so Anthropic/Gemini models reuse the cached conversation prefix")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream completions (records time to first token)")
+    parser.add_argument("--stop_after_code", action="store_true",
+                        help="Stream and stop each completion once the first complete ``` code block has arrived (implies --stream)")
+    parser.add_argument("--compact_output", action="store_true",
+                        help="Store each conversation message once and reference it by index per turn (see conversation_store.py)")
+    parser.add_argument("--evaluate_output", type=str, default=None,
+                        help="Evaluate each conversation as soon as it finishes and write each evaluation result here when it is done (same format as evaluation_all_turn.py)")
+    parser.add_argument("--eval_workers", type=int, default=2,
+                        help="Number of evaluation processes for --evaluate_output")
+    parser.add_argument("--eval_max_pending", type=int, default=0,
+                        help="Maximum finished conversations waiting for evaluation before generation blocks (0 = 2 x eval_workers)")
+    parser.add_argument("--eval_timeouts_file", type=str, default=None,
+                        help="Per-problem timeouts for --evaluate_output (default: <input_file>.timeouts.json if it exists)")
+    parser.add_argument("--eval_results_db", type=str, default=None,
+                        help="Also write the --evaluate_output results to this SQLite database (see results_store.py)")
+    parser.add_argument("--eval_test_case_store", type=str, default=None,
+                        help="Test case directory written by test_case_store.py, used by --evaluate_output")
+    parser.add_argument("--eval_fail_fast", action="store_true",
+                        help="Stop running a submission's test cases after the first failure (--evaluate_output)")
+    parser.add_argument("--eval_time_budget", type=float, default=0,
+                        help="Total seconds for one submission's test cases, 0 = no limit (--evaluate_output)")
+
     args = parser.parse_args()
 
     print(f"从 {args.input_file} 加载数据")
     data = load_jsonl(args.input_file)
 
-    print(f"为 {len(data)} 个问题生成多轮回复 (并行度: {args.parallelism})")
+    print(f"为 {len(data)} 个问题生成多轮回复 (并行度: {args.parallelism}, 分析进程数: {args.analysis_workers})")
+
+    analysis_pool = create_analysis_pool(args.analysis_workers)
 
     # Use functools.partial to pre-fill arguments for the worker function
     worker_func = partial(process_multi_turn_conversation,
@@ -1459,17 +1691,64 @@ def main():
                           model=args.model_name,
                           max_tokens=args.max_tokens,
                           temperature=args.temperature,
-                          max_turns=args.max_turns)
+                          max_turns=args.max_turns,
+                          analysis_pool=analysis_pool,
+                          prompt_cache=args.prompt_cache,
+                          stream=args.stream,
+                          stop_after_code=args.stop_after_code)
+
+    eval_pool = None
+    eval_writer = None
+    eval_futures = []
+    if args.evaluate_output:
+        # Imported only here: the evaluator needs psutil and the language runners, plain generation does not
+        import evaluation_all_turn
+        timeouts = evaluation_all_turn.load_timeouts(args.eval_timeouts_file or evaluation_all_turn.default_timeouts_file(args.input_file))
+        eval_pool = evaluation_all_turn.create_evaluation_pool(args.eval_workers, args.eval_fail_fast, args.eval_time_budget,
+                                                               args.eval_test_case_store)
+        eval_writer = evaluation_all_turn.EvaluationWriter(args.evaluate_output, args.eval_results_db)
+        eval_slots = threading.BoundedSemaphore(args.eval_max_pending or 2 * args.eval_workers)
+        print(f"生成与评估流水线: 评估进程数 {args.eval_workers}, 最多 {args.eval_max_pending or 2 * args.eval_workers} 个待评估")
+        worker_func = partial(generate_then_evaluate, worker_func, eval_pool, eval_slots, timeouts, eval_writer)
+        items = list(enumerate(data))
+    else:
+        items = data
 
     results = []
-    # Use ThreadPoolExecutor for I/O-bound tasks like API calls
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.parallelism) as executor:
-        # Use executor.map to apply the function in parallel
-        results_iterator = executor.map(worker_func, data)
-        results = list(tqdm(results_iterator, total=len(data), desc="处理问题", unit="问题"))
-
-    print(f"保存结果到 {args.output_file}")
-    save_jsonl(results, args.output_file)
+    start_time = time.perf_counter()
+    try:
+        # Use ThreadPoolExecutor for I/O-bound tasks like API calls
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.parallelism) as executor:
+            # Use executor.map to apply the function in parallel
+            results_iterator = executor.map(worker_func, items)
+            results = list(tqdm(results_iterator, total=len(data), desc="处理问题", unit="问题"))
+        if eval_pool is not None:
+            results, eval_futures = [r for r, _ in results], [f for _, f in results if f is not None]
+        # Save the generation output before waiting for evaluations, so an evaluation failure cannot lose it
+        print(f"保存结果到 {args.output_file}")
+        save_jsonl([compact_record(result) for result in results] if args.compact_output else results, args.output_file)
+        if eval_pool is not None:
+            generation_time = time.perf_counter() - start_time
+            # Each result is already written by write_evaluation when its evaluation finishes
+            for future in tqdm(concurrent.futures.as_completed(eval_futures), total=len(eval_futures),
+                               desc="等待评估完成", unit="问题"):
+                if future.exception() is not None:
+                    print(f"评估失败: {future.exception()!r}")
+            print(f"生成结束后等待评估 {time.perf_counter() - start_time - generation_time:.1f}s")
+    finally:
+        if analysis_pool is not None:
+            analysis_pool.shutdown()
+        if eval_pool is not None:
+            eval_pool.shutdown(cancel_futures=True)
+        if eval_writer is not None:
+            try:
+                eval_writer.close()
+            except Exception as e:
+                print(f"写入评估结果失败: {e!r}")
+    print_stage_report(results, time.perf_counter() - start_time)
+    print_usage_report(results)
+    if eval_pool is not None:
+        evaluation_all_turn.print_evaluation_summary(args.evaluate_output, evaluation_all_turn.summarize_results(eval_writer.results))
     print("完成!")
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+"""
+Single-pass comment/string scanner shared by the constraint checks.
+
+`lex(code, language)` finds the comments, string literals and (for Python)
+docstrings of a source once and caches the result, so every check of the same
+response reuses it instead of running its own chain of regular expressions.
+Python is scanned with `tokenize`; C++ and Java with a small state machine that
+understands escapes, character literals, C++ raw strings and digit separators,
+and Java text blocks. Sources that `tokenize` rejects fall back to the same
+state machine with Python's quoting rules.
+"""
+import ast
+import inspect
+import re
+import tokenize
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+Span = Tuple[int, int]
+
+_FSTRING_START = getattr(tokenize, "FSTRING_START", None)
+_FSTRING_END = getattr(tokenize, "FSTRING_END", None)
+# Python line endings: "\r\n", "\r" or "\n" (not the other str.splitlines separators)
+_PYTHON_LINE = re.compile(r"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+")
+_TRIPLE_QUOTED = re.compile(r"^[rRbBuUfF]{0,2}(\"{3}|'{3})")
+
+_LANGUAGES = {
+    "python": "python",
+    "py": "python",
+    "python3": "python",
+    "c++": "c++",
+    "cpp": "c++",
+    "c": "c++",
+    "java": "java",
+}
+
+
+class LexedSource(NamedTuple):
+    comments: Tuple[Span, ...]      # (start, end) offsets of every comment
+    strings: Tuple[Span, ...]       # string and character literals (docstrings included)
+    docstrings: Tuple[Span, ...]    # Python module/class/function docstrings with non-empty text
+    without_comments: str           # source with comments removed
+    code_only: str                  # source with comments and string literals removed
+
+
+def normalize_lexer_language(language: str) -> Optional[str]:
+    """Return "python", "c++" or "java", or None for languages the lexer does not handle."""
+    return _LANGUAGES.get((language or "").strip().lower())
+
+
+def _remove_spans(code: str, spans) -> str:
+    parts = []
+    position = 0
+    for start, end in spans:
+        parts.append(code[position:start])
+        position = end
+    parts.append(code[position:])
+    return "".join(parts)
+
+
+def _scan_c_family(code: str, java: bool) -> Tuple[List[Span], List[Span]]:
+    comments, strings = [], []
+    i, n = 0, len(code)
+    while i < n:
+        c = code[i]
+        if c == '/' and code.startswith('//', i):
+            end = code.find('\n', i)
+            end = n if end == -1 else end
+            comments.append((i, end))
+            i = end
+        elif c == '/' and code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            comments.append((i, end))
+            i = end
+        elif java and code.startswith('"""', i):
+            end = code.find('"""', i + 3)
+            end = n if end == -1 else end + 3
+            strings.append((i, end))
+            i = end
+        elif not java and c == '"' and _is_raw_string_prefix(code, i):
+            # C++ raw string R"delim( ... )delim"
+            paren = code.find('(', i)
+            end = -1 if paren == -1 else code.find(')' + code[i + 1:paren] + '"', paren)
+            end = n if end == -1 else end + paren - i + 1
+            strings.append((i - 1, end))
+            i = end
+        elif c == '"' or c == "'":
+            if c == "'" and not java and _is_digit_separator(code, i):
+                i += 1
+                continue
+            j = i + 1
+            while j < n and code[j] != c and code[j] != '\n':
+                j += 2 if code[j] == '\\' else 1
+            # An unterminated literal ends at the end of its line
+            end = j + 1 if j < n and code[j] == c else min(j, n)
+            strings.append((i, end))
+            i = end
+        else:
+            i += 1
+    return comments, strings
+
+
+def _is_raw_string_prefix(code: str, i: int) -> bool:
+    # R"...", LR"...", uR"...", UR"...", u8R"..."
+    if i == 0 or code[i - 1] != 'R':
+        return False
+    prefix_start = i - 1
+    while prefix_start > 0 and code[prefix_start - 1] in "LuU8":
+        prefix_start -= 1
+    return prefix_start == 0 or not (code[prefix_start - 1].isalnum() or code[prefix_start - 1] == '_')
+
+
+def _is_digit_separator(code: str, i: int) -> bool:
+    # C++14 1'000'000: the quote continues a token that starts with a digit
+    j = i - 1
+    while j >= 0 and (code[j].isalnum() or code[j] in "_'"):
+        j -= 1
+    return j + 1 < i and code[j + 1].isdigit()
+
+
+def _scan_python_fallback(code: str) -> Tuple[List[Span], List[Span]]:
+    comments, strings = [], []
+    i, n = 0, len(code)
+    while i < n:
+        c = code[i]
+        if c == '#':
+            end = i
+            while end < n and code[end] not in '\r\n':
+                end += 1
+            comments.append((i, end))
+            i = end
+        elif c == '"' or c == "'":
+            quote = code[i:i + 3] if code[i:i + 3] in ('"""', "'''") else c
+            j = i + len(quote)
+            while j < n and not code.startswith(quote, j) and (len(quote) == 3 or code[j] not in '\r\n'):
+                j += 2 if code[j] == '\\' else 1
+            end = j + len(quote) if code.startswith(quote, j) else min(j, n)
+            strings.append((i, end))
+            i = end
+        else:
+            i += 1
+    return comments, strings
+
+
+def _opens_definition(tokens) -> bool:
+    names = [token.string for token in tokens[:2]]
+    return names[0] in ("def", "class") or names == ["async", "def"]
+
+
+def _inline_docstring(tokens):
+    """The docstring of a one-line definition such as `def f(): "doc"`, or None."""
+    if not _opens_definition(tokens):
+        return None
+    depth = 0
+    for index, token in enumerate(tokens):
+        if token.type != tokenize.OP:
+            continue
+        if token.string in "([{":
+            depth += 1
+        elif token.string in ")]}":
+            depth -= 1
+        elif token.string == ":" and depth == 0:
+            # The header ends here; the body must start with a lone string
+            body = tokens[index + 1:index + 3]
+            if (body and body[0].type == tokenize.STRING
+                    and (len(body) == 1 or (body[1].type == tokenize.OP and body[1].string == ";"))):
+                return body[0]
+            return None
+    return None
+
+
+def _scan_python(code: str) -> Tuple[List[Span], List[Span], List[Span]]:
+    # Offsets of the lines exactly as tokenize reads them. Lines end like they do
+    # for the compiler (unlike str.splitlines); a lone "\r" is passed on as "\n",
+    # which tokenize understands and which keeps every offset unchanged
+    line_starts = [0]
+    lines = (match.group() for match in _PYTHON_LINE.finditer(code))
+
+    def readline():
+        line = next(lines, "")
+        if line:
+            line_starts.append(line_starts[-1] + len(line))
+            if line.endswith("\r"):
+                line = line[:-1] + "\n"
+        return line
+
+    def offset(position):
+        row, col = position
+        return line_starts[row - 1] + col
+
+    comments, strings, docstrings = [], [], []
+    fstring_start, fstring_depth = None, 0
+    # Docstrings are strings forming the first statement of the module, or of the
+    # block opened by a `def` / `class` line
+    statement_tokens = []
+    previous_statement = None
+    block_opened = True  # start of the module
+    for token in tokenize.generate_tokens(readline):
+        if token.type == _FSTRING_START:
+            # Python 3.12+ splits f-strings into several tokens; keep the whole literal as one string
+            if fstring_depth == 0:
+                fstring_start = offset(token.start)
+            fstring_depth += 1
+        elif token.type == _FSTRING_END:
+            fstring_depth -= 1
+            if fstring_depth == 0:
+                strings.append((fstring_start, offset(token.end)))
+        elif fstring_depth:
+            pass
+        elif token.type == tokenize.COMMENT:
+            comments.append((offset(token.start), offset(token.end)))
+        elif token.type == tokenize.STRING:
+            strings.append((offset(token.start), offset(token.end)))
+        if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+            if statement_tokens:
+                if block_opened and len(statement_tokens) == 1 and statement_tokens[0].type == tokenize.STRING:
+                    docstring = statement_tokens[0]
+                else:
+                    docstring = _inline_docstring(statement_tokens)
+                if docstring is not None and _docstring_text(docstring.string):
+                    docstrings.append((offset(docstring.start), offset(docstring.end)))
+                previous_statement = statement_tokens
+                block_opened = False
+                statement_tokens = []
+        elif token.type == tokenize.INDENT:
+            block_opened = bool(previous_statement) and _opens_definition(previous_statement)
+        elif token.type not in (tokenize.NL, tokenize.COMMENT, tokenize.DEDENT, tokenize.ENCODING):
+            statement_tokens.append(token)
+    return comments, strings, docstrings
+
+
+def _docstring_text(literal: str) -> str:
+    try:
+        value = ast.literal_eval(literal)
+    except (ValueError, SyntaxError):
+        return ""
+    return inspect.cleandoc(value) if isinstance(value, str) else ""
+
+
+@lru_cache(maxsize=1024)
+def lex(code: str, language: str) -> Optional[LexedSource]:
+    """Scan a source once. Returns None for languages the lexer does not handle."""
+    language = normalize_lexer_language(language)
+    if language is None:
+        return None
+    docstrings = []
+    if language == "python":
+        try:
+            comments, strings, docstrings = _scan_python(code)
+        except (tokenize.TokenError, SyntaxError):
+            comments, strings = _scan_python_fallback(code)
+            # Without tokens, count every triple-quoted string that starts a line as a docstring
+            docstrings = [(start, end) for start, end in strings
+                          if _TRIPLE_QUOTED.match(code[start:end])
+                          and not code[code.rfind('\n', 0, start) + 1:start].strip()]
+    else:
+        comments, strings = _scan_c_family(code, java=(language == "java"))
+    return LexedSource(
+        comments=tuple(comments),
+        strings=tuple(strings),
+        docstrings=tuple(docstrings),
+        without_comments=_remove_spans(code, comments),
+        code_only=_remove_spans(code, sorted(comments + strings)),
+    )
+
+
+def has_comments(code: str, language: str, include_docstrings: bool = False) -> bool:
+    """True if the source has a comment (or, with include_docstrings, a Python docstring)."""
+    lexed = lex(code, language)
+    if lexed is None:
+        return False
+    return bool(lexed.comments) or (include_docstrings and bool(lexed.docstrings))
+
+
+def strip_comments_and_strings(code: str, language: str) -> str:
+    """The source with comments and string literals removed (unchanged for unsupported languages)."""
+    lexed = lex(code, language)
+    return code if lexed is None else lexed.code_only
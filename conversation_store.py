@@ -0,0 +1,111 @@
+"""
+Compact storage for multi-turn conversation records.
+
+The generation scripts store every turn's prompt (`prompt_turn{N}`) as the full
+message list sent to the model, plus the whole `conversation_history`. Every
+prompt is a prefix of the history, so a record holds O(turns^2) copies of the
+problem statement and of each earlier model response.
+
+A compact record keeps each distinct message once in `messages` and replaces
+every message list with a list of indices into it (`message_refs`). The
+`model_response_turn{N}` fields and all other keys are left untouched, so the
+evaluation scripts can read compact records as they are; `expand_record`
+rebuilds the legacy shape when the prompts themselves are needed.
+
+Usage:
+    python conversation_store.py --compact input.jsonl output.jsonl
+    python conversation_store.py --expand input.jsonl output.jsonl
+"""
+import argparse
+import json
+import re
+from typing import Any, Dict, List
+
+import jsonl_io
+
+COMPACT_FORMAT = "compact_v1"
+
+# Keys whose values are message lists ([{"role": ..., "content": ...}, ...])
+_MESSAGE_LIST_KEY = re.compile(r"^(prompt_turn\d+|conversation_history)$")
+
+
+def is_compact_record(record: Dict[str, Any]) -> bool:
+    """Return True if the record was written by compact_record."""
+    return record.get("conversation_format") == COMPACT_FORMAT
+
+
+def _is_message_list(value: Any) -> bool:
+    return isinstance(value, list) and all(
+        isinstance(message, dict) and "role" in message and "content" in message for message in value
+    )
+
+
+def compact_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a copy of the record with every message list replaced by indices into a
+    shared `messages` table. Records that are already compact are returned unchanged.
+    """
+    if is_compact_record(record):
+        return record
+
+    messages: List[Dict[str, Any]] = []
+    message_index: Dict[str, int] = {}
+    message_refs: Dict[str, List[int]] = {}
+    compact = {}
+
+    for key, value in record.items():
+        if not (_MESSAGE_LIST_KEY.match(key) and _is_message_list(value)):
+            compact[key] = value
+            continue
+        refs = []
+        for message in value:
+            # Identical messages (same role, content and any extra fields) share one entry
+            message_key = json.dumps(message, ensure_ascii=False, sort_keys=True)
+            if message_key not in message_index:
+                message_index[message_key] = len(messages)
+                messages.append(message)
+            refs.append(message_index[message_key])
+        message_refs[key] = refs
+
+    compact["conversation_format"] = COMPACT_FORMAT
+    compact["messages"] = messages
+    compact["message_refs"] = message_refs
+    return compact
+
+
+def expand_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuild the legacy record shape (full `prompt_turn{N}` lists and
+    `conversation_history`) from a compact record. Legacy records are returned unchanged.
+    """
+    if not is_compact_record(record):
+        return record
+
+    messages = record["messages"]
+    expanded = {key: value for key, value in record.items()
+                if key not in ("conversation_format", "messages", "message_refs")}
+    for key, refs in record["message_refs"].items():
+        expanded[key] = [dict(messages[i]) for i in refs]
+    return expanded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert conversation JSONL files between the legacy and compact formats")
+    direction = parser.add_mutually_exclusive_group(required=True)
+    direction.add_argument("--compact", action="store_true", help="Write compact records")
+    direction.add_argument("--expand", action="store_true", help="Write legacy (expanded) records")
+    parser.add_argument("input_file", help="Input JSONL file")
+    parser.add_argument("output_file", help="Output JSONL file")
+    args = parser.parse_args()
+
+    convert = compact_record if args.compact else expand_record
+    count = 0
+    with jsonl_io.JsonlWriter(args.output_file) as writer:
+        for record in jsonl_io.iter_jsonl(args.input_file):
+            writer.write(convert(record))
+            count += 1
+    print(f"已转换 {count} 条记录: {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,122 +6,115 @@ import psutil
 import contextlib
 import argparse
 import json
-import ast
 from typing import Dict, Any, List, Union
 import multiprocessing
-import os
 import signal
 import threading
 import gc
+import functools
+from output_compare import OutputMismatch, StreamingMatcher, normalize_output, smart_compare
+import python_zygote
+from python_bytecode import CompiledSubmission, compile_submission
+from worker_pool import ManagedPool, reap_descendants
+from test_case_runner import run_test_cases_sequential
 
 
-# 全局进程池
-_process_pool = None
+# 每个测试用例的运行超时（秒），可通过命令行参数--timeout修改
+CASE_TIMEOUT = 10
+
+# 进程池的工作进程执行这么多个测试用例后被替换，避免提交的代码留下的状态（修改的模块、泄漏的内存）累积
+MAX_TASKS_PER_CHILD = 20
+
+# 全局进程池：跨多次evaluate_code调用复用，超时后替换（见worker_pool.py）
+_worker_pool = ManagedPool(processes=max(2, min(4, multiprocessing.cpu_count())), maxtasksperchild=MAX_TASKS_PER_CHILD)
+
+# 全局zygote（--zygote时使用，代替进程池）
+_zygote = None
 
 
 def get_process_pool():
-    """获取或创建全局进程池"""
-    global _process_pool
-    if _process_pool is None:
-        # 创建进程池，使用最少2个进程，最多CPU数量的进程
-        _process_pool = multiprocessing.Pool(processes=max(2, min(4, multiprocessing.cpu_count())))
-    return _process_pool
+    """获取全局进程池（第一次使用时创建，有测试用例超时后替换为新的进程池）"""
+    return _worker_pool.get()
+
+
+def _new_capture(expected_output):
+    """标准输出捕获对象：给出期望输出时边输出边比较，不可能匹配时抛出OutputMismatch"""
+    if expected_output is None:
+        return io.StringIO()
+    return StreamingMatcher(expected_output.strip())
+
+
+def _captured_output(captured):
+    """捕获的输出；提前终止时只有前缀并带标记"""
+    if isinstance(captured, StreamingMatcher):
+        return captured.output.strip()
+    return captured.getvalue().strip()
+
+
+def _output_mismatch(captured):
+    return isinstance(captured, StreamingMatcher) and captured.aborted
+
+
+def start_zygote(preload_modules=python_zygote.DEFAULT_PRELOAD_MODULES):
+    """启动zygote：预先导入常用模块，之后每个测试用例从它fork一个新的子进程执行"""
+    global _zygote
+    if _zygote is None:
+        if not python_zygote.fork_supported():
+            print("当前系统不支持fork，使用进程池执行")
+            return None
+        _zygote = python_zygote.PythonZygote(execute_code_in_process, preload_modules)
+    return _zygote
+
+
+def stop_zygote():
+    global _zygote
+    if _zygote is not None:
+        _zygote.close()
+        _zygote = None
 
 
-def normalize_output(output):
+def run_in_worker(code, test_input, expected_output=None, timeout=None):
     """
-    标准化输出字符串，处理引号和其他可能的格式差异，并检测输出格式
-    
-    Args:
-        output: 要标准化的输出字符串
-        
-    Returns:
-        tuple: (标准化后的字符串, 检测到的格式)
+    在zygote的子进程（--zygote）或进程池中执行一个测试用例
+
+    Raises:
+        multiprocessing.TimeoutError: 超过timeout秒（默认CASE_TIMEOUT）
     """
-    # 移除首尾空格
-    output = output.strip()
-    
-    # 检测输出格式
-    format_detected = "direct"  # 默认格式为直接输出
-    if output.startswith('{') and output.endswith('}'):
-        format_detected = '{ output }'
-    elif output.startswith('[') and output.endswith(']'):
-        format_detected = '[ output ]'
-    elif output.startswith('(') and output.endswith(')'):
-        format_detected = '( output )'
-    
-    # 如果是上述格式之一，移除首尾符号
-    if format_detected != "direct":
-        output = output[1:-1].strip()
-    
-    # 尝试解析JSON（如果是JSON格式）
+    if timeout is None:
+        timeout = CASE_TIMEOUT
+    if _zygote is not None:
+        exec_result = _zygote.run(code, test_input, expected_output, timeout=timeout)
+        if exec_result is None:
+            raise multiprocessing.TimeoutError()
+        return exec_result
+    async_result = get_process_pool().apply_async(execute_code_in_process, (code, test_input, expected_output))
     try:
-        # 如果是合法的JSON字符串，解析并重新序列化以规范化格式
-        parsed = json.loads(f'"{output}"')  # 添加引号以使其成为合法的JSON字符串
-        return parsed, format_detected
-    except:
-        pass
-    
-    # 如果不是JSON，返回原始字符串和检测到的格式
-    return output, format_detected
+        return async_result.get(timeout=timeout)
+    except multiprocessing.TimeoutError:
+        # 工作进程仍在执行超时的代码
+        _worker_pool.mark_unhealthy()
+        raise
 
 
-def smart_compare(actual, expected):
+def prepare_submission(code, cache_dir=None):
     """
-    智能比较两个输出字符串，处理常见的格式差异
-    
-    Args:
-        actual: 实际输出
-        expected: 期望输出
-        
-    Returns:
-        布尔值，表示是否匹配
+    编译一次提交的代码，之后每个测试用例直接执行编译结果（见python_bytecode.py）。
+    无法编译的代码原样返回，由执行时报告语法错误
     """
-    # 标准化实际输出和期望输出
-    actual_normalized, _ = normalize_output(actual)
-    expected_normalized, _ = normalize_output(expected)
-    
-    # 直接比较
-    if actual_normalized == expected_normalized:
-        return True
-    
-    # 移除所有引号后比较
-    if actual_normalized.replace('"', '').replace("'", '') == expected_normalized.replace('"', '').replace("'", ''):
-        return True
-    
-    # 尝试解析为数字后比较
     try:
-        actual_num = float(actual_normalized)
-        expected_num = float(expected_normalized)
-        return abs(actual_num - expected_num) < 1e-6  # 允许小的浮点数差异
-    except:
-        pass
-    
-    # 尝试将双引号替换为单引号后比较
-    if actual_normalized.replace('"', "'") == expected_normalized.replace('"', "'"):
-        return True
-    
-    # 尝试比较JSON解析后的对象
-    try:
-        actual_obj = ast.literal_eval(actual_normalized)
-        expected_obj = ast.literal_eval(expected_normalized)
-        return actual_obj == expected_obj
-    except:
-        pass
-    
-    # 所有比较方法都失败，返回False
-    return False
-
+        return compile_submission(code, cache_dir)
+    except (SyntaxError, ValueError):
+        return code
 
-# ...existing code...
 
-def execute_code_in_process(code, test_input):
+def execute_code_in_process(code, test_input, expected_output=None):
     """
-    在子进程中执行代码，兼容顶层逻辑和 if __name__ == '__main__' 块。
+    在子进程中执行一次代码，兼容顶层逻辑和 if __name__ == '__main__' 块。
 
     Args:
-        code: 要执行的代码
+        code: 要执行的代码，源代码或prepare_submission的编译结果
         test_input: 测试输入字符串
+        expected_output: 期望输出；给出时一旦输出不可能匹配就停止执行（output_mismatch为True）
 
     Returns:
         包含执行结果的字典
@@ -133,123 +126,66 @@ def execute_code_in_process(code, test_input):
     # 执行前手动触发垃圾回收
     gc.collect()
     
-    exec_result = None
-    
     try:
-        # --- 第一次尝试：直接执行 ---
+        # 有 if __name__ == "__main__" 的代码以主模块身份执行，每个测试用例只执行一次
         sys.stdin = io.StringIO(test_input)
-        captured_output_1 = io.StringIO()
-        peak_memory_1 = 0
+        captured_output = _new_capture(expected_output)
+        peak_memory = 0
         process = psutil.Process()
-        start_memory_1 = process.memory_info().rss / 1024
-        monitor_stop_1 = threading.Event()
-        error_1 = None
-        success_1 = False
+        start_memory = process.memory_info().rss / 1024
+        monitor_stop = threading.Event()
+        error = None
+        success = False
         
-        def monitor_memory_1():
-            nonlocal peak_memory_1
-            while not monitor_stop_1.is_set():
+        def monitor_memory():
+            nonlocal peak_memory
+            while not monitor_stop.is_set():
                 try:
-                    current_memory = process.memory_info().rss / 1024 - start_memory_1
-                    peak_memory_1 = max(peak_memory_1, current_memory)
+                    current_memory = process.memory_info().rss / 1024 - start_memory
+                    peak_memory = max(peak_memory, current_memory)
                 except: pass
                 time.sleep(0.1)
 
-        monitor_thread_1 = threading.Thread(target=monitor_memory_1)
-        monitor_thread_1.daemon = True
-        monitor_thread_1.start()
+        monitor_thread = threading.Thread(target=monitor_memory)
+        monitor_thread.daemon = True
+        monitor_thread.start()
 
         try:
-            global_namespace_1 = {}
-            with contextlib.redirect_stdout(captured_output_1):
-                exec(code, global_namespace_1)
-            success_1 = True
+            submission = code if isinstance(code, CompiledSubmission) else compile_submission(code)
+            global_namespace = {'__name__': '__main__'} if submission.main_guard else {}
+            code_object = submission.code_object()
+            with contextlib.redirect_stdout(captured_output):
+                exec(code_object, global_namespace)
+            success = True
+        except OutputMismatch:
+            # 输出已不可能与期望输出一致，提前停止
+            success = True
         except MemoryError:
              # 单独捕获内存错误以提供更具体的信息
-             error_1 = "MemoryError: 程序执行过程中内存溢出 (第一次尝试)"
-             success_1 = False
+             error = "MemoryError: 程序执行过程中内存溢出"
+             success = False
         except Exception as e:
-            error_1 = traceback.format_exc() # 捕获第一次尝试的错误
-            success_1 = False
+            error = traceback.format_exc()
+            success = False
 
-        monitor_stop_1.set()
-        monitor_thread_1.join(timeout=1)
-        end_memory_1 = process.memory_info().rss / 1024
-        memory_usage_1 = max(end_memory_1 - start_memory_1, peak_memory_1)
-        output_1 = captured_output_1.getvalue().strip()
+        monitor_stop.set()
+        monitor_thread.join(timeout=1)
+        end_memory = process.memory_info().rss / 1024
+        memory_usage = max(end_memory - start_memory, peak_memory)
+        output = _captured_output(captured_output)
 
-        # 恢复标准输入输出，以便第二次尝试或返回
+        # 恢复标准输入输出
         sys.stdin = original_stdin
         sys.stdout = original_stdout
 
-        # 如果第一次尝试有输出或发生错误，则使用其结果
-        if output_1 or not success_1:
-            exec_result = {
-                'success': success_1,
-                'output': output_1 if success_1 else (error_1 if 'MemoryError' in str(error_1) else ''), # 内存错误时特殊处理输出
-                'memory_usage': memory_usage_1 if success_1 else 0,
-                'peak_memory_usage': peak_memory_1 if success_1 else 0,
-                'error': error_1
-            }
-        else:
-            # --- 第二次尝试：设置 __name__ = '__main__' ---
-            # 只有当第一次尝试成功且无输出时才进行第二次尝试
-            gc.collect() # 再次垃圾回收
-
-            sys.stdin = io.StringIO(test_input) # 重置标准输入
-            captured_output_2 = io.StringIO()
-            peak_memory_2 = 0
-            # 重新获取起始内存，因为进程状态可能已改变
-            start_memory_2 = process.memory_info().rss / 1024
-            monitor_stop_2 = threading.Event()
-            error_2 = None
-            success_2 = False
-
-            def monitor_memory_2():
-                nonlocal peak_memory_2
-                while not monitor_stop_2.is_set():
-                    try:
-                        current_memory = process.memory_info().rss / 1024 - start_memory_2
-                        peak_memory_2 = max(peak_memory_2, current_memory)
-                    except: pass
-                    time.sleep(0.1)
-
-            monitor_thread_2 = threading.Thread(target=monitor_memory_2)
-            monitor_thread_2.daemon = True
-            monitor_thread_2.start()
-
-            try:
-                global_namespace_2 = {'__name__': '__main__'}
-                with contextlib.redirect_stdout(captured_output_2):
-                    exec(code, global_namespace_2)
-                success_2 = True
-            except MemoryError:
-                 error_2 = "MemoryError: 程序执行过程中内存溢出 (第二次尝试)"
-                 success_2 = False
-            except Exception as e:
-                error_2 = traceback.format_exc() # 捕获第二次尝试的错误
-                success_2 = False
-
-            monitor_stop_2.set()
-            monitor_thread_2.join(timeout=1)
-            end_memory_2 = process.memory_info().rss / 1024
-            memory_usage_2 = max(end_memory_2 - start_memory_2, peak_memory_2)
-            output_2 = captured_output_2.getvalue().strip()
-
-            # 恢复标准输入输出
-            sys.stdin = original_stdin
-            sys.stdout = original_stdout
-
-            # 使用第二次尝试的结果
-            exec_result = {
-                'success': success_2,
-                'output': output_2 if success_2 else (error_2 if 'MemoryError' in str(error_2) else ''),
-                'memory_usage': memory_usage_2 if success_2 else 0,
-                'peak_memory_usage': peak_memory_2 if success_2 else 0,
-                'error': error_2
-            }
-
-        return exec_result
+        return {
+            'success': success,
+            'output': output if success else (error if 'MemoryError' in str(error) else ''), # 内存错误时特殊处理输出
+            'memory_usage': memory_usage if success else 0,
+            'peak_memory_usage': peak_memory if success else 0,
+            'error': error,
+            'output_mismatch': _output_mismatch(captured_output)
+        }
 
     except MemoryError:
         # 捕获在 setup/teardown 阶段可能发生的内存错误
@@ -276,11 +212,32 @@ def execute_code_in_process(code, test_input):
 
 # ... rest of the file ...
 
-def evaluate_code(code: str, test_input: str, expected_output: str) -> Dict[str, Any]:
-    """使用进程池评估代码，支持超时处理"""
+def evaluate_code(code: Union[str, CompiledSubmission], test_input: str, expected_output: str,
+                  timeout: float = None) -> Dict[str, Any]:
+    """使用进程池评估代码，支持超时处理（timeout默认为CASE_TIMEOUT秒）"""
+    start_time = time.time()
+    
+    try:
+        # 最多等待timeout秒获取结果
+        exec_result = run_in_worker(code, test_input, expected_output, timeout)
+    except multiprocessing.TimeoutError:
+        # 发生超时
+        exec_result = None
+    return build_test_result(exec_result, (time.time() - start_time) * 1000, expected_output, timeout)
+
+
+def build_test_result(exec_result, execution_time: float, expected_output: str, timeout: float = None) -> Dict[str, Any]:
+    """
+    把execute_code_in_process的结果转换为测试用例结果
+    
+    Args:
+        exec_result: execute_code_in_process的返回值，超时时为None
+        execution_time: 执行时间（毫秒）
+        timeout: 该测试用例的超时（秒），默认CASE_TIMEOUT
+    """
     result = {
         'correct': False,
-        'execution_time': 0,
+        'execution_time': execution_time,
         'memory_usage': 0,
         'peak_memory_usage': 0,
         'output': '',
@@ -288,34 +245,21 @@ def evaluate_code(code: str, test_input: str, expected_output: str) -> Dict[str,
         'output_format': None  # 新增字段，用于记录输出格式
     }
     
-    # 获取进程池
-    pool = get_process_pool()
+    if exec_result is None:
+        result['error'] = f"运行超时: 程序执行时间超过{(timeout or CASE_TIMEOUT) * 1000:.0f}毫秒"
+        result['output'] = "运行超时"
+        return result
     
-    # 使用进程池异步执行代码
-    start_time = time.time()
-    async_result = pool.apply_async(execute_code_in_process, (code, test_input))
+    result['output'] = exec_result['output']
+    result['error'] = exec_result['error']
+    result['memory_usage'] = exec_result['memory_usage']
+    result['peak_memory_usage'] = exec_result.get('peak_memory_usage', 0)
     
-    try:
-        # 最多等待10秒钟获取结果
-        exec_result = async_result.get(timeout=10)
-        execution_time = (time.time() - start_time) * 1000  # 毫秒
-        
-        result['output'] = exec_result['output']
-        result['error'] = exec_result['error']
-        result['memory_usage'] = exec_result['memory_usage']
-        result['peak_memory_usage'] = exec_result.get('peak_memory_usage', 0)
-        result['execution_time'] = execution_time
-        
-        if not exec_result['success']:
-            # 执行出错
-            return result
-        
-    except multiprocessing.TimeoutError:
-        # 发生超时
-        execution_time = (time.time() - start_time) * 1000
-        result['error'] = "运行超时: 程序执行时间超过10000毫秒"
-        result['output'] = "运行超时"
-        result['execution_time'] = execution_time
+    if not exec_result['success']:
+        # 执行出错
+        return result
+    if exec_result.get('output_mismatch'):
+        # 输出与期望不符，运行已提前终止
         return result
     
     # 比较结果
@@ -328,15 +272,20 @@ def evaluate_code(code: str, test_input: str, expected_output: str) -> Dict[str,
     return result
 
 
-def run_test_case(code: str, test_input: str, expected_output: str, case_id: int = None) -> Dict[str, Any]:
+def run_test_case(code: Union[str, CompiledSubmission], test_input: str, expected_output: str, case_id: int = None,
+                  timeout: float = None) -> Dict[str, Any]:
     """运行测试用例并打印结果"""
     if case_id is not None:
         print(f"\n测试用例 #{case_id}:")
     else:
         print("正在评估代码...")
         
-    result = evaluate_code(code, test_input, expected_output)
-    
+    result = evaluate_code(code, test_input, expected_output, timeout)
+    return print_test_result(result, expected_output)
+
+
+def print_test_result(result: Dict[str, Any], expected_output: str) -> Dict[str, Any]:
+    """打印一个测试用例的结果"""
     print(f"正确性: {'通过' if result['correct'] else '失败'}")
     print(f"执行时间: {result['execution_time']:.2f} 毫秒")
     print(f"内存使用: {result['memory_usage']:.2f} KB")
@@ -362,7 +311,7 @@ def run_test_case(code: str, test_input: str, expected_output: str, case_id: int
     return result
 
 
-def run_test_cases_batch(code: str, inputs: List[str], outputs: List[str]) -> List[Dict[str, Any]]:
+def run_test_cases_batch(code: Union[str, CompiledSubmission], inputs: List[str], outputs: List[str]) -> List[Dict[str, Any]]:
     """批量运行多个测试用例，利用进程池并行处理"""
     
     pool = get_process_pool()
@@ -372,9 +321,9 @@ def run_test_cases_batch(code: str, inputs: List[str], outputs: List[str]) -> Li
     start_times = []
     
     # 提交所有任务
-    for test_input in inputs:
+    for test_input, expected_output in zip(inputs, outputs):
         start_time = time.time()
-        async_result = pool.apply_async(execute_code_in_process, (code, test_input))
+        async_result = pool.apply_async(execute_code_in_process, (code, test_input, expected_output))
         async_results.append(async_result)
         start_times.append(start_time)
     
@@ -392,7 +341,7 @@ def run_test_cases_batch(code: str, inputs: List[str], outputs: List[str]) -> Li
         
         try:
             # 获取结果，设置超时
-            exec_result = async_result.get(timeout=10)
+            exec_result = async_result.get(timeout=CASE_TIMEOUT)
             execution_time = (time.time() - start_time) * 1000
             
             result['output'] = exec_result['output']
@@ -401,15 +350,16 @@ def run_test_cases_batch(code: str, inputs: List[str], outputs: List[str]) -> Li
             result['peak_memory_usage'] = exec_result.get('peak_memory_usage', 0)
             result['execution_time'] = execution_time
             
-            if exec_result['success']:
+            if exec_result['success'] and not exec_result.get('output_mismatch'):
                 # 比较结果
                 expected_output = expected_output.strip()
                 result['correct'] = smart_compare(result['output'], expected_output)
             
         except multiprocessing.TimeoutError:
-            # 超时处理
+            # 超时处理：工作进程仍在执行超时的代码，之后替换进程池
+            _worker_pool.mark_unhealthy()
             execution_time = (time.time() - start_time) * 1000
-            result['error'] = "运行超时: 程序执行时间超过10000毫秒"
+            result['error'] = f"运行超时: 程序执行时间超过{CASE_TIMEOUT * 1000:.0f}毫秒"
             result['output'] = "运行超时"
             result['execution_time'] = execution_time
         
@@ -438,6 +388,21 @@ def run_test_cases_batch(code: str, inputs: List[str], outputs: List[str]) -> Li
     return results
 
 
+def run_test_cases_zygote_batch(code: Union[str, CompiledSubmission], inputs: List[str],
+                                outputs: List[str]) -> List[Dict[str, Any]]:
+    """
+    把代码和所有测试用例一次发给zygote，zygote逐个fork子进程执行并计时
+    （每个测试用例仍有独立的超时和干净的全局变量）
+    """
+    case_results = _zygote.run_batch(code, list(zip(inputs, outputs)), timeout=CASE_TIMEOUT)
+    results = []
+    for i, ((exec_result, execution_time), expected_output) in enumerate(zip(case_results, outputs)):
+        print(f"\n测试用例 #{i+1}:")
+        results.append(print_test_result(build_test_result(exec_result, execution_time, expected_output),
+                                         expected_output))
+    return results
+
+
 def parse_structured_test_cases(data):
     """解析结构化测试用例
     
@@ -458,82 +423,19 @@ def parse_structured_test_cases(data):
     return inputs, outputs
 
 
-def kill_process_tree(pid):
-    """递归杀死进程树"""
+def cleanup_process_pool():
+    """关闭进程池和zygote，并终止它们留下的子进程"""
     try:
-        parent = psutil.Process(pid)
-        children = parent.children(recursive=True)
-        
-        # 先杀死子进程
-        for child in children:
-            try:
-                child.kill()
-            except psutil.NoSuchProcess:
-                pass
-        
-        # 然后杀死父进程
-        try:
-            if parent.is_running():
-                parent.kill()
-                parent.wait(3)  # 等待进程终止
-        except psutil.NoSuchProcess:
-            pass
-        
-        return True
-    except psutil.NoSuchProcess:
-        return False
+        _worker_pool.close()
+        stop_zygote()
+        reap_descendants()
     except Exception as e:
-        print(f"杀死进程树时出错: {e}")
-        return False
-
-
-def cleanup_process_pool():
-    """清理进程池并确保所有进程都被正确终止"""
-    global _process_pool
-    if _process_pool is not None:
-        try:
-            # 首先尝试终止所有可能挂起的进程
-            _process_pool.terminate()
-            # 然后关闭进程池
-            _process_pool.close()
-            # 设置超时时间，避免永久等待
-            _process_pool.join(timeout=3)
-            
-            # 检查是否还有未关闭的子进程，强制终止它们
-            for p in multiprocessing.active_children():
-                try:
-                    print(f"终止残留子进程: {p.name} (PID: {p.pid})")
-                    p.terminate()
-                    p.join(timeout=1)
-                    
-                    # 如果进程仍在运行，尝试更强力的终止方法
-                    if p.is_alive():
-                        print(f"进程未响应terminate()，尝试kill(): {p.name} (PID: {p.pid})")
-                        # 使用psutil更彻底地终止进程树
-                        kill_process_tree(p.pid)
-                        
-                        # 如果仍然存活，使用操作系统的命令强制终止
-                        if p.is_alive():
-                            if os.name == 'nt':  # Windows
-                                os.system(f"taskkill /F /PID {p.pid} /T")
-                            else:  # Unix
-                                os.system(f"kill -9 {p.pid}")
-                except Exception as e:
-                    print(f"无法终止子进程 {p.name}: {e}")
-            
-            # 强制垃圾回收
-            gc.collect()
-            
-        except Exception as e:
-            print(f"清理进程池时发生错误: {e}")
-        finally:
-            # 重置全局进程池变量
-            _process_pool = None
-            print("进程池已清理完毕")
+        print(f"清理进程池时发生错误: {e}")
 
 
 def main():
     """主函数，处理命令行参数"""
+    global CASE_TIMEOUT
     # Windows下必须保护主入口点
     if sys.platform == 'win32':
         multiprocessing.freeze_support()
@@ -558,11 +460,32 @@ def main():
     parser.add_argument("--parallel", "-p", action="store_true", 
                         help="并行执行测试用例（多个测试用例时效率更高）")
     
+    # zygote：预先导入常用模块，每个测试用例fork一个干净的子进程执行（仅支持fork的系统）
+    parser.add_argument("--zygote", action="store_true",
+                        help="使用预先导入模块的zygote进程，每个测试用例fork一个子进程执行（代替进程池）")
+    parser.add_argument("--preload-modules", type=str, default=",".join(python_zygote.DEFAULT_PRELOAD_MODULES),
+                        help="zygote预先导入的模块，逗号分隔")
+    parser.add_argument("--batch", action="store_true",
+                        help="把所有测试用例一次发给zygote，在其中逐个fork执行（隐含--zygote）")
+    
+    parser.add_argument("--bytecode-cache", type=str, default=None,
+                        help="编译结果缓存目录，重复评估相同代码时跳过编译（默认只在内存中缓存）")
+    
     # 新增参数：内存限制
     parser.add_argument("--memory-limit", "-m", type=int, default=0,
                        help="设置内存限制 (MB)，超过限制将报告错误 (0表示不限制)")
     
+    # 提前结束：首个失败即停止 / 总时间预算
+    parser.add_argument("--fail-fast", action="store_true",
+                        help="第一个测试用例失败后跳过剩余用例（只关心是否全部通过时使用）")
+    parser.add_argument("--time-budget", type=float, default=0,
+                        help="所有测试用例的总时间预算（秒），超出后剩余用例计为失败 (0表示不限制)")
+    
+    parser.add_argument("--timeout", type=float, default=CASE_TIMEOUT,
+                        help="每个测试用例的运行超时（秒），默认10秒")
+    
     args = parser.parse_args()
+    CASE_TIMEOUT = args.timeout
     
     # 读取代码文件
     try:
@@ -675,15 +598,22 @@ def main():
     try:
         results = []
         
-        # 根据参数决定是并行执行还是顺序执行
-        if args.parallel and len(inputs) > 1:
+        # 只编译一次，每个测试用例执行同一个编译结果
+        code = prepare_submission(code, args.bytecode_cache)
+        
+        if args.zygote or args.batch:
+            start_zygote([name.strip() for name in args.preload_modules.split(",") if name.strip()])
+        
+        # 根据参数决定是并行执行还是顺序执行（zygote逐个执行测试用例）
+        if args.batch and len(inputs) > 1 and not (args.fail_fast or args.time_budget) and _zygote is not None:
+            results = run_test_cases_zygote_batch(code, inputs, outputs)
+        elif args.parallel and len(inputs) > 1 and not (args.fail_fast or args.time_budget) and _zygote is None:
             # 批量并行执行
             results = run_test_cases_batch(code, inputs, outputs)
         else:
-            # 顺序执行
-            for i, (test_input, expected_output) in enumerate(zip(inputs, outputs)):
-                result = run_test_case(code, test_input, expected_output, i+1)
-                results.append(result)
+            # 顺序执行（fail-fast和时间预算只在顺序执行时生效）
+            results = run_test_cases_sequential(functools.partial(run_test_case, code), inputs, outputs, CASE_TIMEOUT,
+                                                args.fail_fast, args.time_budget)
         
         # 输出测试摘要
         passed = sum(1 for r in results if r['correct'])
@@ -706,7 +636,9 @@ def main():
             for i, result in enumerate(results):
                 if not result['correct']:
                     error_type = ""
-                    if result.get('error'):
+                    if result.get('skipped'):
+                        error_type = " (未执行)"
+                    elif result.get('error'):
                         if 'MemoryError' in str(result.get('error')):
                             error_type = " (内存溢出)"
                         elif '超时' in str(result.get('error')):
@@ -714,7 +646,7 @@ def main():
                     print(f"  - 测试用例 #{i+1}{error_type}")
         print("output_format:", [r.get('output_format') for r in results][0])
     finally:
-        # 确保在任何情况下都清理进程池
+        # 确保在任何情况下都清理进程池和zygote
         cleanup_process_pool()
 
 
@@ -726,12 +658,4 @@ if __name__ == "__main__":
         traceback.print_exc()
         
         # 确保进程池被清理
-        cleanup_process_pool()
-        
-        # 确保所有子进程被终止
-        for p in multiprocessing.active_children():
-            try:
-                p.terminate()
-                p.join(timeout=1)
-            except:
-                pass
\ No newline at end of file
+        cleanup_process_pool()
\ No newline at end of file
@@ -11,7 +11,12 @@ from typing import Dict, Any, List, Union, Tuple, Optional
 import sys
 import io
 import psutil
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from code_extraction import add_code_fields
+import jsonl_io
+from results_store import ResultsStore
+from code_lexer import has_comments, strip_comments_and_strings
+from test_case_store import TestCaseStore, TestCasesFile, write_test_cases_file
+from worker_pool import kill_process_tree, reap_descendants
 
 # 导入评估模块
 def import_module_from_path(module_name, file_path):
@@ -20,6 +25,20 @@ def import_module_from_path(module_name, file_path):
     spec.loader.exec_module(module)
     return module
 
+def run_evaluator(cmd: List[str], timeout: float) -> subprocess.CompletedProcess:
+    """
+    运行语言评估器子进程，相当于subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)，
+    但超时时连同评估器启动的进程池、zygote和测试程序一起终止
+    """
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process.pid)
+            process.communicate()
+            raise
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
 # 获取当前目录路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -86,8 +105,29 @@ change_cases = [
 class CodeEvaluator:
     """代码评估类，用于对不同语言的代码进行功能和结构评估"""
     
-    def __init__(self):
-        """初始化评估器"""
+    def __init__(self, fail_fast: bool = False, time_budget: float = 0, code_dir: str = "code_files",
+                 test_case_store: Optional[str] = None, parallel_cases: int = 1, python_zygote: bool = False,
+                 batch_cases: bool = False):
+        """
+        初始化评估器
+        
+        Args:
+            fail_fast: 运行测试用例时第一个失败后跳过剩余用例（只关心是否全部通过时使用）
+            time_budget: 每次提交所有测试用例的总时间预算（秒），0表示不限制
+            code_dir: 保存待评估代码和测试用例的目录，多个进程同时评估时每个进程需要使用不同的目录
+            test_case_store: 测试用例库目录（见test_case_store.py），有该题的测试用例文件时直接使用
+            parallel_cases: C/C++和Java同时运行的测试用例数（评估器的--parallel），1表示逐个运行
+            python_zygote: Python测试用例从预先导入模块的zygote进程fork执行（评估器的--zygote）
+            batch_cases: Python和Java的所有测试用例交给一个进程运行（评估器的--batch）
+        """
+        self.fail_fast = fail_fast
+        self.time_budget = time_budget
+        self.code_dir = code_dir
+        self.test_case_store = TestCaseStore(test_case_store) if test_case_store else None
+        self.parallel_cases = parallel_cases
+        self.python_zygote = python_zygote
+        self.batch_cases = batch_cases
+        
         # 将语言映射到对应的评估模块
         self.evaluators = {
             "python": evaluation_py,
@@ -142,8 +182,28 @@ class CodeEvaluator:
         # 返回映射的扩展名或默认值
         return extension_map.get(normalized_language, "txt")
     
-    def run_code(self, code: str, language: str, test_cases: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """运行代码并评估结果"""
+    def prepare_test_cases(self, question_id: str, test_cases: List[Dict[str, Any]]) -> TestCasesFile:
+        """
+        返回一道题的测试用例文件，供同一样本的各轮run_code直接传路径，不再每轮重新写入
+        
+        测试用例库中有该题时直接使用库中的文件，否则把test_cases写入code_dir/test_cases.json
+        """
+        if self.test_case_store is not None:
+            stored = self.test_case_store.get(question_id)
+            if stored is not None:
+                return stored
+        os.makedirs(self.code_dir, exist_ok=True)
+        return write_test_cases_file(test_cases, os.path.join(self.code_dir, "test_cases.json"))
+    
+    def run_code(self, code: str, language: str, test_cases: Union[List[Dict[str, Any]], TestCasesFile],
+                 timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        运行代码并评估结果
+        
+        Args:
+            test_cases: 测试用例列表，或prepare_test_cases返回的测试用例文件
+            timeout: 每个测试用例的运行超时（秒），None表示使用评估器默认值（10秒）
+        """
         import tempfile
         import json
         import subprocess
@@ -154,8 +214,18 @@ class CodeEvaluator:
         import threading
         import time
         
+        # 评估器子进程超时：默认C++ 60秒、Python/Java 90秒；
+        # 指定了每个用例的超时时按用例数推算（C++/Java只编译一次，另外留出编译时间；每个用例留1秒启动进程/JVM）
+        if timeout:
+            compile_overhead = 0 if self.normalize_language(language) == "python" else 20
+            process_timeout = 10 + compile_overhead + max(1, len(test_cases)) * (timeout + 1)
+            total_timeout = process_timeout + 5
+        else:
+            process_timeout = 60 if self.normalize_language(language) == "c++" else 90
+            total_timeout = 90
+        
         # 添加全局超时控制
-        global_result = {"success": False, "error": "执行超时（超过60秒）", "results": []}
+        global_result = {"success": False, "error": f"执行超时（超过{total_timeout:g}秒）", "results": []}
         global_process_finished = threading.Event()
         
         def run_with_timeout():
@@ -182,40 +252,41 @@ class CodeEvaluator:
                     "java": os.path.join(current_dir, "evaluation_java.py")
                 }
                 
-                # 准备测试用例
-                standardized_test_cases = []
-                for tc in test_cases:
-                    # 处理不同格式的测试用例
-                    if isinstance(tc, dict):
-                        if 'input' in tc and 'output' in tc:
-                            standardized_test_cases.append(tc)
-                        elif 'inputs' in tc and 'outputs' in tc:
-                            standardized_test_cases.append({
-                                'input': tc['inputs'],
-                                'output': tc['outputs']
-                            })
-                    elif isinstance(tc, (list, tuple)) and len(tc) >= 2:
-                        standardized_test_cases.append({
-                            'input': tc[0],
-                            'output': tc[1]
-                        })
+                # 传给各语言评估器的提前结束参数
+                runner_options = []
+                if self.fail_fast:
+                    runner_options.append("--fail-fast")
+                if self.time_budget:
+                    runner_options.extend(["--time-budget", str(self.time_budget)])
+                if timeout:
+                    runner_options.extend(["--timeout", str(timeout)])
+                if self.parallel_cases > 1 and norm_language in ("c++", "java"):
+                    runner_options.extend(["--parallel", str(self.parallel_cases)])
+                if self.batch_cases and norm_language in ("python", "java"):
+                    runner_options.append("--batch")
+                if norm_language == "python":
+                    # 重复评估相同代码时复用编译结果
+                    runner_options.extend(["--bytecode-cache", os.path.join(self.code_dir, "bytecode_cache")])
+                    if self.python_zygote:
+                        runner_options.append("--zygote")
                 
                 try:
                     # 定义固定的文件路径
-                    code_dir = "code_files"  # 可以根据需要修改为您想要的路径
+                    code_dir = self.code_dir
                     # 确保目录存在
                     if not os.path.exists(code_dir):
-                        os.makedirs(code_dir)
+                        os.makedirs(code_dir, exist_ok=True)
 
                     # 将代码保存到固定文件
                     code_file = os.path.join(code_dir, f"code.{self._get_file_extension(norm_language)}")
                     with open(code_file, 'w', encoding='utf-8') as f:
                         f.write(code)
 
-                    # 将测试用例保存到固定文件
-                    test_cases_file = os.path.join(code_dir, "test_cases.json")
-                    with open(test_cases_file, 'w', encoding='utf-8') as f:
-                        json.dump(standardized_test_cases, f)
+                    # 测试用例已经在文件中时直接传路径，否则保存到固定文件
+                    if isinstance(test_cases, TestCasesFile):
+                        test_cases_file = test_cases.path
+                    else:
+                        test_cases_file = write_test_cases_file(test_cases, os.path.join(code_dir, "test_cases.json")).path
                     
                     # 特殊处理C/C++评估器
                     if norm_language == "c++":
@@ -227,16 +298,10 @@ class CodeEvaluator:
                             evaluator_path,
                             code_file,
                             "--test-cases-file", test_cases_file
-                        ]
+                        ] + runner_options
                         
                         # 执行命令，添加超时限制
-                        process = subprocess.run(
-                            cmd,
-                            capture_output=True,
-                            text=True,
-                            check=False,
-                            timeout=60  # 设置30秒超时
-                        )
+                        process = run_evaluator(cmd, process_timeout)
 
                         # 解析结果
                         if process.returncode == 0:
@@ -281,16 +346,10 @@ class CodeEvaluator:
                             evaluator_path,
                             code_file,
                             "--test-cases-file", test_cases_file
-                        ]
+                        ] + runner_options
                         
                         # 执行命令，添加超时限制
-                        process = subprocess.run(
-                            cmd,
-                            capture_output=True,
-                            text=True,
-                            check=False,
-                            timeout=90  # 设置30秒超时
-                        )
+                        process = run_evaluator(cmd, process_timeout)
                         
                         # 解析结果
                         if process.returncode == 0:
@@ -335,16 +394,10 @@ class CodeEvaluator:
                             evaluator_path,
                             code_file,
                             "--test-cases-file", test_cases_file
-                        ]
+                        ] + runner_options
                         
                         # 执行命令，添加超时限制
-                        process = subprocess.run(
-                            cmd,
-                            capture_output=True,
-                            text=True,
-                            check=False,
-                            timeout=90  # 设置30秒超时
-                        )
+                        process = run_evaluator(cmd, process_timeout)
                         
                         # 解析结果
                         if process.returncode == 0:
@@ -411,12 +464,12 @@ class CodeEvaluator:
         execution_thread.start()
         
         # 等待执行完成或超时
-        if not global_process_finished.wait(timeout=90):  # 全局超时60秒
-            print("警告: 代码评估总时间超过60秒，强制终止")
+        if not global_process_finished.wait(timeout=total_timeout):  # 全局超时
+            print(f"警告: 代码评估总时间超过{total_timeout:g}秒，强制终止")
             return {
                 "success": False,
-                "error": "执行超时（总评估时间超过60秒）",
-                "results": [{"correct": False, "output": "评估时间超过60秒", "error": "总评估超时"}]
+                "error": f"执行超时（总评估时间超过{total_timeout:g}秒）",
+                "results": [{"correct": False, "output": f"评估时间超过{total_timeout:g}秒", "error": "总评估超时"}]
             }
         
         return global_result
@@ -495,10 +548,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量以避免误判
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
-                code_no_comments = re.sub(r"'[^']*'", '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
                 
                 # 变量声明模式扩展
                 variables = set()
@@ -743,12 +793,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量以避免误判
-                # 移除单行注释
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                # 移除多行注释
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                # 移除字符串字面量
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
         
                 has_loop = False
                 if loop_type == "for":
@@ -794,9 +839,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量以避免误判
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
                 
                 has_if = bool(re.search(r'\bif\s*\(', code_no_comments))
                 return has_if == should_exist
@@ -828,9 +871,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量以避免误判
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
         
                 # 全面的C++类型列表，用于返回值
                 c_types = (
@@ -902,10 +943,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 移除注释和字符串字面量以避免误判
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
-                code_no_comments = re.sub(r"'[^']*'", '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
         
                 # 正则表达式模式集，用于检测各种形式的函数
                 patterns = [
@@ -958,9 +996,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量以避免误判
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
         
                 # 统计不同形式的类声明
         
@@ -1013,10 +1049,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量以避免误判
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
-                code_no_comments = re.sub(r"'[^']*'", '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
         
                 # 检查各种类声明模式
                 patterns = [
@@ -1044,30 +1077,11 @@ class CodeEvaluator:
         return False
     
     def evaluate_has_no_comments(self, code: str, language: str) -> bool:
-        """检查代码中是否不含注释"""
+        """检查代码中是否不含注释（字符串中的 # 或 // 不算注释）"""
         language = self.normalize_language(language)
         
-        # 先移除字符串字面量以避免误判
-        if language == "python":
-            # 移除三引号字符串和常规字符串
-            code_no_strings = re.sub(r'""".*?"""', '', code, flags=re.DOTALL)
-            code_no_strings = re.sub(r"'''.*?'''", '', code_no_strings, flags=re.DOTALL)
-            code_no_strings = re.sub(r'"[^"]*"', '', code_no_strings)
-            code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)
-            
-            # 检查注释
-            has_comment = bool(re.search(r'#', code_no_strings))
-            return not has_comment
-        
-        elif language in ["java", "c++"]:
-            # 移除字符串字面量
-            code_no_strings = re.sub(r'"[^"]*"', '', code)
-            
-            # 检查单行和多行注释
-            has_single_line_comment = bool(re.search(r'//', code_no_strings))
-            has_multi_line_comment = bool(re.search(r'/\*.*?\*/', code_no_strings, flags=re.DOTALL))
-            
-            return not (has_single_line_comment or has_multi_line_comment)
+        if language in ["python", "java", "c++"]:
+            return not has_comments(code, language)
         
         return False
     
@@ -1076,46 +1090,12 @@ class CodeEvaluator:
         language = self.normalize_language(language)
         
         if language == "python":
-            # 先检查是否存在 # 注释
-            code_no_strings = re.sub(r'"[^"]*"', '', code)  # 移除普通双引号字符串
-            code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)  # 移除普通单引号字符串
-            if re.search(r'#', code_no_strings):
-                return True
-            
-            # 检查是否存在文档注释（docstrings）
-            try:
-                tree = ast.parse(code)
-                for node in ast.walk(tree):
-                    # 检查模块、类和函数的文档字符串
-                    if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef)) and ast.get_docstring(node):
-                        return True
-            except:
-                # 如果代码解析失败，回退到简单的正则表达式检测
-                # 检查可能的文档字符串模式
-                docstring_patterns = [
-                    r'^\s*[\']{3}[\s\S]*?[\']{3}',  # 模块级文档字符串
-                    r'^\s*[\"]{3}[\s\S]*?[\"]{3}',
-                    r'def\s+\w+\s*\([^)]*\)\s*:\s*\n\s*[\']{3}[\s\S]*?[\']{3}',  # 函数文档字符串
-                    r'def\s+\w+\s*\([^)]*\)\s*:\s*\n\s*[\"]{3}[\s\S]*?[\"]{3}',
-                    r'class\s+\w+[^:]*:\s*\n\s*[\']{3}[\s\S]*?[\']{3}',  # 类文档字符串
-                    r'class\s+\w+[^:]*:\s*\n\s*[\"]{3}[\s\S]*?[\"]{3}'
-                ]
-                for pattern in docstring_patterns:
-                    if re.search(pattern, code, re.MULTILINE):
-                        return True
-                        
-            return False
+            # 注释或模块、类、函数的文档字符串（docstrings）都算
+            return has_comments(code, language, include_docstrings=True)
         
         elif language in ["java", "c++"]:
-            # 移除字符串字面量
-            code_no_strings = re.sub(r'"[^"]*"', '', code)
-            code_no_strings = re.sub(r"'[^']*'", '', code_no_strings)
-            
             # 检查单行和多行注释
-            has_single_line_comment = bool(re.search(r'//', code_no_strings))
-            has_multi_line_comment = bool(re.search(r'/\*.*?\*/', code_no_strings, flags=re.DOTALL))
-            
-            return has_single_line_comment or has_multi_line_comment
+            return has_comments(code, language)
         
         return False
     
@@ -1192,9 +1172,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
                 
                 # 获取所有函数定义
                 func_pattern = r'\b(?:void|int|char|bool|float|double|auto|string|vector|[a-zA-Z_][a-zA-Z0-9_]*)\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*{[^}]*}'
@@ -1290,9 +1268,7 @@ class CodeEvaluator:
         elif language == "c++":
             try:
                 # 首先移除注释和字符串字面量
-                code_no_comments = re.sub(r'//.*?$', '', code, flags=re.MULTILINE)
-                code_no_comments = re.sub(r'/\*.*?\*/', '', code_no_comments, flags=re.DOTALL)
-                code_no_comments = re.sub(r'"[^"]*"', '', code_no_comments)
+                code_no_comments = strip_comments_and_strings(code, "c++")
                 
                 # 查找使用const关键字的变量声明
                 const_pattern = r'\bconst\s+(?:int|char|bool|float|double|auto|string|vector|[a-zA-Z_][a-zA-Z0-9_]*)\s+[a-zA-Z_][a-zA-Z0-9_]*'
@@ -1319,18 +1295,7 @@ class CodeEvaluator:
 
         try:
             # 移除注释和字符串，避免干扰参数列表的解析
-            code_to_check = code_block
-            if coding_language == "python":
-                code_to_check = re.sub(r'"""[\s\S]*?"""', '', code_to_check)
-                code_to_check = re.sub(r"'''[\s\S]*?'''", '', code_to_check)
-                code_to_check = re.sub(r'"[^"]*"', '', code_to_check)
-                code_to_check = re.sub(r"'[^']*'", '', code_to_check)
-                code_to_check = re.sub(r'#.*$', '', code_to_check, flags=re.MULTILINE)
-            elif coding_language in ["c++", "java"]:
-                code_to_check = re.sub(r'/\*[\s\S]*?\*/', '', code_to_check)
-                code_to_check = re.sub(r'//.*$', '', code_to_check, flags=re.MULTILINE)
-                code_to_check = re.sub(r'"[^"]*"', '', code_to_check)
-                code_to_check = re.sub(r"'[^']*'", '', code_to_check)
+            code_to_check = strip_comments_and_strings(code_block, coding_language)
 
             # 正则表达式查找函数定义和参数列表
             if coding_language == "python":
@@ -1644,20 +1609,334 @@ class CodeEvaluator:
         return params
 import gc
 import json
+import hashlib
+import multiprocessing
+import concurrent.futures
+import contextlib
+import queue
+import threading
 from tqdm import tqdm
-def evaluate_jsonl_file(input_file: str, output_file: str, chunk_size: int = 1):
+
+# 不需要执行代码即可判定的约束（仅做静态分析）
+RUNTIME_CASE_TYPES = {"time_limit", "storage_limit", "output_format"}
+
+def case_in_mode(case_type: str, mode: str) -> bool:
+    """判断某个约束类型在当前评估模式下是否需要评估"""
+    if mode == "static":
+        return case_type not in RUNTIME_CASE_TYPES
+    if mode == "runtime":
+        return case_type in RUNTIME_CASE_TYPES
+    return True
+
+def parse_test_results(output_text):
+    """从评估器的输出文本中解析测试结果"""
+    # 提取成功/失败信息
+    success_pattern = r"测试摘要: 通过 (\d+)/(\d+)"
+    success_match = re.search(success_pattern, output_text)
+    
+    if success_match:
+        passed = int(success_match.group(1))
+        total = int(success_match.group(2))
+        success = passed == total
+    else:
+        success = False
+    
+    # 提取所有内存使用值
+    memory_pattern = r"内存使用: ([\d.]+) KB"
+    memory_values = [float(x) for x in re.findall(memory_pattern, output_text)]
+    max_memory = max(memory_values) if memory_values else 0
+    
+    # 提取所有执行时间
+    time_pattern = r"执行时间: ([\d.]+) 毫秒"
+    time_values = [float(x) for x in re.findall(time_pattern, output_text)]
+    max_time = max(time_values) if time_values else 0
+    
+    #提取输出格式(output_format: direct/'{ output }')
+    format_pattern = r"(?:输出格式|output_format):\s+(direct|\{.*?\})"
+    format_value = re.search(format_pattern, output_text)
+    output_format = format_value.group(1) if format_value else None
+    
+    # 提取通过/总数
+    passed_tests = passed if success_match else 0
+    total_tests = total if success_match else 0
+    
+    return {
+        "success": success,
+        "max_memory": max_memory,
+        "max_time": max_time,
+        "passed_tests": passed_tests,
+        "total_tests": total_tests,
+        "output_format": output_format
+    }
+
+def build_runtime_turn(runtime_result: Dict[str, Any], parsed_info: Dict[str, Any]) -> Dict[str, Any]:
+    """一次代码运行的结果（第0轮的turn和各轮的runtime_turn）"""
+    return {
+        "turn": 0,
+        "type": "runtime_evaluation",
+        "success": parsed_info["success"],
+        "details": {
+            "error": runtime_result.get("error"),
+            "compilation_error": runtime_result.get("compilation_error"),
+            "memory_usage": parsed_info["max_memory"],
+            "execution_time": parsed_info["max_time"],
+            "test_summary": {
+                "passed": parsed_info["passed_tests"],
+                "total": parsed_info["total_tests"],
+                "pass_rate": parsed_info["passed_tests"] / parsed_info["total_tests"] if parsed_info["total_tests"] > 0 else 0
+            }
+        }
+    }
+
+def normalize_code_for_hash(code: str) -> str:
+    """统一换行符、去掉行尾空白和首尾空行，用于判断两轮代码是否相同"""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+def execution_key(evaluator: CodeEvaluator, code: str, language: str) -> str:
+    """根据标准化后的代码和语言计算执行缓存的键"""
+    norm_language = evaluator.normalize_language(language)
+    content = norm_language + '\0' + normalize_code_for_hash(code)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def run_code_cached(evaluator: CodeEvaluator, execution_cache: Dict[str, Any], code: str, language: str,
+                    test_cases: List[Dict[str, Any]], run_stats: Optional[Dict[str, int]] = None,
+                    timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    同一个样本中相同的程序只执行一次，结果共享给所有使用该程序的轮次
+    
+    Args:
+        execution_cache: 样本内的执行结果缓存（键为execution_key）
+        run_stats: 可选的统计字典，累计requested（需要执行的次数）和executed（实际执行的次数）
+        timeout: 每个测试用例的运行超时（秒），见CodeEvaluator.run_code
+    """
+    key = execution_key(evaluator, code, language)
+    if run_stats is not None:
+        run_stats["requested"] = run_stats.get("requested", 0) + 1
+    if key not in execution_cache:
+        execution_cache[key] = evaluator.run_code(code, language, test_cases, timeout)
+        if run_stats is not None:
+            run_stats["executed"] = run_stats.get("executed", 0) + 1
+    return execution_cache[key]
+
+def evaluate_sample(evaluator: CodeEvaluator, data: Dict[str, Any], line_num: int, mode: str = "full",
+                    run_stats: Optional[Dict[str, int]] = None, case_timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    评估单个样本的所有轮次
+    
+    Args:
+        evaluator: CodeEvaluator实例
+        data: JSONL中的一行数据
+        line_num: 行号，用于生成缺省的question_id
+        mode: "full"（执行+全部约束）、"static"（只评估静态约束，不执行代码）或 "runtime"（只执行代码并评估运行时约束）
+        run_stats: 可选的执行统计字典，见run_code_cached
+        case_timeout: 该题每个测试用例的运行超时（秒），None表示使用默认值
+        
+    Returns:
+        评估结果字典
+    """
+    question_id = data.get("question_id", f"question_{line_num}")
+    # 直接读取生成脚本的原始输出：缺少model_response_turn{N}_code时从model_response_turn{N}中提取代码
+    add_code_fields(data)
+    execution_cache = {}  # 样本内相同代码只执行一次
+    code = data.get("model_response_turn0_code", "")
+    language = data.get("model_response_turn0_code_languages", "Python")
+    test_cases = []
+    if "decoded_private_test_cases" in data:
+        try:
+            test_cases = data["decoded_private_test_cases"]
+        except:
+            test_cases = []
+    if mode != "static" and any(key.startswith("model_response_turn") and key.endswith("_code") and value
+                                for key, value in data.items()):
+        # 测试用例每个样本只写一次文件（或使用测试用例库中的文件），各轮运行只传文件路径；
+        # 第0轮没有代码时后面的轮次仍然要运行代码，所以只要有一轮有代码就准备测试用例
+        test_cases = evaluator.prepare_test_cases(question_id, test_cases)
+
+    if not code:
+        result = {
+            "question_id": question_id,
+            "turns": [],
+            "overall_success": False
+        }
+        runtime_turn = {
+            "turn": 0,
+            "type": "runtime_evaluation",
+            "success": False,
+            "details": {
+                "error": "代码为空",
+            }
+        }
+        result["turns"].append(runtime_turn)
+    else:
+        code = code[0]
+        language = language[0]
+        
+        result = {
+            "question_id": question_id,
+            "turns": []
+        }
+        
+        if mode != "static":
+            runtime_result = run_code_cached(evaluator, execution_cache, code, language, test_cases, run_stats, case_timeout)
+            gc.collect()  # 运行代码后立即清理内存
+            
+            # 假设runtime_result中有个results数组，且第一个元素包含输出
+            parsed_info = parse_test_results(runtime_result.get("results", [{}])[0].get("output", ""))
+            result["turns"].append(build_runtime_turn(runtime_result, parsed_info))
+    
+    turn_count = 1
+    
+    while f"turn{turn_count}_kwargs" in data and f"turn{turn_count}_prompt" in data and f"turn{turn_count}_params" in data:
+        last_runtime_result = None  # 跟踪最后一个成功的runtime结果
+        case_type = data[f"turn{turn_count}_kwargs"]
+        prompt = data[f"turn{turn_count}_prompt"]
+        requirement_result = []
+        evaluated_types = []
+        for i in range(len(case_type)):
+            if not case_in_mode(case_type[i], mode):
+                continue
+            evaluated_types.append(case_type[i])
+            # 从提示中提取参数
+            params = data[f"turn{turn_count}_params"][i]
+            turn_code = data.get(f"model_response_turn{turn_count}_code", "")
+            turn_language = data.get(f"model_response_turn{turn_count}_code_languages", language)
+            
+            if not turn_code:
+                # 如果代码为空，跳过评估
+                turn_result = {
+                    "turn": turn_count,
+                    "type": case_type[i],
+                    "prompt": prompt[i],
+                    "parameters": params,
+                    "success": False,
+                    "details": "代码为空",
+                    "language_type": 0
+                }
+
+                result["turns"].append(turn_result)
+                turn_count += 1
+                continue
+            else:
+                # 如过参数中有language，使用参数中的language
+                if "language" in params:
+                    language = params["language"]
+                
+                turn_code = turn_code[0]
+                turn_language = turn_language[0]
+                
+                if mode == "static":
+                    # 静态模式不执行代码，运行时信息为空
+                    parsed_info = None
+                elif not last_runtime_result:
+                    # 清理一次内存再运行代码
+                    gc.collect()
+                    requirement_runtime_result = run_code_cached(evaluator, execution_cache, turn_code, turn_language, test_cases, run_stats, case_timeout)
+                    last_runtime_result = requirement_runtime_result  # 更新最后一个runtime结果
+                    gc.collect()  # 代码运行后再次清理
+                
+                if mode != "static":
+                    # 获取输出文本
+                    output_text = ""
+                    if last_runtime_result.get("results") and len(last_runtime_result.get("results")) > 0:
+                        output_text = last_runtime_result["results"][0].get("output", "")
+
+                    # 使用parse_test_results获取解析信息
+                    parsed_info = parse_test_results(output_text)
+                
+                # 评估要求
+                requirement_result.append(evaluator.evaluate_requirements(turn_code, case_type[i], params, turn_language, parsed_info))
+                
+            # 在现有的turn_result上添加runtime_turn
+            turn_result = {
+                "turn": turn_count,
+                "type": evaluated_types if mode != "full" else case_type,
+                "prompt": prompt,
+                "parameters": params,
+                "success": [r.get("requirement_met", False) for r in requirement_result],
+                "details": [r.get("details", "") for r in requirement_result],
+                "language_type": language == turn_language
+            }
+            if mode != "static":
+                turn_result["runtime_turn"] = build_runtime_turn(requirement_runtime_result, parsed_info)
+
+        turn_code = data.get(f"model_response_turn{turn_count}_code", "")
+        if mode == "runtime" and not evaluated_types and turn_code:
+            # 没有运行时约束的轮次也要输出该轮代码的运行结果，与--static_only的结果合并后才是完整的评估
+            turn_language = data.get(f"model_response_turn{turn_count}_code_languages", language)[0]
+            requirement_runtime_result = run_code_cached(evaluator, execution_cache, turn_code[0], turn_language, test_cases, run_stats, case_timeout)
+            gc.collect()
+            output_text = ""
+            if requirement_runtime_result.get("results"):
+                output_text = requirement_runtime_result["results"][0].get("output", "")
+            turn_result = {
+                "turn": turn_count,
+                "type": [],
+                "prompt": prompt,
+                "parameters": data[f"turn{turn_count}_params"],
+                "success": [],
+                "details": [],
+                "language_type": language == turn_language,
+                "runtime_turn": build_runtime_turn(requirement_runtime_result, parse_test_results(output_text))
+            }
+            result["turns"].append(turn_result)
+        elif evaluated_types:
+            result["turns"].append(turn_result)
+        gc.collect()  # 每个turn结束后清理一次内存
+        
+        turn_count += 1
+        if turn_count == 6:
+            break
+    
+    if mode == "static":
+        # 静态模式没有第0轮的运行结果，只看各轮约束是否满足
+        initial_runtime_success = bool(code)
+        requirement_turns = result["turns"] if code else []
+    else:
+        initial_runtime_success = result["turns"][0].get("success", False) if result["turns"] else False
+        requirement_turns = result["turns"][1:]  # 跳过第一个runtime_turn
+    requirements_success = True
+    
+    for turn in requirement_turns:
+        # 检查要求是否满足（success为[]的是--runtime_only中没有运行时约束的轮次，只看runtime_turn）
+        if not turn.get("success", False) and turn.get("success") != []:
+            requirements_success = False
+            break
+        # 检查每个turn中的runtime_turn是否成功
+        if "runtime_turn" in turn and not turn["runtime_turn"].get("success", False):
+            requirements_success = False
+            break
+    
+    result["overall_success"] = initial_runtime_success and requirements_success
+    if mode != "full":
+        result["mode"] = mode
+    return result
+
+def evaluate_jsonl_file(input_file: str, output_file: str, chunk_size: int = 1, mode: str = "full",
+                        start_line: int = 0, end_line: Optional[int] = None, skip_lines: Optional[List[int]] = None,
+                        fail_fast: bool = False, time_budget: float = 0, timeouts_file: Optional[str] = None,
+                        results_db: Optional[str] = None, test_case_store: Optional[str] = None,
+                        parallel_cases: int = 1, python_zygote: bool = False, batch_cases: bool = False):
     """评估JSONL文件中的代码样本，一行一行处理以减少内存占用"""
-    evaluator = CodeEvaluator()
+    evaluator = CodeEvaluator(fail_fast=fail_fast, time_budget=time_budget, test_case_store=test_case_store,
+                              parallel_cases=parallel_cases, python_zygote=python_zygote,
+                              batch_cases=batch_cases)
+    timeouts = load_timeouts(timeouts_file or default_timeouts_file(input_file))
+    skip_lines = set(skip_lines or [])
+    run_stats = {"requested": 0, "executed": 0}
+    summary = new_evaluation_summary()
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as f, \
-             open(output_file, 'a', encoding='utf-8') as outfile:  # 打开输出文件用于写入
+        # 每条结果评估完立即写入（batch_size=1），中断时已完成的结果不会丢失
+        with jsonl_io.open_text(input_file, 'r') as f, \
+             jsonl_io.JsonlWriter(output_file, 'a', batch_size=1) as outfile, \
+             open_results_store(results_db, output_file) as results_store:  # 打开输出文件用于写入
             
             # 获取文件总行数，用于进度条显示
-            total_lines = sum(1 for _ in open(input_file, 'r', encoding='utf-8'))
+            with jsonl_io.open_text(input_file, 'r') as count_file:
+                total_lines = sum(1 for _ in count_file)
             
-            start_line = 369
-            end_line = min(total_lines, 401)
+            end_line = total_lines if end_line is None else min(total_lines, end_line)
             
             # 重新打开文件，跳到起始位置
             f.seek(0)
@@ -1669,8 +1948,9 @@ def evaluate_jsonl_file(input_file: str, output_file: str, chunk_size: int = 1):
                 # 在每行评测前清理内存和进程
                 gc.collect()
                 
-                if line_num == 632:
-                    print("跳过632行")
+                line = f.readline()
+                if line_num in skip_lines:
+                    print(f"跳过{line_num}行")
                     continue
                 
                 # 在Windows上尝试强制释放内存
@@ -1681,239 +1961,37 @@ def evaluate_jsonl_file(input_file: str, output_file: str, chunk_size: int = 1):
                     except Exception as e:
                         print(f"内存释放尝试失败: {e}")
                 
-                # 清理任何潜在的僵尸子进程
-                try:
-                    import subprocess
-                    if sys.platform != 'win32':  # Unix/Linux/Mac
-                        subprocess.call(["ps", "-ef", "|", "grep", "python", "|", "grep", "-v", "grep", "|", "awk", "'{print $2}'", "|", "xargs", "kill", "-9"], shell=True)
-                except Exception as e:
-                    print(f"进程清理尝试失败: {e}")
+                # 终止上一行评估留下的子进程（只涉及本进程启动的进程）
+                reaped = reap_descendants()
+                if reaped:
+                    print(f"已终止 {len(reaped)} 个残留子进程")
                 
-                line = f.readline()
                 if not line:
                     break  # 如果已经到文件末尾，则退出循环
                 
                 try:
                     print(f"\n正在处理第 {line_num} 行...")
-                    data = json.loads(line.strip())
-                    question_id = data.get("question_id", f"question_{line_num}")
-                    code = data.get("model_response_turn0_code", "")
-                    language = data.get("model_response_turn0_code_languages", "Python")
-
-                    if not code:
-                        result = {
-                            "question_id": question_id,
-                            "turns": [],
-                            "overall_success": False
-                        }
-                        runtime_turn = {
-                            "turn": 0,
-                            "type": "runtime_evaluation",
-                            "success": False,
-                            "details": {
-                                "error": "代码为空",
-                            }
-                        }
-                        result["turns"].append(runtime_turn)
-                    else:
-                        code = code[0]
-                        language = language[0]
-                        test_cases = []
-                        if "decoded_private_test_cases" in data:
-                            try:
-                                test_cases = data["decoded_private_test_cases"]
-                            except:
-                                test_cases = []
-                        
-                        runtime_result = evaluator.run_code(code, language, test_cases)
-                        gc.collect()  # 运行代码后立即清理内存
-                        
-                        result = {
-                            "question_id": question_id,
-                            "turns": []
-                        }
-                        
-                        def parse_test_results(output_text):
-                            # 提取成功/失败信息
-                            success_pattern = r"测试摘要: 通过 (\d+)/(\d+)"
-                            success_match = re.search(success_pattern, output_text)
-                            
-                            if success_match:
-                                passed = int(success_match.group(1))
-                                total = int(success_match.group(2))
-                                success = passed == total
-                            else:
-                                success = False
-                            
-                            # 提取所有内存使用值
-                            memory_pattern = r"内存使用: ([\d.]+) KB"
-                            memory_values = [float(x) for x in re.findall(memory_pattern, output_text)]
-                            max_memory = max(memory_values) if memory_values else 0
-                            
-                            # 提取所有执行时间
-                            time_pattern = r"执行时间: ([\d.]+) 毫秒"
-                            time_values = [float(x) for x in re.findall(time_pattern, output_text)]
-                            max_time = max(time_values) if time_values else 0
-                            
-                            #提取输出格式(output_format: direct/'{ output }')
-                            format_pattern = r"(?:输出格式|output_format):\s+(direct|\{.*?\})"
-                            format_value = re.search(format_pattern, output_text)
-                            output_format = format_value.group(1) if format_value else None
-                            
-                            # 提取通过/总数
-                            passed_tests = passed if success_match else 0
-                            total_tests = total if success_match else 0
-                            
-                            return {
-                                "success": success,
-                                "max_memory": max_memory,
-                                "max_time": max_time,
-                                "passed_tests": passed_tests,
-                                "total_tests": total_tests,
-                                "output_format": output_format
-                            }
-                        
-                        # 假设runtime_result中有个results数组，且第一个元素包含输出
-                        parsed_info = parse_test_results(runtime_result.get("results", [{}])[0].get("output", ""))
-                        runtime_turn = {
-                            "turn": 0,
-                            "type": "runtime_evaluation",
-                            "success": parsed_info["success"],
-                            "details": {
-                                "error": runtime_result.get("error"),
-                                "compilation_error": runtime_result.get("compilation_error"),
-                                "memory_usage": parsed_info["max_memory"],
-                                "execution_time": parsed_info["max_time"],
-                                "test_summary": {
-                                    "passed": parsed_info["passed_tests"],
-                                    "total": parsed_info["total_tests"],
-                                    "pass_rate": parsed_info["passed_tests"] / parsed_info["total_tests"] if parsed_info["total_tests"] > 0 else 0
-                                }
-                            }
-                        }
-                        
-                        result["turns"].append(runtime_turn)
-                    
-                    turn_count = 1
-                    
-                    while f"turn{turn_count}_kwargs" in data and f"turn{turn_count}_prompt" in data and f"turn{turn_count}_params" in data:
-                        last_runtime_result = None  # 跟踪最后一个成功的runtime结果
-                        case_type = data[f"turn{turn_count}_kwargs"]
-                        prompt = data[f"turn{turn_count}_prompt"]
-                        requirement_result = []
-                        for i in range(len(case_type)):
-                            # 从提示中提取参数
-                            params = data[f"turn{turn_count}_params"][i]
-                            turn_code = data.get(f"model_response_turn{turn_count}_code", "")
-                            turn_language = data.get(f"model_response_turn{turn_count}_code_languages", language)
-                            
-                            if not turn_code:
-                                # 如果代码为空，跳过评估
-                                turn_result = {
-                                    "turn": turn_count,
-                                    "type": case_type[i],
-                                    "prompt": prompt[i],
-                                    "parameters": params,
-                                    "success": False,
-                                    "details": "代码为空",
-                                    "language_type": 0
-                                }
-
-                                result["turns"].append(turn_result)
-                                turn_count += 1
-                                continue
-                            else:
-                                # 如过参数中有language，使用参数中的language
-                                if "language" in params:
-                                    language = params["language"]
-                                
-                                turn_code = turn_code[0]
-                                turn_language = turn_language[0]
-                                
-                                if not last_runtime_result:
-                                    # 清理一次内存再运行代码
-                                    gc.collect()
-                                    requirement_runtime_result = evaluator.run_code(turn_code, turn_language, test_cases)
-                                    last_runtime_result = requirement_runtime_result  # 更新最后一个runtime结果
-                                    gc.collect()  # 代码运行后再次清理
-                                
-                                # 获取输出文本
-                                output_text = ""
-                                if last_runtime_result.get("results") and len(last_runtime_result.get("results")) > 0:
-                                    output_text = last_runtime_result["results"][0].get("output", "")
-
-                                # 使用parse_test_results获取解析信息
-                                parsed_info = parse_test_results(output_text)
-                                
-                                # 评估要求
-                                requirement_result.append(evaluator.evaluate_requirements(turn_code, case_type[i], params, turn_language, parsed_info))
-                                
-                            # 在现有的turn_result上添加runtime_turn
-                            turn_result = {
-                                "turn": turn_count,
-                                "type": case_type,
-                                "prompt": prompt,
-                                "parameters": params,
-                                "success": [r.get("requirement_met", False) for r in requirement_result],
-                                "details": [r.get("details", "") for r in requirement_result],
-                                "language_type": language == turn_language,
-                                "runtime_turn": {
-                                    "turn": 0,
-                                    "type": "runtime_evaluation",
-                                    "success": parsed_info["success"],
-                                    "details": {
-                                        "error": requirement_runtime_result.get("error"),
-                                        "compilation_error": requirement_runtime_result.get("compilation_error"),
-                                        "memory_usage": parsed_info["max_memory"],
-                                        "execution_time": parsed_info["max_time"],
-                                        "test_summary": {
-                                            "passed": parsed_info["passed_tests"],
-                                            "total": parsed_info["total_tests"],
-                                            "pass_rate": parsed_info["passed_tests"] / parsed_info["total_tests"] 
-                                                        if parsed_info["total_tests"] > 0 else 0
-                                        }
-                                    }
-                                }
-                            }
-
-                        result["turns"].append(turn_result)
-                        gc.collect()  # 每个turn结束后清理一次内存
-                        
-                        turn_count += 1
-                        if turn_count == 6:
-                            break
-                    
-                    initial_runtime_success = result["turns"][0].get("success", False) if result["turns"] else False
-                    requirements_success = True
-                    
-                    for turn in result["turns"][1:]:  # 跳过第一个runtime_turn
-                        # 检查要求是否满足
-                        if not turn.get("success", False):
-                            requirements_success = False
-                            break
-                        # 检查每个turn中的runtime_turn是否成功
-                        if "runtime_turn" in turn and not turn["runtime_turn"].get("success", False):
-                            requirements_success = False
-                            break
+                    data = jsonl_io.loads(line)
+                    case_timeout = timeouts.get(str(data.get("question_id", f"question_{line_num}")))
+                    result = evaluate_sample(evaluator, data, line_num, mode, run_stats, case_timeout)
                     
-                    result["overall_success"] = initial_runtime_success and requirements_success
-                    
-                    # 立即将结果写入输出文件并刷新缓冲区
-                    outfile.write(json.dumps(result, ensure_ascii=False) + '\n')
-                    outfile.flush()  # 强制写入磁盘
+                    # 立即将结果写入输出文件
+                    outfile.write(result)
+                    record_result(summary, results_store, result)
                     
                     print(f"完成第{line_num}行评估，内存使用情况：{get_memory_usage_mb():.2f} MB")
                 except Exception as e:
                     print(f"处理第{line_num}行时出错: {e}")
                     traceback.print_exc()
                     # 立即将错误结果写入输出文件
-                    outfile.write(json.dumps({
+                    error_result = {
                         "question_id": f"question_{line_num}",
                         "error": str(e),
                         "overall_success": False,
                         "turns": []
-                    }, ensure_ascii=False) + '\n')
-                    outfile.flush()  # 强制写入磁盘
+                    }
+                    outfile.write(error_result)
+                    record_result(summary, results_store, error_result)
                     continue
                 
                 # 每行处理完后，强制进行全面清理
@@ -1925,45 +2003,291 @@ def evaluate_jsonl_file(input_file: str, output_file: str, chunk_size: int = 1):
                     except:
                         pass
             
-        # 打印摘要
-        with open(output_file, 'r', encoding='utf-8') as f:
-            results = [json.loads(line.strip()) for line in f]
-        success_count = sum(1 for r in results if r.get("overall_success", False))
-        print(f"评估完成。结果已保存到 {output_file}")
-        print(f"成功率: {success_count}/{len(results)} ({success_count/len(results)*100:.1f}%)" if results else "无结果")
-        
-        # 打印每轮的成功率统计
-        turn_success = {}
-        for result in results:
-            for turn in result.get("turns", []):
-                turn_num = turn.get("turn")
-                if turn_num is not None:
-                    if turn_num not in turn_success:
-                        turn_success[turn_num] = {"success": 0, "total": 0}
-                    turn_success[turn_num]["total"] += 1
-                    
-                    # Check both requirement success and runtime success
-                    requirement_success = turn.get("success", False)
-                    runtime_success = True  # Default to True for turns that might not have runtime checks
-                    
-                    # Check runtime success if available
-                    if "runtime_turn" in turn:
-                        runtime_success = turn["runtime_turn"].get("success", False)
-                    
-                    # Only count as successful if both requirement and runtime checks pass
-                    if requirement_success and runtime_success:
-                        turn_success[turn_num]["success"] += 1
-
-        # 按轮次排序并打印
-        for turn_num in sorted(turn_success.keys()):
-            stats = turn_success[turn_num]
-            success_rate = stats["success"] / stats["total"] * 100 if stats["total"] > 0 else 0
-            print(f"第{turn_num}轮: {stats['success']}/{stats['total']} ({success_rate:.1f}%)")
+        print_evaluation_summary(output_file, summary)
+        print_run_stats(run_stats)
                 
     except Exception as e:
         print(f"处理文件时出错: {e}")
         traceback.print_exc()
 
+def default_timeouts_file(input_file: str) -> str:
+    """超时配置默认保存在数据文件旁边：<input_file>.timeouts.json"""
+    return input_file + ".timeouts.json"
+
+def load_timeouts(timeouts_file: str) -> Dict[str, float]:
+    """读取每道题的超时配置 {question_id: 秒}，文件不存在时返回空字典（使用默认超时）"""
+    if not timeouts_file or not os.path.exists(timeouts_file):
+        return {}
+    with open(timeouts_file, 'r', encoding='utf-8') as f:
+        timeouts = json.load(f)
+    print(f"已加载 {len(timeouts)} 道题的超时配置: {timeouts_file}")
+    return timeouts
+
+def calibrate_timeouts(input_file: str, reference_field: str, timeouts_file: Optional[str] = None,
+                       factor: float = 5.0, floor: float = 1.0, cap: float = 10.0,
+                       test_case_store: Optional[str] = None) -> Dict[str, float]:
+    """
+    运行每道题的参考代码，根据其最长的单个用例执行时间计算该题的超时：
+    min(cap, max(floor, factor × 参考时间))。没有参考代码或参考代码未全部通过的题不写入（使用默认超时）
+    
+    Args:
+        reference_field: 参考代码字段（代码列表），语言字段为 f"{reference_field}_languages"。
+            必须是参考解答，不能是被评估的模型回答，否则超时会随模型代码的快慢变化
+        factor: 参考时间的倍数
+        floor: 超时下限（秒），避免启动较慢的正确代码被误杀
+        cap: 超时上限（秒）
+    """
+    evaluator = CodeEvaluator(test_case_store=test_case_store)
+    timeouts_file = timeouts_file or default_timeouts_file(input_file)
+    timeouts = load_timeouts(timeouts_file)
+    
+    records = jsonl_io.load_jsonl(input_file)
+    missing = 0
+    
+    for line_num, data in enumerate(tqdm(records, desc="超时校准进度", unit="line", ncols=100)):
+        question_id = str(data.get("question_id", f"question_{line_num}"))
+        code = data.get(reference_field)
+        if question_id in timeouts:
+            continue
+        if not code:
+            missing += 1
+            continue
+        language = data.get(f"{reference_field}_languages", ["Python"])
+        test_cases = evaluator.prepare_test_cases(question_id, data.get("decoded_private_test_cases", []))
+        
+        # 参考代码用上限超时运行
+        runtime_result = evaluator.run_code(code[0], language[0], test_cases, cap)
+        output_text = ""
+        if runtime_result.get("results"):
+            output_text = runtime_result["results"][0].get("output", "")
+        parsed_info = parse_test_results(output_text)
+        if not parsed_info["success"]:
+            print(f"{question_id}: 参考代码未通过全部测试用例，使用默认超时")
+            continue
+        
+        reference_seconds = parsed_info["max_time"] / 1000
+        timeouts[question_id] = round(min(cap, max(floor, factor * reference_seconds)), 3)
+        
+        # 每道题校准后立即保存，中断后可以继续
+        with open(timeouts_file, 'w', encoding='utf-8') as out:
+            json.dump(timeouts, out, ensure_ascii=False, indent=2)
+    
+    if missing:
+        print(f"{missing} 道题没有 {reference_field} 字段，使用默认超时")
+    print(f"超时校准完成，共 {len(timeouts)} 道题，已保存到 {timeouts_file}")
+    return timeouts
+
+# 评估工作进程中的评估器（每个进程一个）
+_worker_evaluator = None
+
+def _init_evaluation_worker(fail_fast: bool = False, time_budget: float = 0, test_case_store: Optional[str] = None):
+    """评估工作进程初始化：每个进程使用自己的代码目录，避免并发评估互相覆盖代码文件"""
+    global _worker_evaluator
+    _worker_evaluator = CodeEvaluator(fail_fast=fail_fast, time_budget=time_budget, test_case_store=test_case_store,
+                                      code_dir=os.path.join("code_files", f"worker_{os.getpid()}"))
+
+def _get_worker_evaluator() -> CodeEvaluator:
+    if _worker_evaluator is None:
+        _init_evaluation_worker()
+    return _worker_evaluator
+
+def create_evaluation_pool(workers: int, fail_fast: bool = False, time_budget: float = 0,
+                           test_case_store: Optional[str] = None) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    创建评估进程池，供生成脚本在每个对话完成后立即提交评估（见evaluate_record）
+    
+    使用spawn启动进程：提交评估的是生成脚本的API线程，在多线程进程中fork不安全
+    """
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context("spawn"),
+                                                  initializer=_init_evaluation_worker,
+                                                  initargs=(fail_fast, time_budget, test_case_store))
+
+def evaluate_record(data: Dict[str, Any], line_num: int, mode: str = "full",
+                    case_timeout: Optional[float] = None) -> Dict[str, Any]:
+    """评估工作进程：评估一条已解析的记录，出错时返回错误结果"""
+    try:
+        return evaluate_sample(_get_worker_evaluator(), data, line_num, mode, case_timeout=case_timeout)
+    except Exception as e:
+        traceback.print_exc()
+        return {
+            "question_id": data.get("question_id", f"question_{line_num}"),
+            "error": str(e),
+            "overall_success": False,
+            "turns": []
+        }
+
+def _evaluate_static_line(task):
+    """静态评估工作进程：解析一行JSON并只评估静态约束"""
+    line_num, line = task
+    try:
+        data = jsonl_io.loads(line)
+        return evaluate_sample(_get_worker_evaluator(), data, line_num, mode="static")
+    except Exception as e:
+        return {
+            "question_id": f"question_{line_num}",
+            "error": str(e),
+            "overall_success": False,
+            "turns": [],
+            "mode": "static"
+        }
+
+def evaluate_static_only(input_file: str, output_file: str, workers: int = 0,
+                         start_line: int = 0, end_line: Optional[int] = None, results_db: Optional[str] = None):
+    """
+    只评估静态约束（不执行代码），用多进程并行处理整个文件
+    
+    Args:
+        input_file: 输入JSONL文件
+        output_file: 输出JSONL文件（追加写入）
+        workers: 进程数，0表示使用CPU核数
+        results_db: 同时写入的结果数据库（SQLite），None表示不写
+    """
+    workers = workers or multiprocessing.cpu_count()
+    
+    def iter_lines():
+        with jsonl_io.open_text(input_file, 'r') as f:
+            for line_num, line in enumerate(f):
+                if line_num < start_line:
+                    continue
+                if end_line is not None and line_num >= end_line:
+                    break
+                if line.strip():
+                    yield line_num, line
+    
+    total_lines = sum(1 for _ in iter_lines())
+    start_time = time.time()
+    summary = new_evaluation_summary()
+    with jsonl_io.JsonlWriter(output_file, 'a') as outfile, \
+         open_results_store(results_db, output_file) as results_store, \
+         multiprocessing.Pool(processes=workers) as pool:
+        # imap保持输入顺序，chunksize把多行打包发给同一个进程以减少进程间通信
+        results = pool.imap(_evaluate_static_line, iter_lines(), chunksize=16)
+        for result in tqdm(results, total=total_lines, desc="静态评估进度", unit="line", ncols=100):
+            outfile.write(result)
+            record_result(summary, results_store, result)
+    print(f"静态评估 {total_lines} 行耗时 {time.time() - start_time:.1f} 秒 (进程数: {workers})")
+    print_evaluation_summary(output_file, summary)
+
+def new_evaluation_summary() -> Dict[str, Any]:
+    """评估摘要：总数、成功数和每轮的成功/总数，随结果写入逐条累计"""
+    return {"total": 0, "success": 0, "turns": {}}
+
+def update_evaluation_summary(summary: Dict[str, Any], result: Dict[str, Any]):
+    """把一条评估结果计入摘要"""
+    summary["total"] += 1
+    if result.get("overall_success", False):
+        summary["success"] += 1
+    
+    turn_success = summary["turns"]
+    for turn in result.get("turns", []):
+        turn_num = turn.get("turn")
+        if turn_num is not None:
+            if turn_num not in turn_success:
+                turn_success[turn_num] = {"success": 0, "total": 0}
+            turn_success[turn_num]["total"] += 1
+            
+            # Check both requirement success and runtime success
+            requirement_success = turn.get("success", False)
+            runtime_success = True  # Default to True for turns that might not have runtime checks
+            
+            # Check runtime success if available
+            if "runtime_turn" in turn:
+                runtime_success = turn["runtime_turn"].get("success", False)
+            
+            # Only count as successful if both requirement and runtime checks pass
+            if requirement_success and runtime_success:
+                turn_success[turn_num]["success"] += 1
+
+def open_results_store(results_db: Optional[str], source: str):
+    """打开结果数据库，以输出文件名作为source；未指定数据库时返回空上下文"""
+    if not results_db:
+        return contextlib.nullcontext()
+    return ResultsStore(results_db, source)
+
+def record_result(summary: Dict[str, Any], results_store: Optional[ResultsStore], result: Dict[str, Any]):
+    """把一条评估结果计入摘要，并写入结果数据库（如果有）"""
+    update_evaluation_summary(summary, result)
+    if results_store is not None:
+        results_store.add(result)
+
+class EvaluationWriter:
+    """
+    在单独的线程中把评估结果逐条写入输出文件（每条立即写入）和结果数据库（如果有）
+    
+    add可以在任何线程中调用（例如评估future的回调）；SQLite连接只能在创建它的线程中使用，
+    所以输出文件和数据库都由写入线程打开。结果按完成顺序写入，写入的结果保存在results中
+    """
+    
+    def __init__(self, output_file: str, results_db: Optional[str] = None):
+        self.results = []
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(output_file, results_db), daemon=True)
+        self._thread.start()
+    
+    def add(self, result: Dict[str, Any]):
+        self._queue.put(result)
+    
+    def close(self):
+        """写完已提交的结果后关闭文件和数据库，写入出错时在这里抛出"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+    
+    def _run(self, output_file: str, results_db: Optional[str]):
+        try:
+            with jsonl_io.JsonlWriter(output_file, 'w', batch_size=1) as writer, \
+                 open_results_store(results_db, output_file) as results_store:
+                while True:
+                    result = self._queue.get()
+                    if result is None:
+                        return
+                    writer.write(result)
+                    if results_store is not None:
+                        results_store.add(result)
+                    self.results.append(result)
+        except Exception as e:
+            self._error = e
+
+def summarize_results(results) -> Dict[str, Any]:
+    """根据一组评估结果计算摘要"""
+    summary = new_evaluation_summary()
+    for result in results:
+        update_evaluation_summary(summary, result)
+    return summary
+
+def print_evaluation_summary(output_file: str, summary: Optional[Dict[str, Any]] = None):
+    """打印总体与每轮的成功率；没有传入摘要时读取输出文件计算"""
+    if summary is None:
+        summary = summarize_results(jsonl_io.iter_jsonl(output_file))
+    # 打印摘要
+    success_count = summary["success"]
+    total = summary["total"]
+    print(f"评估完成。结果已保存到 {output_file}")
+    print(f"成功率: {success_count}/{total} ({success_count/total*100:.1f}%)" if total else "无结果")
+    
+    # 打印每轮的成功率统计
+    turn_success = summary["turns"]
+
+    # 按轮次排序并打印
+    for turn_num in sorted(turn_success.keys()):
+        stats = turn_success[turn_num]
+        success_rate = stats["success"] / stats["total"] * 100 if stats["total"] > 0 else 0
+        print(f"第{turn_num}轮: {stats['success']}/{stats['total']} ({success_rate:.1f}%)")
+
+def print_run_stats(run_stats: Dict[str, int]):
+    """打印代码执行的去重统计"""
+    requested = run_stats.get("requested", 0)
+    executed = run_stats.get("executed", 0)
+    if requested == 0:
+        return
+    dedupe_ratio = (requested - executed) / requested * 100
+    print(f"代码执行: 需要 {requested} 次，实际执行 {executed} 次，去重率 {dedupe_ratio:.1f}%")
+
 # 添加一个函数来获取当前进程的内存使用情况
 def get_memory_usage_mb():
     """获取当前进程的内存使用情况（MB）"""
@@ -1977,6 +2301,8 @@ def get_memory_usage_mb():
 import argparse
 
 if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    
     # Create argument parser
     parser = argparse.ArgumentParser(description="Evaluate code generation results")
     parser.add_argument("--input_file", type=str, 
@@ -1987,13 +2313,69 @@ if __name__ == "__main__":
                         help="Path to output JSONL file")
     parser.add_argument("--shutdown", action="store_true",
                         help="Shutdown computer after evaluation")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--static_only", action="store_true",
+                            help="Only evaluate static constraints, without executing any code")
+    mode_group.add_argument("--runtime_only", action="store_true",
+                            help="Only execute code and evaluate runtime constraints (time_limit, storage_limit, output_format)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of processes for --static_only (0 = CPU count)")
+    parser.add_argument("--start_line", type=int, default=0,
+                        help="First line (0-based) of the input file to evaluate")
+    parser.add_argument("--end_line", type=int, default=None,
+                        help="Stop before this line (default: end of file)")
+    parser.add_argument("--skip_lines", type=int, nargs="*", default=[],
+                        help="Line numbers to skip")
+    parser.add_argument("--fail_fast", action="store_true",
+                        help="Stop running test cases of a submission after the first failure (remaining cases count as failed)")
+    parser.add_argument("--time_budget", type=float, default=0,
+                        help="Total time budget in seconds for all test cases of a submission (0 = unlimited)")
+    parser.add_argument("--parallel_cases", type=int, default=1,
+                        help="Run up to this many C/C++ or Java test cases of a submission at once (compiled once)")
+    parser.add_argument("--batch_cases", action="store_true",
+                        help="Run all Python or Java test cases of a submission in one zygote / JVM instead of one process per case")
+    parser.add_argument("--python_zygote", action="store_true",
+                        help="Run Python test cases in processes forked from a zygote with common modules pre-imported (POSIX only)")
+    parser.add_argument("--timeouts_file", type=str, default=None,
+                        help="Per-problem timeouts JSON {question_id: seconds} (default: <input_file>.timeouts.json if it exists)")
+    parser.add_argument("--test_case_store", type=str, default=None,
+                        help="Test case directory written by test_case_store.py; used for questions found in its index")
+    parser.add_argument("--results_db", type=str, default=None,
+                        help="Also write results to this SQLite database (one row per question/turn/constraint, see results_store.py)")
+    parser.add_argument("--calibrate_timeouts", action="store_true",
+                        help="Run the reference solutions and write per-problem timeouts to --timeouts_file, then exit")
+    parser.add_argument("--reference_field", type=str, default=None,
+                        help="Field holding the reference solution used by --calibrate_timeouts (required with it)")
+    parser.add_argument("--timeout_factor", type=float, default=5.0,
+                        help="Timeout = factor x reference runtime (--calibrate_timeouts)")
+    parser.add_argument("--timeout_floor", type=float, default=1.0,
+                        help="Minimum per-case timeout in seconds (--calibrate_timeouts)")
+    parser.add_argument("--timeout_cap", type=float, default=10.0,
+                        help="Maximum per-case timeout in seconds (--calibrate_timeouts)")
     
     # Parse arguments
     args = parser.parse_args()
     
+    if args.calibrate_timeouts:
+        if not args.reference_field:
+            parser.error("--calibrate_timeouts requires --reference_field (a reference solution, not the model's answer)")
+        calibrate_timeouts(args.input_file, args.reference_field, args.timeouts_file,
+                           args.timeout_factor, args.timeout_floor, args.timeout_cap, args.test_case_store)
+        sys.exit(0)
+    
     print("开始评估...")
-    evaluate_jsonl_file(args.input_file, args.output_file)
+    if args.static_only:
+        evaluate_static_only(args.input_file, args.output_file, args.workers,
+                             start_line=args.start_line, end_line=args.end_line, results_db=args.results_db)
+    else:
+        evaluate_jsonl_file(args.input_file, args.output_file,
+                            mode="runtime" if args.runtime_only else "full",
+                            start_line=args.start_line, end_line=args.end_line, skip_lines=args.skip_lines,
+                            fail_fast=args.fail_fast, time_budget=args.time_budget, timeouts_file=args.timeouts_file,
+                            results_db=args.results_db, test_case_store=args.test_case_store,
+                            parallel_cases=args.parallel_cases, python_zygote=args.python_zygote,
+                            batch_cases=args.batch_cases)
     
     # Only shutdown if requested
     if args.shutdown:
-        os.system("shutdown /s /t 60")  # Windows shutdown with 60-second timer
\ No newline at end of file
+        os.system("shutdown /s /t 60")  # Windows shutdown with 60-second timer
@@ -1,7 +1,5 @@
 import sys
-import time
 import io
-import traceback
 import psutil
 import contextlib
 import argparse
@@ -10,93 +8,13 @@ import os
 import tempfile
 import subprocess
 import shutil
-import ast
-import signal
-import threading
+import sandbox_runner
+from test_case_runner import early_stop_options, fill_skipped, print_skipped
+from output_compare import detect_output_format, normalize_output, smart_compare
 from typing import Dict, Any, List, Union
 
-def normalize_output(output):
-    """
-    标准化输出字符串，处理引号和其他可能的格式差异，并检测输出格式
-    
-    Args:
-        output: 要标准化的输出字符串
-        
-    Returns:
-        tuple: (标准化后的字符串, 检测到的格式)
-    """
-    # 移除首尾空格
-    output = output.strip()
-    
-    # 检测输出格式
-    format_detected = "direct"  # 默认格式为直接输出
-    if output.startswith('{') and output.endswith('}'):
-        format_detected = '{ output }'
-    elif output.startswith('[') and output.endswith(']'):
-        format_detected = '[ output ]'
-    elif output.startswith('(') and output.endswith(')'):
-        format_detected = '( output )'
-    
-    # 如果是上述格式之一，移除首尾符号
-    if format_detected != "direct":
-        output = output[1:-1].strip()
-    
-    # 尝试解析JSON（如果是JSON格式）
-    try:
-        # 如果是合法的JSON字符串，解析并重新序列化以规范化格式
-        parsed = json.loads(f'"{output}"')  # 添加引号以使其成为合法的JSON字符串
-        return parsed, format_detected
-    except:
-        pass
-    
-    # 如果不是JSON，返回原始字符串和检测到的格式
-    return output, format_detected
-
-def smart_compare(actual, expected):
-    """
-    智能比较两个输出字符串，处理常见的格式差异
-    
-    Args:
-        actual: 实际输出
-        expected: 期望输出
-        
-    Returns:
-        布尔值，表示是否匹配
-    """
-    # 标准化实际输出和期望输出
-    actual_normalized, format_actual = normalize_output(actual)
-    expected_normalized, format_expected = normalize_output(expected)
-
-    # 直接比较
-    if actual_normalized == expected_normalized:
-        return True
-    
-    # 移除所有引号后比较
-    if actual_normalized.replace('"', '').replace("'", '') == expected_normalized.replace('"', '').replace("'", ''):
-        return True
-    
-    # 尝试解析为数字后比较
-    try:
-        actual_num = float(actual_normalized)
-        expected_num = float(expected_normalized)
-        return abs(actual_num - expected_num) < 1e-6  # 允许小的浮点数差异
-    except:
-        pass
-    
-    # 尝试将双引号替换为单引号后比较
-    if actual_normalized.replace('"', "'") == expected_normalized.replace('"', "'"):
-        return True
-    
-    # 尝试比较JSON解析后的对象
-    try:
-        actual_obj = ast.literal_eval(actual_normalized)
-        expected_obj = ast.literal_eval(expected_normalized)
-        return actual_obj == expected_obj
-    except:
-        pass
-    
-    # 所有比较方法都失败，返回False
-    return False
+# 每个测试用例的运行超时（秒），可通过命令行参数--timeout修改
+CASE_TIMEOUT = 10
 
 def detect_language(code):
     """
@@ -151,197 +69,76 @@ def detect_language(code):
     # 默认为C
     return "c"
 
-def kill_process_tree(pid):
-    """递归杀死进程树"""
-    try:
-        parent = psutil.Process(pid)
-        children = parent.children(recursive=True)
-        
-        # 先杀死子进程
-        for child in children:
-            try:
-                child.kill()
-            except psutil.NoSuchProcess:
-                pass
-        
-        # 然后杀死父进程
-        try:
-            if parent.is_running():
-                parent.kill()
-                parent.wait(3)  # 等待进程终止
-        except psutil.NoSuchProcess:
-            pass
-        
-        return True
-    except psutil.NoSuchProcess:
-        return False
-    except Exception as e:
-        print(f"杀死进程树时出错: {e}")
-        return False
+def compile_code(code: str, language: str, temp_dir: str) -> Dict[str, Any]:
+    """
+    在temp_dir中编译C/C++代码
+
+    Returns:
+        {'executable': 可执行文件路径（编译失败时为None）, 'compilation_error': ..., 'error': ...}
+    """
+    compiled = {'executable': None, 'compilation_error': None, 'error': None}
 
-def safe_communicate(proc, input_str, max_size=10*1024*1024):
-    """安全地与进程通信，避免内存溢出和编码问题"""
-    output = ""
-    stderr_data = ""
+    # 根据语言选择编译器和文件扩展名
+    if language.lower() == "cpp":
+        compiler_name = "g++"
+        file_extension = ".cpp"
+    else:  # 默认为C
+        compiler_name = "gcc"
+        file_extension = ".c"
     
-    try:
-        # 检查进程是否仍在运行
-        if proc.poll() is not None:
-            return f"[进程已结束，返回码: {proc.returncode}]", f"[进程已结束]"
-        
-        # 尝试写入输入数据（使用更健壮的方法）
-        if input_str:
-            # 确保输入以换行符结束
-            if not input_str.endswith('\n'):
-                input_str += '\n'
-                
-            try:
-                # 使用字节模式写入，避免编码问题
-                if hasattr(proc.stdin, 'buffer'):
-                    encoded_input = input_str.encode('utf-8', errors='replace')
-                    proc.stdin.buffer.write(encoded_input)
-                    proc.stdin.buffer.flush()
-                else:
-                    # 分块写入（小块以避免缓冲区问题）
-                    chunk_size = 1024  # 更小的块
-                    for i in range(0, len(input_str), chunk_size):
-                        if proc.poll() is not None:  # 再次检查进程状态
-                            break
-                        chunk = input_str[i:i+chunk_size]
-                        proc.stdin.write(chunk)
-                        proc.stdin.flush()
-                        time.sleep(0.001)  # 微小暂停，避免缓冲区问题
-            except IOError as e:
-                # 特殊处理 Broken pipe
-                if "Broken pipe" in str(e) or "pipe" in str(e).lower():
-                    stderr_data = f"[注意: 输入管道已关闭: {e}]"
-                # 特殊处理 Invalid argument
-                elif "Invalid argument" in str(e):
-                    stderr_data = f"[注意: 可能存在编码问题: {e}]"
-                    # 尝试使用临时文件重定向输入
-                    return _try_file_redirection(proc, input_str, max_size)
-                else:
-                    return f"[写入stdin失败: {e}]", f"[写入stdin失败: {e}]"
-            except Exception as e:
-                return f"[写入stdin异常: {e}]", f"[写入stdin异常: {e}]"
-        
-        # 无论写入是否成功，都尝试关闭stdin并读取输出
-        try:
-            proc.stdin.close()
-        except:
-            pass
-        
-        # 读取输出
-        try:
-            # 使用select或非阻塞读取处理stdout
-            total_read = 0
-            timeout = 10
-            start_time = time.time()
-            
-            while proc.poll() is None or proc.stdout.readable():
-                # 检查超时
-                if time.time() - start_time > timeout:
-                    return output + "\n... [读取超时]", stderr_data + "\n... [读取超时]"
-                
-                try:
-                    # 尝试读取，如果没有数据则短暂等待
-                    if hasattr(proc.stdout, 'readable') and not proc.stdout.readable():
-                        break
-                    
-                    # 读取一块数据
-                    chunk = proc.stdout.read(8192)
-                    if not chunk:
-                        # 如果进程已结束且没有更多数据，退出循环
-                        if proc.poll() is not None:
-                            break
-                        # 否则短暂等待再试
-                        time.sleep(0.05)
-                        continue
-                    
-                    output += chunk
-                    total_read += len(chunk)
-                    
-                    # 检查是否超出最大大小
-                    if total_read > max_size:
-                        output += "\n... [输出被截断，超过限制大小]"
-                        break
-                except Exception as e:
-                    stderr_data += f"\n读取stdout时出错: {str(e)}"
-                    break
-            
-            # 尝试读取stderr
-            try:
-                stderr_data = proc.stderr.read() or ""
-                if len(stderr_data) > max_size:
-                    stderr_data = stderr_data[:max_size] + "\n... [stderr被截断]"
-            except Exception as e:
-                stderr_data += f"\n读取stderr时出错: {str(e)}"
-        
-        except Exception as e:
-            stderr_data += f"\n读取输出时出错: {str(e)}"
-        
-        return output, stderr_data
+    # 检查是否安装了编译器
+    compiler_path = shutil.which(compiler_name)
+    if not compiler_path:
+        compiled['compilation_error'] = f"找不到{compiler_name}编译器。请确保{compiler_name}已安装并添加到系统PATH环境变量中。"
+        compiled['error'] = f"编译环境错误: 找不到{compiler_name}编译器"
+        return compiled
+    
+    # 创建源代码文件
+    source_file = os.path.join(temp_dir, f"program{file_extension}")
+    executable = os.path.join(temp_dir, "program.exe")
+    
+    # 写入源代码文件
+    with open(source_file, 'w', encoding='utf-8') as f:
+        f.write(code)
+    
+    # 编译代码
+    compile_command = [compiler_path, source_file, "-o", executable]
+    
+    # 如果代码是C++，添加适当的标志
+    if language.lower() == "cpp":
+        compile_command.append("-std=c++17")  # 使用C++17标准
     
-    except MemoryError:
-        return "[内存溢出：无法处理输出]", "[内存溢出：无法处理stderr]"
-    except Exception as e:
-        return f"[与进程通信时发生错误: {str(e)}]", f"[与进程通信时发生错误: {str(e)}]"
-
-# 辅助函数-使用临时文件作为输入
-def _try_file_redirection(proc, input_str, max_size):
-    """尝试使用临时文件重定向代替管道写入"""
     try:
-        # 终止当前进程
-        if proc and proc.poll() is None:
-            kill_process_tree(proc.pid)
-        
-        # 创建临时文件并写入输入
-        with tempfile.NamedTemporaryFile('w', delete=False, encoding='utf-8') as f:
-            f.write(input_str)
-            temp_path = f.name
-        
-        # 重新启动进程，使用文件重定向
-        new_proc = subprocess.Popen(
-            [proc.args, "<", temp_path],
-            shell=True,  # 使用shell处理重定向
+        compile_process = subprocess.run(
+            compile_command,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            encoding='utf-8',
-            errors='replace'
+            encoding='utf-8',     # 明确指定编码
+            errors='replace',     # 遇到解码错误时替换字符而不是报错
+            check=False,
+            timeout=30  # 编译超时设置为30秒
         )
         
-        # 等待进程完成，最多10秒
-        try:
-            output, stderr = new_proc.communicate(timeout=10)
-            return output, stderr
-        except subprocess.TimeoutExpired:
-            kill_process_tree(new_proc.pid)
-            return "[执行超时]", "[执行超时]"
-        finally:
-            # 删除临时文件
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-    
+        # 检查编译错误
+        if compile_process.returncode != 0:
+            compiled['compilation_error'] = compile_process.stderr
+            compiled['error'] = f"编译错误: {compile_process.stderr}"
+            return compiled
+    except subprocess.TimeoutExpired:
+        compiled['compilation_error'] = "编译超时: 编译时间超过30秒"
+        compiled['error'] = "编译超时"
+        return compiled
     except Exception as e:
-        return f"[文件重定向尝试失败: {e}]", f"[文件重定向尝试失败: {e}]"
-
-def evaluate_code(code: str, test_input: str, expected_output: str, language: str = "auto") -> Dict[str, Any]:
-    """
-    编译并执行给定的C/C++代码并评估其性能和正确性
+        compiled['compilation_error'] = str(e)
+        compiled['error'] = f"编译异常: {str(e)}"
+        return compiled
     
-    Args:
-        code: 要执行的代码字符串
-        test_input: 测试输入
-        expected_output: 期望的输出
-        language: 编程语言，"c"、"cpp"或"auto"（自动检测）
-        
-    Returns:
-        包含评估结果的字典
-    """
-    result = {
+    compiled['executable'] = executable
+    return compiled
+
+def new_test_result() -> Dict[str, Any]:
+    return {
         'correct': False,
         'execution_time': 0,
         'memory_usage': 0,
@@ -350,278 +147,117 @@ def evaluate_code(code: str, test_input: str, expected_output: str, language: st
         'compilation_error': None,
         'output_format': None
     }
+
+def build_test_result(run: sandbox_runner.RunResult, expected_output: str, memory_usage: float = 0) -> Dict[str, Any]:
+    """把sandbox_runner的运行结果转换为测试用例结果"""
+    result = new_test_result()
+    result['execution_time'] = run.execution_time
     
+    if run.spawn_error:
+        result['error'] = f"执行异常: {run.spawn_error}"
+        return result
+    if run.timed_out:
+        # 超时的运行时间就是该测试用例的超时
+        result['error'] = f"运行超时: 程序执行时间超过{run.execution_time / 1000:g}秒"
+        result['output'] = "运行超时"
+        return result
+    
+    # 获取输出
+    if run.output_mismatch:
+        # 输出与期望不符，进程是被提前终止的，不算运行时错误
+        result['output'] = run.stdout.strip()
+    elif run.returncode != 0:
+        result['error'] = f"运行时错误 (返回码 {run.returncode}): {run.stderr}"
+        result['output'] = run.stdout
+    else:
+        result['output'] = run.stdout.strip()
+    
+    expected_output = expected_output.strip()
+    
+    # 检测输出格式（比较见smart_compare）
+    output_format = detect_output_format(result['output'])
+    
+    # 使用智能比较检查结果
+    result['correct'] = not run.output_mismatch and smart_compare(result['output'], expected_output)
+    result['output_format'] = output_format  # 记录检测到的输出格式
+    result['memory_usage'] = memory_usage
+    return result
+
+def resolve_language(code: str, language: str) -> str:
     # 如果是自动检测模式，检测代码语言
     if language.lower() == "auto":
         language = detect_language(code)
         print(f"自动检测到代码语言: {language}")
+    return language
+
+def evaluate_code(code: str, test_input: str, expected_output: str, language: str = "auto",
+                  timeout: float = None) -> Dict[str, Any]:
+    """
+    编译并执行给定的C/C++代码并评估其性能和正确性
     
-    # 根据语言选择编译器和文件扩展名
-    if language.lower() == "cpp":
-        compiler_name = "g++"
-        file_extension = ".cpp"
-    else:  # 默认为C
-        compiler_name = "gcc"
-        file_extension = ".c"
+    Args:
+        code: 要执行的代码字符串
+        test_input: 测试输入
+        expected_output: 期望的输出
+        language: 编程语言，"c"、"cpp"或"auto"（自动检测）
+        timeout: 运行超时（秒），默认CASE_TIMEOUT
+        
+    Returns:
+        包含评估结果的字典
+    """
+    return evaluate_code_batch(code, [test_input], [expected_output], language, timeout=timeout)[0]
+
+def evaluate_code_batch(code: str, inputs: List[str], outputs: List[str], language: str = "auto",
+                        concurrency: int = 1, timeout: float = None, fail_fast: bool = False,
+                        time_budget: float = 0) -> List[Dict[str, Any]]:
+    """
+    编译一次代码，然后用一次sandbox_runner.run_batch运行所有测试用例，最多同时运行concurrency个进程
+    （每个测试用例的超时为timeout秒，默认CASE_TIMEOUT）
     
-    # 检查是否安装了编译器
-    compiler_path = shutil.which(compiler_name)
-    if not compiler_path:
-        result['compilation_error'] = f"找不到{compiler_name}编译器。请确保{compiler_name}已安装并添加到系统PATH环境变量中。"
-        result['error'] = f"编译环境错误: 找不到{compiler_name}编译器"
-        return result
+    fail_fast: 有测试用例失败后取消其余正在运行和未开始的用例
+    time_budget: 总时间预算（秒，包括编译），用完后取消其余用例，0表示不限制
+    
+    Returns:
+        与inputs一一对应的评估结果，被取消的用例计为失败
+    """
+    early_stop = early_stop_options(
+        fail_fast, time_budget, lambda i, run: build_test_result(run, outputs[i])['correct'])
+    language = resolve_language(code, language)
     
     # 创建临时目录用于编译
     with tempfile.TemporaryDirectory() as temp_dir:
-        # 创建源代码文件
-        source_file = os.path.join(temp_dir, f"program{file_extension}")
-        executable = os.path.join(temp_dir, "program.exe")
-        
-        # 写入源代码文件
-        with open(source_file, 'w', encoding='utf-8') as f:
-            f.write(code)
-        
-        # 编译代码
-        compile_command = [compiler_path, source_file, "-o", executable]
-        
-        # 如果代码是C++，添加适当的标志
-        if language.lower() == "cpp":
-            compile_command.append("-std=c++17")  # 使用C++17标准
-        
-        try:
-            compile_process = subprocess.run(
-                compile_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',     # 明确指定编码
-                errors='replace',     # 遇到解码错误时替换字符而不是报错
-                check=False,
-                timeout=30  # 编译超时设置为30秒
-            )
-            
-            # 检查编译错误
-            if compile_process.returncode != 0:
-                result['compilation_error'] = compile_process.stderr
-                result['error'] = f"编译错误: {compile_process.stderr}"
-                return result
-        except subprocess.TimeoutExpired:
-            result['compilation_error'] = "编译超时: 编译时间超过30秒"
-            result['error'] = "编译超时"
-            return result
-        except Exception as e:
-            result['compilation_error'] = str(e)
-            result['error'] = f"编译异常: {str(e)}"
-            return result
-            
-        # 准备运行程序
+        compiled = compile_code(code, language, temp_dir)
+        if compiled['executable'] is None:
+            results = []
+            for _ in inputs:
+                result = new_test_result()
+                result['compilation_error'] = compiled['compilation_error']
+                result['error'] = compiled['error']
+                results.append(result)
+            return results
+        
+        # 测量评估进程的内存变化（与之前的memory_usage含义一致）
         process = psutil.Process()
         start_memory = process.memory_info().rss / 1024  # 初始内存 (KB)
-        
-        # 运行程序并计时
-        start_time = time.time()
-        
-        # 使用Popen而不是run，这样可以直接获取进程对象
-        proc = None
-        timer = None
-        
-        try:
-            # 使用Popen启动进程，适应不同的操作系统环境
-            if os.name != 'nt':  # 非Windows系统
-                proc = subprocess.Popen(
-                    executable,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    preexec_fn=os.setsid,  # 在新进程组中启动（Unix系统）
-                    bufsize=1024 * 1024  # 限制输出缓冲区为1MB
-                )
-            else:  # Windows系统
-                proc = subprocess.Popen(
-                    executable,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,  # Windows上的新进程组
-                    bufsize=1024 * 1024  # 限制输出缓冲区为1MB
-                )
-            
-            # 设置更强的超时控制 - 使用定时器
-            def timeout_handler():
-                """超时处理函数，强制终止进程"""
-                nonlocal proc
-                if proc and proc.poll() is None:
-                    print(f"定时器触发强制终止进程 (PID: {proc.pid})")
-                    # 使用函数终止整个进程树
-                    kill_process_tree(proc.pid)
-            
-            # 设置超时定时器（比communicate超时稍长一些，作为备份）
-            timer = threading.Timer(11, timeout_handler)
-            timer.daemon = True
-            timer.start()
-            
-            # 使用安全的通信函数替代communicate
-            try:
-                outs, errs = safe_communicate(proc, test_input)
-            except MemoryError:
-                result['error'] = "内存溢出: 程序输出数据量过大"
-                result['output'] = "内存溢出"
-                result['execution_time'] = (time.time() - start_time) * 1000
-                
-                # 确保终止进程
-                if proc and proc.poll() is None:
-                    kill_process_tree(proc.pid)
-                
-                # 取消定时器
-                if timer and timer.is_alive():
-                    timer.cancel()
-                    
-                return result
-            
-            # 取消定时器
-            if timer and timer.is_alive():
-                timer.cancel()
-            
-            execution_time = (time.time() - start_time) * 1000  # 转换为毫秒
-            
-            # 获取输出
-            if proc.returncode != 0:
-                result['error'] = f"运行时错误 (返回码 {proc.returncode}): {errs}"
-                result['output'] = outs
-            else:
-                result['output'] = outs.strip()
-            
-            expected_output = expected_output.strip()
-            
-            # 标准化输出并检测格式
-            actual_normalized, output_format = normalize_output(result['output'])
-            expected_normalized, _ = normalize_output(expected_output.strip())
-            
-            # 使用智能比较检查结果
-            result['correct'] = smart_compare(result['output'], expected_output)
-            result['output_format'] = output_format  # 记录检测到的输出格式
-            result['execution_time'] = execution_time
-            
-            # 测量内存使用（执行后）
-            end_memory = process.memory_info().rss / 1024  # 最终内存 (KB)
-            result['memory_usage'] = end_memory - start_memory
-            
-        except subprocess.TimeoutExpired:
-            # 超时处理 - 直接终止我们启动的进程
-            result['error'] = "运行超时: 程序执行时间超过10秒"
-            result['output'] = "运行超时"
-            result['execution_time'] = 10000  # 设为最大超时时间
-            
-            if proc:
-                print(f"TimeoutExpired: 终止超时进程 (PID: {proc.pid})")
-                # 通过多种方式终止进程
-                
-                # 1. 使用自定义函数递归终止进程树
-                kill_success = kill_process_tree(proc.pid)
-                
-                # 2. 如果上面的方法失败，尝试操作系统特定的命令
-                if not kill_success or proc.poll() is None:
-                    try:
-                        if os.name == 'nt':  # Windows
-                            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], 
-                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=3)
-                        else:  # Unix
-                            # 尝试发送SIGKILL信号到进程组
-                            try:
-                                pgid = os.getpgid(proc.pid)
-                                os.killpg(pgid, signal.SIGKILL)
-                            except:
-                                # 如果找不到进程组，直接杀死进程
-                                try:
-                                    os.kill(proc.pid, signal.SIGKILL)
-                                except:
-                                    pass
-                    except Exception as e:
-                        print(f"使用系统命令终止进程失败: {e}")
-                
-                # 3. 最后尝试使用进程对象的kill方法
-                try:
-                    if proc.poll() is None:
-                        proc.kill()
-                        proc.wait(timeout=2)
-                except:
-                    pass
-                
-                # 日志输出进程终止结果
-                if proc.poll() is None:
-                    print("警告: 无法终止进程，进程可能仍在运行")
-                else:
-                    print(f"进程已终止，返回码: {proc.returncode}")
-                
-                # 清理资源
-                try:
-                    if proc.stdin:
-                        proc.stdin.close()
-                    if proc.stdout:
-                        proc.stdout.close()
-                    if proc.stderr:
-                        proc.stderr.close()
-                except:
-                    pass
-        
-        except MemoryError:
-            result['error'] = "内存溢出: 程序输出数据量过大"
-            result['output'] = "内存溢出"
-            result['execution_time'] = (time.time() - start_time) * 1000
-            
-            # 确保终止进程
-            if proc and proc.poll() is None:
-                kill_process_tree(proc.pid)
-                
-        except Exception as e:
-            result['error'] = f"执行异常: {str(e)}"
-            result['output'] = traceback.format_exc()
-            
-            # 确保在异常情况下也终止进程
-            if proc and proc.poll() is None:
-                kill_process_tree(proc.pid)
-        
-        finally:
-            # 确保在所有情况下都取消定时器
-            if timer and timer.is_alive():
-                timer.cancel()
-                
-            # 确保在所有情况下都检查并尝试终止潜在的遗留进程
-            if proc and proc.poll() is None:
-                print(f"Finally块: 尝试终止可能的遗留进程 (PID: {proc.pid})")
-                kill_process_tree(proc.pid)
-                
-                # 如果kill_process_tree不成功，尝试使用操作系统命令
-                if proc.poll() is None:
-                    try:
-                        if os.name == 'nt':
-                            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
-                                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=2)
-                        else:
-                            try:
-                                os.kill(proc.pid, signal.SIGKILL)
-                            except:
-                                pass
-                    except:
-                        pass
-    
-    return result
+        runs = sandbox_runner.run_batch([compiled['executable']], inputs, outputs,
+                                        timeout=timeout or CASE_TIMEOUT, concurrency=concurrency, **early_stop)
+        end_memory = process.memory_info().rss / 1024  # 最终内存 (KB)
+        return fill_skipped([build_test_result(run, expected_output, end_memory - start_memory) if run else None
+                             for run, expected_output in zip(runs, outputs)], fail_fast)
 
-def run_test_case(code: str, test_input: str, expected_output: str, case_id: int = None) -> Dict[str, Any]:
+def run_test_case(code: str, test_input: str, expected_output: str, case_id: int = None,
+                  timeout: float = None) -> Dict[str, Any]:
     """运行测试用例并打印结果"""
     if case_id is not None:
         print(f"\n测试用例 #{case_id}:")
     else:
         print("正在评估代码...")
         
-    result = evaluate_code(code, test_input, expected_output)
-    
+    result = evaluate_code(code, test_input, expected_output, timeout=timeout)
+    return print_test_result(result, expected_output)
+
+def print_test_result(result: Dict[str, Any], expected_output: str) -> Dict[str, Any]:
+    """打印一个测试用例的结果"""
     if result['compilation_error']:
         print("编译失败")
         print("\n--- 编译错误 ---")
@@ -658,6 +294,22 @@ def run_test_case(code: str, test_input: str, expected_output: str, case_id: int
         
     return result
 
+def run_test_cases(code: str, inputs: List[str], outputs: List[str], concurrency: int = 1,
+                   fail_fast: bool = False, time_budget: float = 0) -> List[Dict[str, Any]]:
+    """
+    编译一次代码，用一个事件循环运行所有测试用例，同时最多运行concurrency个（见evaluate_code_batch），然后打印结果
+
+    fail_fast和time_budget通过取消剩余用例实现，未运行完的用例计为失败
+    """
+    results = evaluate_code_batch(code, inputs, outputs, concurrency=concurrency,
+                                  fail_fast=fail_fast, time_budget=time_budget)
+    for i, (result, expected_output) in enumerate(zip(results, outputs)):
+        if not result.get('skipped'):
+            print(f"\n测试用例 #{i + 1}:")
+            print_test_result(result, expected_output)
+    print_skipped(results)
+    return results
+
 def parse_structured_test_cases(data):
     """解析结构化测试用例
     
@@ -679,6 +331,7 @@ def parse_structured_test_cases(data):
 
 def main():
     """主函数，处理命令行参数"""
+    global CASE_TIMEOUT
     parser = argparse.ArgumentParser(description="C/C++代码评估工具")
     parser.add_argument("code_file", help="要评估的代码文件路径")
     
@@ -695,7 +348,19 @@ def main():
     output_group.add_argument("--output", "-o", help="JSON格式的期望输出列表或单个期望输出字符串")
     output_group.add_argument("--output-file", "-of", help="包含期望输出的文件路径(JSON格式)")
     
+    # 提前结束：首个失败即停止 / 总时间预算
+    parser.add_argument("--fail-fast", action="store_true",
+                        help="第一个测试用例失败后跳过剩余用例（只关心是否全部通过时使用）")
+    parser.add_argument("--time-budget", type=float, default=0,
+                        help="所有测试用例的总时间预算（秒），超出后剩余用例计为失败 (0表示不限制)")
+    
+    parser.add_argument("--timeout", type=float, default=CASE_TIMEOUT,
+                        help="每个测试用例的运行超时（秒），默认10秒")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="同时运行的测试用例数（只编译一次），默认1即逐个运行")
+    
     args = parser.parse_args()
+    CASE_TIMEOUT = args.timeout
     
     # 读取代码文件
     try:
@@ -809,10 +474,8 @@ def main():
     print(f"代码评估工具 - 语言: {language_display} - 运行 {len(inputs)} 个测试用例")
     print("=" * 50)
     
-    results = []
-    for i, (test_input, expected_output) in enumerate(zip(inputs, outputs)):
-        result = run_test_case(code, test_input, expected_output, i+1)
-        results.append(result)
+    # 只编译一次；--parallel 1时逐个运行测试用例
+    results = run_test_cases(code, inputs, outputs, args.parallel, args.fail_fast, args.time_budget)
     
     # 输出测试摘要
     passed = sum(1 for r in results if r['correct'])
@@ -825,7 +488,7 @@ def main():
         print("\n失败的测试用例:")
         for i, result in enumerate(results):
             if not result['correct']:
-                print(f"  - 测试用例 #{i+1}")
+                print(f"  - 测试用例 #{i+1}{' (未执行)' if result.get('skipped') else ''}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
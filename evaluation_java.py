@@ -1,7 +1,5 @@
 import sys
-import time
 import io
-import traceback
 import psutil
 import contextlib
 import argparse
@@ -10,70 +8,14 @@ import os
 import tempfile
 import subprocess
 import shutil
-import ast
 import re
-import signal
-import threading
+import sandbox_runner
+from test_case_runner import early_stop_options, fill_skipped, print_skipped
+from output_compare import detect_output_format, normalize_output, smart_compare
 from typing import Dict, Any, List, Union
 
-def normalize_output(output):
-    """标准化输出字符串，处理引号和其他可能的格式差异，并检测输出格式"""
-    output = output.strip()
-    
-    # 检测输出格式
-    format_detected = "direct"  # 默认格式为直接输出
-    if output.startswith('{') and output.endswith('}'):
-        format_detected = '{ output }'
-    elif output.startswith('[') and output.endswith(']'):
-        format_detected = '[ output ]'
-    elif output.startswith('(') and output.endswith(')'):
-        format_detected = '( output )'
-    else:
-        format_detected = 'direct'
-    
-    # 如果是上述格式之一，移除首尾符号
-    if format_detected != "direct":
-        output = output[1:-1].strip()
-    
-    try:
-        # 如果是合法的JSON字符串，解析并重新序列化以规范化格式
-        parsed = json.loads(f'"{output}"')  # 添加引号以使其成为合法的JSON字符串
-        return parsed, format_detected
-    except:
-        pass
-    
-    # 如果不是JSON，返回原始字符串和检测到的格式
-    return output, format_detected
-
-def smart_compare(actual, expected):
-    """智能比较两个输出字符串，处理常见的格式差异"""
-    actual_normalized, format_actual = normalize_output(actual)
-    expected_normalized, format_expected = normalize_output(expected)
-    
-    if actual_normalized == expected_normalized:
-        return True
-    
-    if actual_normalized.replace('"', '').replace("'", '') == expected_normalized.replace('"', '').replace("'", ''):
-        return True
-    
-    try:
-        actual_num = float(actual_normalized)
-        expected_num = float(expected_normalized)
-        return abs(actual_num - expected_num) < 1e-6
-    except:
-        pass
-    
-    if actual_normalized.replace('"', "'") == expected_normalized.replace('"', "'"):
-        return True
-    
-    try:
-        actual_obj = ast.literal_eval(actual_normalized)
-        expected_obj = ast.literal_eval(expected_normalized)
-        return actual_obj == expected_obj
-    except:
-        pass
-    
-    return False
+# 每个测试用例的运行超时（秒），可通过命令行参数--timeout修改
+CASE_TIMEOUT = 10
 
 def extract_class_name(java_code):
     """从Java代码中提取公共类名"""
@@ -90,37 +32,89 @@ def extract_class_name(java_code):
     # 默认类名
     return "Program"
 
-def kill_process_tree(pid):
-    """递归杀死进程树"""
+# 内存监控阈值：稍低于JVM的-Xmx512m限制，以便主动拦截（KB）
+MEMORY_LIMIT_KB = 450 * 1024
+
+def compile_java_code(code: str, temp_dir: str) -> Dict[str, Any]:
+    """
+    在temp_dir中编译Java代码
+
+    Returns:
+        {'command': 运行命令（编译失败时为None）, 'jvm': 不含类路径和类名的java命令,
+         'javac': javac路径, 'class_name': 主类名, 'compilation_error': ..., 'error': ...}
+    """
+    compiled = {'command': None, 'jvm': None, 'javac': None, 'class_name': None,
+                'compilation_error': None, 'error': None}
+    
+    # 检查是否安装了Java编译器
+    javac_path = shutil.which("javac")
+    java_path = shutil.which("java")
+    
+    if not javac_path:
+        compiled['compilation_error'] = "找不到Java编译器(javac)。请确保Java JDK已安装并添加到系统PATH环境变量中。"
+        compiled['error'] = "编译环境错误: 找不到Java编译器"
+        return compiled
+    
+    if not java_path:
+        compiled['compilation_error'] = "找不到Java运行时(java)。请确保Java JDK已安装并添加到系统PATH环境变量中。"
+        compiled['error'] = "编译环境错误: 找不到Java运行时"
+        return compiled
+    
+    # 从代码中提取类名
+    class_name = extract_class_name(code)
+    
+    # 创建源代码文件 (注意类名与文件名必须一致)
+    source_file = os.path.join(temp_dir, f"{class_name}.java")
+    
+    # 写入源代码文件
+    with open(source_file, 'w', encoding='utf-8') as f:
+        f.write(code)
+    
+    # 编译Java代码，设置编译超时
+    compile_command = [javac_path, source_file]
     try:
-        parent = psutil.Process(pid)
-        children = parent.children(recursive=True)
-        
-        # 先杀死子进程
-        for child in children:
-            try:
-                child.kill()
-            except psutil.NoSuchProcess:
-                pass
-        
-        # 然后杀死父进程
-        try:
-            if parent.is_running():
-                parent.kill()
-                parent.wait(3)  # 等待进程终止
-        except psutil.NoSuchProcess:
-            pass
+        compile_process = subprocess.run(
+            compile_command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            check=False,
+            timeout=30  # 编译超时设置为30秒
+        )
         
-        return True
-    except psutil.NoSuchProcess:
-        return False
+        # 检查编译错误
+        if compile_process.returncode != 0:
+            compiled['compilation_error'] = compile_process.stderr
+            compiled['error'] = f"编译错误: {compile_process.stderr}"
+            return compiled
+    except subprocess.TimeoutExpired:
+        compiled['compilation_error'] = "编译超时: 编译时间超过30秒"
+        compiled['error'] = "编译超时"
+        return compiled
     except Exception as e:
-        print(f"杀死进程树时出错: {e}")
-        return False
+        compiled['compilation_error'] = str(e)
+        compiled['error'] = f"编译异常: {str(e)}"
+        return compiled
+    
+    # 添加杀死进程的命令, 处理平台差异
+    kill_cmd = "kill -9 %p" if os.name != 'nt' else "taskkill /F /PID %p"
+    
+    # 注意: 移除了HeapDumpOnOutOfMemoryError参数
+    compiled['jvm'] = [
+        java_path, 
+        "-Xmx512m",  # 限制最大堆内存
+        "-XX:+ExitOnOutOfMemoryError",  # 发生OOM时自动退出
+        f"-XX:OnOutOfMemoryError={kill_cmd}",  # 在OOM发生时执行kill命令
+    ]
+    compiled['command'] = compiled['jvm'] + ["-cp", temp_dir, class_name]
+    compiled['javac'] = javac_path
+    compiled['class_name'] = class_name
+    return compiled
 
-def evaluate_java_code(code: str, test_input: str, expected_output: str) -> Dict[str, Any]:
-    """编译并执行给定的Java代码并评估其性能和正确性"""
-    result = {
+def new_test_result() -> Dict[str, Any]:
+    return {
         'correct': False,
         'execution_time': 0,
         'memory_usage': 0,
@@ -131,320 +125,188 @@ def evaluate_java_code(code: str, test_input: str, expected_output: str) -> Dict
         'memory_overflow': False,  # 添加内存溢出标志
         'output_format': None
     }
-    
-    # 检查是否安装了Java编译器
-    javac_path = shutil.which("javac")
-    java_path = shutil.which("java")
-    
-    if not javac_path:
-        result['compilation_error'] = "找不到Java编译器(javac)。请确保Java JDK已安装并添加到系统PATH环境变量中。"
-        result['error'] = "编译环境错误: 找不到Java编译器"
+
+def build_test_result(run: sandbox_runner.RunResult, expected_output: str, memory_usage: float = 0) -> Dict[str, Any]:
+    """把sandbox_runner的运行结果转换为测试用例结果"""
+    result = new_test_result()
+    result['execution_time'] = run.execution_time
+    # 将监控的内存峰值添加到结果中
+    result['peak_memory_usage'] = run.peak_memory
+    
+    if run.spawn_error:
+        result['error'] = f"执行异常: {run.spawn_error}"
+        return result
+    if run.timed_out:
+        # 超时的运行时间就是该测试用例的超时
+        result['error'] = f"运行超时: 程序执行时间超过{run.execution_time / 1000:g}秒"
+        result['output'] = "运行超时"
         return result
     
-    if not java_path:
-        result['compilation_error'] = "找不到Java运行时(java)。请确保Java JDK已安装并添加到系统PATH环境变量中。"
-        result['error'] = "编译环境错误: 找不到Java运行时"
+    # 检查内存监控是否检测到内存溢出
+    if run.memory_exceeded:
+        result['memory_overflow'] = True
+        result['error'] = "内存溢出错误: 程序使用内存超过限制 (450MB)"
+        result['output'] = "内存溢出"
         return result
     
-    # 从代码中提取类名
-    class_name = extract_class_name(code)
+    # 获取输出
+    if run.output_mismatch:
+        # 输出与期望不符，进程是被提前终止的，不算运行时错误
+        result['output'] = run.stdout.strip()
+    elif run.returncode != 0:
+        if "OutOfMemoryError" in run.stderr:
+            result['error'] = f"内存溢出错误: {run.stderr}"
+            result['output'] = "内存溢出"  # 统一输出
+            result['memory_overflow'] = True  # 设置内存溢出标志
+            return result
+        result['error'] = f"运行时错误 (返回码 {run.returncode}): {run.stderr}"
+        result['output'] = run.stdout
+    else:
+        result['output'] = run.stdout.strip()
+    
+    expected_output = expected_output.strip()
+    
+    # 检测输出格式（比较见smart_compare）
+    output_format = detect_output_format(result['output'])
     
+    # 使用智能比较检查结果
+    result['correct'] = not run.output_mismatch and smart_compare(result['output'], expected_output)
+    result['output_format'] = output_format
+    result['memory_usage'] = memory_usage
+    return result
+
+# --batch：一个JVM运行所有测试用例（见EvaluationBatchRunner.java），省去每个测试用例启动JVM的时间
+BATCH_RUNNER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "EvaluationBatchRunner.java")
+_BATCH_REPORT = re.compile(r"^(\d+) (ok|error|timeout) (\d+)$")
+
+def _read_case_file(path: str) -> str:
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read(sandbox_runner.MAX_OUTPUT_SIZE + 1)
+    except OSError:
+        return ""
+    if len(text) > sandbox_runner.MAX_OUTPUT_SIZE:
+        text = text[:sandbox_runner.MAX_OUTPUT_SIZE] + "\n... [输出被截断，超过限制大小]"
+    return text
+
+def run_in_one_jvm(compiled: Dict[str, Any], temp_dir: str, inputs: List[str],
+                   timeout: float = None) -> List[Union[sandbox_runner.RunResult, None]]:
+    """
+    用EvaluationBatchRunner在一个JVM中依次运行所有测试用例，每个测试用例使用新的类加载器（静态变量重新初始化）
+    （每个测试用例的超时为timeout秒，默认CASE_TIMEOUT）
+
+    测试用例的结果写在报告文件中，标准输出只可能来自直接写FileDescriptor.out的代码。
+    这样的输出无法对应到测试用例，此时所有测试用例都返回None，改为各自启动JVM运行
+
+    Returns:
+        与inputs一一对应的运行结果；没有运行完的测试用例（JVM因超时、System.exit或内存溢出退出）为None
+    """
+    runs = [None] * len(inputs)
+    runner_dir = os.path.join(temp_dir, "batch_runner")
+    cases_dir = os.path.join(temp_dir, "batch_cases")
+    report_path = os.path.join(temp_dir, "batch_report.txt")
+    os.makedirs(runner_dir, exist_ok=True)
+    os.makedirs(cases_dir, exist_ok=True)
+    try:
+        compile_process = subprocess.run([compiled['javac'], "-d", runner_dir, BATCH_RUNNER_SOURCE],
+                                         capture_output=True, text=True, check=False, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return runs
+    if compile_process.returncode != 0:
+        return runs
+    
+    for i, test_input in enumerate(inputs):
+        with open(os.path.join(cases_dir, f"{i}.in"), 'w', encoding='utf-8', errors='replace', newline='') as f:
+            f.write(test_input)
+    timeout = timeout or CASE_TIMEOUT
+    command = compiled['jvm'] + ["-cp", runner_dir, "EvaluationBatchRunner", compiled['class_name'], temp_dir,
+                                 cases_dir, str(len(inputs)), str(int(timeout * 1000)), report_path]
+    # 每个测试用例的超时由EvaluationBatchRunner控制，这里只防止整个JVM卡住
+    run = sandbox_runner.run(command, "", timeout * (len(inputs) + 1), memory_limit=MEMORY_LIMIT_KB)
+    if run.stdout:
+        return runs  # 绕过System.out的输出
+    
+    for line in _read_case_file(report_path).splitlines():
+        match = _BATCH_REPORT.match(line.strip())
+        if match is None or int(match.group(1)) >= len(inputs):
+            continue
+        i, status = int(match.group(1)), match.group(2)
+        stdout = _read_case_file(os.path.join(cases_dir, f"{i}.out"))
+        stderr = _read_case_file(os.path.join(cases_dir, f"{i}.err"))
+        if status == "timeout":
+            runs[i] = sandbox_runner.RunResult(None, stdout, stderr, timeout * 1000, timed_out=True)
+        else:
+            runs[i] = sandbox_runner.RunResult(0 if status == "ok" else 1, stdout, stderr, int(match.group(3)) / 1e6,
+                                               peak_memory=run.peak_memory)
+    return runs
+
+def evaluate_java_code(code: str, test_input: str, expected_output: str, timeout: float = None) -> Dict[str, Any]:
+    """编译并执行给定的Java代码并评估其性能和正确性（timeout默认为CASE_TIMEOUT秒）"""
+    return evaluate_java_code_batch(code, [test_input], [expected_output], timeout=timeout)[0]
+
+def evaluate_java_code_batch(code: str, inputs: List[str], outputs: List[str],
+                             concurrency: int = 1, batch: bool = False, timeout: float = None,
+                             fail_fast: bool = False, time_budget: float = 0) -> List[Dict[str, Any]]:
+    """
+    编译一次代码，然后用一次sandbox_runner.run_batch运行所有测试用例，最多同时运行concurrency个JVM
+    （每个测试用例的超时为timeout秒，默认CASE_TIMEOUT）
+    
+    batch为True时先在一个JVM中运行所有测试用例（run_in_one_jvm），没有运行完的再各自启动JVM运行；
+    一个JVM中的用例无法中途取消，所以设置了fail_fast或time_budget时不使用batch（与evaluation.py的--batch相同）
+    
+    fail_fast: 有测试用例失败后取消其余正在运行和未开始的用例
+    time_budget: 总时间预算（秒，包括编译），用完后取消其余用例，0表示不限制
+    
+    Returns:
+        与inputs一一对应的评估结果，被取消的用例计为失败
+    """
+    # run_batch只运行remaining中的用例，第j个对应outputs[remaining[j]]
+    early_stop = early_stop_options(
+        fail_fast, time_budget, lambda j, run: build_test_result(run, outputs[remaining[j]])['correct'])
     # 创建临时目录用于编译
     with tempfile.TemporaryDirectory() as temp_dir:
-        # 创建源代码文件 (注意类名与文件名必须一致)
-        source_file = os.path.join(temp_dir, f"{class_name}.java")
-        
-        # 写入源代码文件
-        with open(source_file, 'w', encoding='utf-8') as f:
-            f.write(code)
+        compiled = compile_java_code(code, temp_dir)
+        if compiled['command'] is None:
+            results = []
+            for _ in inputs:
+                result = new_test_result()
+                result['compilation_error'] = compiled['compilation_error']
+                result['error'] = compiled['error']
+                results.append(result)
+            return results
         
-        # 编译Java代码，设置编译超时
-        compile_command = [javac_path, source_file]
-        try:
-            compile_process = subprocess.run(
-                compile_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                errors='replace',
-                check=False,
-                timeout=30  # 编译超时设置为30秒
-            )
-            
-            # 检查编译错误
-            if compile_process.returncode != 0:
-                result['compilation_error'] = compile_process.stderr
-                result['error'] = f"编译错误: {compile_process.stderr}"
-                return result
-        except subprocess.TimeoutExpired:
-            result['compilation_error'] = "编译超时: 编译时间超过30秒"
-            result['error'] = "编译超时"
-            return result
-        except Exception as e:
-            result['compilation_error'] = str(e)
-            result['error'] = f"编译异常: {str(e)}"
-            return result
-            
-        # 准备运行程序
+        # 测量评估进程的内存变化（与之前的memory_usage含义一致）
         process = psutil.Process()
         start_memory = process.memory_info().rss / 1024  # 初始内存 (KB)
-        
-        # 运行程序并计时
-        start_time = time.time()
-        
-        # 添加杀死进程的命令, 处理平台差异
-        kill_cmd = "kill -9 %p" if os.name != 'nt' else "taskkill /F /PID %p"
-        
-        # 使用Popen而不是run，这样可以直接获取进程对象
-        # 注意: 移除了HeapDumpOnOutOfMemoryError参数
-        run_command = [
-            java_path, 
-            "-Xmx512m",  # 限制最大堆内存
-            "-XX:+ExitOnOutOfMemoryError",  # 发生OOM时自动退出
-            f"-XX:OnOutOfMemoryError={kill_cmd}",  # 在OOM发生时执行kill命令
-            "-cp", 
-            temp_dir, 
-            class_name
-        ]
-        
-        java_proc = None
-        timer = None
-        
-        # 定义变量来存储Java进程内存监控信息
-        peak_memory = 0
-        memory_monitor_stop = threading.Event()
-        memory_overflow_detected = threading.Event()  # 用于在线程间通信内存溢出状态
-        
-        # 定义内存监控函数
-        def monitor_memory_usage():
-            nonlocal peak_memory
-            while not memory_monitor_stop.is_set() and java_proc and java_proc.poll() is None:
-                try:
-                    proc = psutil.Process(java_proc.pid)
-                    mem_info = proc.memory_info()
-                    current_memory = mem_info.rss / 1024  # KB
-                    peak_memory = max(peak_memory, current_memory)
-                    
-                    # 如果内存使用超过阈值，立即终止进程
-                    # 设置为450MB，稍低于JVM限制，以便主动拦截
-                    if current_memory > 450 * 1024:  # 450MB
-                        print(f"内存使用超过阈值 (450MB)，立即终止进程: {java_proc.pid}")
-                        memory_overflow_detected.set()  # 设置内存溢出标志
-                        kill_process_tree(java_proc.pid)
-                        break
-                except Exception as e:
-                    # 忽略进程监控错误
-                    pass
-                time.sleep(0.1)  # 每100ms检查一次
-        
-        try:
-            # 使用Popen启动进程，并创建一个新的进程组（在Unix系统上有用）
-            if os.name != 'nt':  # 非Windows系统
-                java_proc = subprocess.Popen(
-                    run_command,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    preexec_fn=os.setsid  # 在新进程组中启动
-                )
-            else:  # Windows系统
-                java_proc = subprocess.Popen(
-                    run_command,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP  # Windows上的新进程组
-                )
-            
-            # 启动内存监控线程
-            memory_thread = threading.Thread(target=monitor_memory_usage)
-            memory_thread.daemon = True
-            memory_thread.start()
-            
-            # 设置更强的超时控制 - 使用定时器
-            def timeout_handler():
-                """超时处理函数，强制终止进程"""
-                nonlocal java_proc
-                if java_proc and java_proc.poll() is None:
-                    print(f"定时器触发强制终止Java进程 (PID: {java_proc.pid})")
-                    # 使用我们的函数终止整个进程树
-                    kill_process_tree(java_proc.pid)
-            
-            # 设置超时定时器（比communicate超时稍长一些，作为备份）
-            timer = threading.Timer(11, timeout_handler)
-            timer.daemon = True
-            timer.start()
-            
-            # 传递输入并等待结果
-            try:
-                outs, errs = java_proc.communicate(input=test_input, timeout=10)
-                
-                # 取消定时器
-                if timer and timer.is_alive():
-                    timer.cancel()
-                
-                execution_time = (time.time() - start_time) * 1000  # 转换为毫秒
-                
-                # 检查内存监控线程是否检测到内存溢出
-                if memory_overflow_detected.is_set():
-                    result['memory_overflow'] = True
-                    result['error'] = "内存溢出错误: 程序使用内存超过限制 (450MB)"
-                    result['output'] = "内存溢出"
-                    result['execution_time'] = execution_time
-                    return result  # 提前返回结果
-                
-                # 获取输出
-                if java_proc.returncode != 0:
-                    if "OutOfMemoryError" in errs:
-                        result['error'] = f"内存溢出错误: {errs}"
-                        result['output'] = "内存溢出"  # 统一输出
-                        result['memory_overflow'] = True  # 设置内存溢出标志
-                        return result  # 提前返回结果
-                    else:
-                        result['error'] = f"运行时错误 (返回码 {java_proc.returncode}): {errs}"
-                        result['output'] = outs
-                else:
-                    result['output'] = outs.strip()
-                
-                expected_output = expected_output.strip()
-                
-                # 标准化输出并检测格式
-                actual_normalized, output_format = normalize_output(result['output'])
-                expected_normalized, _ = normalize_output(expected_output.strip())
-                
-                # 使用智能比较检查结果
-                result['correct'] = smart_compare(result['output'], expected_output)
-                result['execution_time'] = execution_time
-                result['output_format'] = output_format
-                
-                # 测量内存使用（执行后）
-                end_memory = process.memory_info().rss / 1024  # 最终内存 (KB)
-                result['memory_usage'] = end_memory - start_memory
-            
-            except subprocess.TimeoutExpired:
-                # 在超时发生时，保持之前的处理方式
-                raise
-                
-        except subprocess.TimeoutExpired:
-            # 超时处理 - 直接终止我们启动的进程
-            result['error'] = "运行超时: 程序执行时间超过10秒"
-            result['output'] = "运行超时"
-            result['execution_time'] = 10000  # 设为最大超时时间
-            
-            if java_proc:
-                print(f"TimeoutExpired: 终止超时Java进程 (PID: {java_proc.pid})")
-                # 通过多种方式终止进程
-                
-                # 1. 使用自定义函数递归终止进程树
-                kill_success = kill_process_tree(java_proc.pid)
-                
-                # 2. 如果上面的方法失败，尝试操作系统特定的命令
-                if not kill_success or java_proc.poll() is None:
-                    try:
-                        if os.name == 'nt':  # Windows
-                            subprocess.run(['taskkill', '/F', '/T', '/PID', str(java_proc.pid)], 
-                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=3)
-                        else:  # Unix
-                            # 尝试发送SIGKILL信号到进程组
-                            try:
-                                pgid = os.getpgid(java_proc.pid)
-                                os.killpg(pgid, signal.SIGKILL)
-                            except:
-                                # 如果找不到进程组，直接杀死进程
-                                try:
-                                    os.kill(java_proc.pid, signal.SIGKILL)
-                                except:
-                                    pass
-                    except Exception as e:
-                        print(f"使用系统命令终止进程失败: {e}")
-                
-                # 3. 最后尝试使用进程对象的kill方法
-                try:
-                    if java_proc.poll() is None:
-                        java_proc.kill()
-                        java_proc.wait(timeout=2)
-                except:
-                    pass
-                
-                # 日志输出进程终止结果
-                if java_proc.poll() is None:
-                    print("警告: 无法终止Java进程，进程可能仍在运行")
-                else:
-                    print(f"Java进程已终止，返回码: {java_proc.returncode}")
-                
-                # 清理资源
-                try:
-                    if java_proc.stdin:
-                        java_proc.stdin.close()
-                    if java_proc.stdout:
-                        java_proc.stdout.close()
-                    if java_proc.stderr:
-                        java_proc.stderr.close()
-                except:
-                    pass
-            
-        except Exception as e:
-            result['error'] = f"执行异常: {str(e)}"
-            result['output'] = traceback.format_exc()
-            
-            # 确保在异常情况下也终止Java进程
-            if java_proc and java_proc.poll() is None:
-                kill_process_tree(java_proc.pid)
-        
-        finally:
-            # 确保停止内存监控线程
-            memory_monitor_stop.set()
-            if 'memory_thread' in locals() and memory_thread.is_alive():
-                memory_thread.join(timeout=1)
-                
-            # 将监控的内存峰值添加到结果中
-            result['peak_memory_usage'] = peak_memory
-            
-            # 确保在所有情况下都取消定时器
-            if timer and timer.is_alive():
-                timer.cancel()
-                
-            # 确保在所有情况下都检查并尝试终止潜在的遗留进程
-            if java_proc and java_proc.poll() is None:
-                print(f"Finally块: 尝试终止可能的遗留Java进程 (PID: {java_proc.pid})")
-                kill_process_tree(java_proc.pid)
-                
-                # 如果kill_process_tree不成功，尝试使用操作系统命令
-                if java_proc.poll() is None:
-                    try:
-                        if os.name == 'nt':
-                            subprocess.run(['taskkill', '/F', '/T', '/PID', str(java_proc.pid)],
-                                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=2)
-                        else:
-                            try:
-                                os.kill(java_proc.pid, signal.SIGKILL)
-                            except:
-                                pass
-                    except:
-                        pass
-                
-                # 最后检查是否确实终止了进程
-                if java_proc.poll() is None:
-                    print("严重警告: 所有终止进程的尝试均失败")
-    
-    return result
+        if batch and len(inputs) > 1 and not (fail_fast or time_budget):
+            runs = run_in_one_jvm(compiled, temp_dir, inputs, timeout)
+        else:
+            runs = [None] * len(inputs)
+        remaining = [i for i, run in enumerate(runs) if run is None]
+        if remaining:
+            remaining_runs = sandbox_runner.run_batch(compiled['command'], [inputs[i] for i in remaining],
+                                                      [outputs[i] for i in remaining], timeout=timeout or CASE_TIMEOUT,
+                                                      concurrency=concurrency, memory_limit=MEMORY_LIMIT_KB,
+                                                      **early_stop)
+            for i, run in zip(remaining, remaining_runs):
+                runs[i] = run
+        end_memory = process.memory_info().rss / 1024  # 最终内存 (KB)
+        return fill_skipped([build_test_result(run, expected_output, end_memory - start_memory) if run else None
+                             for run, expected_output in zip(runs, outputs)], fail_fast)
 
-def run_test_case(code: str, test_input: str, expected_output: str, case_id: int = None) -> Dict[str, Any]:
+def run_test_case(code: str, test_input: str, expected_output: str, case_id: int = None,
+                  timeout: float = None) -> Dict[str, Any]:
     """运行测试用例并打印结果"""
     if case_id is not None:
         print(f"\n测试用例 #{case_id}:")
     else:
         print("正在评估代码...")
         
-    result = evaluate_java_code(code, test_input, expected_output)
-    
+    result = evaluate_java_code(code, test_input, expected_output, timeout)
+    return print_test_result(result, expected_output)
+
+def print_test_result(result: Dict[str, Any], expected_output: str) -> Dict[str, Any]:
+    """打印一个测试用例的结果"""
     if result['compilation_error']:
         print("编译失败")
         print("\n--- 编译错误 ---")
@@ -479,6 +341,23 @@ def run_test_case(code: str, test_input: str, expected_output: str, case_id: int
         
     return result
 
+def run_test_cases(code: str, inputs: List[str], outputs: List[str], concurrency: int = 1,
+                   fail_fast: bool = False, time_budget: float = 0, batch: bool = False) -> List[Dict[str, Any]]:
+    """
+    编译一次代码，用一个事件循环运行所有测试用例，同时最多运行concurrency个JVM（见evaluate_java_code_batch），然后打印结果
+    batch为True时所有测试用例先在一个JVM中运行
+
+    fail_fast和time_budget通过取消剩余用例实现，未运行完的用例计为失败
+    """
+    results = evaluate_java_code_batch(code, inputs, outputs, concurrency, batch,
+                                       fail_fast=fail_fast, time_budget=time_budget)
+    for i, (result, expected_output) in enumerate(zip(results, outputs)):
+        if not result.get('skipped'):
+            print(f"\n测试用例 #{i + 1}:")
+            print_test_result(result, expected_output)
+    print_skipped(results)
+    return results
+
 def parse_structured_test_cases(data):
     """解析结构化测试用例"""
     inputs = []
@@ -493,6 +372,7 @@ def parse_structured_test_cases(data):
 
 def main():
     """主函数，处理命令行参数"""
+    global CASE_TIMEOUT
     parser = argparse.ArgumentParser(description="Java代码评估工具")
     parser.add_argument("code_file", help="要评估的Java代码文件路径")
     
@@ -509,7 +389,21 @@ def main():
     output_group.add_argument("--output", "-o", help="JSON格式的期望输出列表或单个期望输出字符串")
     output_group.add_argument("--output-file", "-of", help="包含期望输出的文件路径(JSON格式)")
     
+    # 提前结束：首个失败即停止 / 总时间预算
+    parser.add_argument("--fail-fast", action="store_true",
+                        help="第一个测试用例失败后跳过剩余用例（只关心是否全部通过时使用）")
+    parser.add_argument("--time-budget", type=float, default=0,
+                        help="所有测试用例的总时间预算（秒），超出后剩余用例计为失败 (0表示不限制)")
+    
+    parser.add_argument("--timeout", type=float, default=CASE_TIMEOUT,
+                        help="每个测试用例的运行超时（秒），默认10秒")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="同时运行的测试用例数（只编译一次），默认1即逐个运行")
+    parser.add_argument("--batch", action="store_true",
+                        help="在一个JVM中运行所有测试用例，每个测试用例使用新的类加载器（与--fail-fast/--time-budget同时使用时不生效）")
+    
     args = parser.parse_args()
+    CASE_TIMEOUT = args.timeout
     
     # 读取代码文件
     try:
@@ -617,10 +511,8 @@ def main():
     print(f"Java代码评估工具 - 运行 {len(inputs)} 个测试用例")
     print("=" * 50)
     
-    results = []
-    for i, (test_input, expected_output) in enumerate(zip(inputs, outputs)):
-        result = run_test_case(code, test_input, expected_output, i+1)
-        results.append(result)
+    # 只编译一次；--parallel 1时逐个运行测试用例
+    results = run_test_cases(code, inputs, outputs, args.parallel, args.fail_fast, args.time_budget, args.batch)
     
     # 输出测试摘要
     passed = sum(1 for r in results if r['correct'])
@@ -642,7 +534,9 @@ def main():
         for i, result in enumerate(results):
             if not result['correct']:
                 error_type = ""
-                if result.get('memory_overflow', False):
+                if result.get('skipped'):
+                    error_type = " (未执行)"
+                elif result.get('memory_overflow', False):
                     error_type = " (内存溢出)"
                 elif result.get('error'):
                     if 'OutOfMemoryError' in str(result.get('error')):
@@ -0,0 +1,112 @@
+"""
+JSONL reading and writing shared by the generation and evaluation scripts.
+
+- Uses orjson when it is installed and falls back to the standard json module.
+- Files ending in .gz are read/written with gzip, files ending in .zst with
+  zstandard (optional dependency).
+- JsonlWriter buffers records and writes them in batches.
+"""
+import gzip
+import json
+import os
+from typing import Any, Dict, Iterator, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(line):
+    """Parse one JSON document (str or bytes)."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a single-line JSON string, keeping non-ASCII characters (like ensure_ascii=False)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # orjson rejects integers wider than 64 bits and some other values json accepts
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def open_text(path: str, mode: str = 'r'):
+    """Open a (possibly .gz / .zst compressed) text file with UTF-8 encoding. mode is 'r', 'w' or 'a'."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("读取/写入 .zst 文件需要安装 zstandard: pip install zstandard")
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the records of a JSONL file one at a time, skipping blank lines."""
+    with open_text(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+    """Load all records of a JSONL file."""
+    return list(iter_jsonl(path))
+
+
+class JsonlWriter:
+    """
+    Buffered JSONL writer. Records are serialized immediately and written to the file
+    every `batch_size` records (and on flush/close). Use batch_size=1 when every record
+    must reach the disk before the next one is produced.
+    """
+
+    def __init__(self, path: str, mode: str = 'w', batch_size: int = 256):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open_text(path, mode)
+        self._batch_size = max(1, batch_size)
+        self._pending: List[str] = []
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._pending.append(dumps(record))
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._file.write('\n'.join(self._pending) + '\n')
+            self._pending = []
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def save_jsonl(data: List[Dict[str, Any]], path: str) -> None:
+    """Write all records to a JSONL file."""
+    with JsonlWriter(path) as writer:
+        for record in data:
+            writer.write(record)
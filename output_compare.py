@@ -0,0 +1,318 @@
+"""
+Output comparison shared by the language evaluators.
+
+`smart_compare` accepts an actual output as correct if, after normalization,
+it equals the expected output exactly, without quotes, as a float (1e-6
+tolerance), with double quotes swapped for single quotes, or as the same
+Python literal. Every step only depends on the expected output, so
+`OutputComparator` prepares it once per test case: the normalized text and
+its quote variants, whether it is a number, and its parsed literal. Actual
+outputs then skip the steps that cannot match (no float parse when the
+expected output is not a number, no `ast.literal_eval` of a possibly huge
+actual output when the expected output is not a literal), and flat numeric
+tuples are compared element by element with an early exit on the first
+mismatch.
+
+`StreamingMatcher` applies the same rules to an output while it is produced, so
+the runners can stop a program as soon as its output can no longer match and
+keep only a bounded prefix of it.
+"""
+import ast
+import io
+import json
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+_NO_LITERAL = object()
+_NUMBER = re.compile(r"[+-]?(?:(?P<float>(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+)|0+|[1-9]\d*)")
+
+
+def detect_output_format(output: str) -> str:
+    """Return '{ output }', '[ output ]', '( output )' or 'direct' depending on the enclosing brackets."""
+    output = output.strip()
+    if output.startswith('{') and output.endswith('}'):
+        return '{ output }'
+    if output.startswith('[') and output.endswith(']'):
+        return '[ output ]'
+    if output.startswith('(') and output.endswith(')'):
+        return '( output )'
+    return "direct"
+
+
+def normalize_output(output: str) -> Tuple[str, str]:
+    """
+    Strip whitespace and one pair of enclosing brackets, and decode JSON string escapes.
+
+    Returns:
+        (normalized output, detected format)
+    """
+    output = output.strip()
+    format_detected = detect_output_format(output)
+    if format_detected != "direct":
+        output = output[1:-1].strip()
+
+    # Without a backslash json.loads either fails or returns the text unchanged
+    if '\\' in output:
+        try:
+            return json.loads(f'"{output}"'), format_detected
+        except ValueError:
+            pass
+    return output, format_detected
+
+
+def _parse_float(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _parse_literal(text: str):
+    try:
+        return ast.literal_eval(text)
+    except Exception:
+        return _NO_LITERAL
+
+
+def _compare_number_tuple(actual: str, expected: tuple) -> Optional[bool]:
+    """
+    Compare an actual output with a tuple of numbers without ast.literal_eval.
+    Returns None when the actual output is not a plain comma-separated list of numbers.
+    """
+    if '\n' in actual or '\r' in actual:
+        return None  # literal_eval rejects a tuple without parentheses spread over several lines
+    parts = actual.split(',')
+    if len(parts) > 1 and not parts[-1].strip():
+        parts.pop()  # trailing comma: "5," is the tuple (5,)
+    elif len(parts) == 1:
+        match = _NUMBER.fullmatch(parts[0].strip())
+        return None if match is None else False  # a single number is not a tuple
+    for index, part in enumerate(parts):
+        match = _NUMBER.fullmatch(part.strip())
+        if match is None:
+            return None
+        # Every part so far is a plain number, so this is element `index` of the parsed tuple
+        if index >= len(expected):
+            return False
+        value = float(match.group()) if match.group("float") else int(match.group())
+        if value != expected[index]:
+            return False
+    return len(parts) == len(expected)
+
+
+class OutputComparator:
+    """Compares actual outputs with one expected output (see smart_compare)."""
+
+    def __init__(self, expected: str):
+        self.expected, self.expected_format = normalize_output(expected)
+        self._expected_unquoted = self.expected.replace('"', '').replace("'", '')
+        self._expected_single_quoted = self.expected.replace('"', "'")
+        self._expected_float = _parse_float(self.expected)
+        self._expected_literal = _parse_literal(self.expected)
+        self._expected_numbers = None
+        if isinstance(self._expected_literal, tuple) and all(
+                type(value) in (int, float) for value in self._expected_literal):
+            self._expected_numbers = self._expected_literal
+
+        if self._expected_float is not None:
+            self.strategy = "number"
+        elif self._expected_literal is not _NO_LITERAL:
+            self.strategy = "literal"
+        else:
+            self.strategy = "text"
+
+    def matches(self, actual: str) -> bool:
+        actual, _ = normalize_output(actual)
+
+        if actual == self.expected:
+            return True
+        if actual.replace('"', '').replace("'", '') == self._expected_unquoted:
+            return True
+
+        if self._expected_float is not None:
+            actual_float = _parse_float(actual)
+            if actual_float is not None:
+                return abs(actual_float - self._expected_float) < 1e-6  # small float differences are allowed
+
+        if actual.replace('"', "'") == self._expected_single_quoted:
+            return True
+
+        if self._expected_literal is _NO_LITERAL:
+            return False
+        if self._expected_numbers is not None:
+            result = _compare_number_tuple(actual, self._expected_numbers)
+            if result is not None:
+                return result
+        actual_literal = _parse_literal(actual)
+        return actual_literal is not _NO_LITERAL and actual_literal == self._expected_literal
+
+
+@lru_cache(maxsize=256)
+def get_comparator(expected: str) -> OutputComparator:
+    """Comparator for an expected output, built once per distinct expected output."""
+    return OutputComparator(expected)
+
+
+def smart_compare(actual: str, expected: str) -> bool:
+    """
+    Compare two outputs, tolerating common formatting differences (quotes,
+    enclosing brackets, float precision, equivalent Python literals).
+    """
+    return get_comparator(expected).matches(actual)
+
+
+OUTPUT_PREFIX_LIMIT = 64 * 1024           # characters of a mismatching output kept for diagnostics
+OUTPUT_LENGTH_MARGIN = 64 * 1024          # extra characters allowed for numeric / literal expected outputs
+_CLOSING_BRACKETS = {'{': '}', '[': ']', '(': ')'}
+
+
+class OutputMismatch(BaseException):
+    """
+    Raised by StreamingMatcher.write once the output can no longer match. A
+    BaseException so that `except Exception` in the program under test does
+    not swallow it.
+    """
+
+
+class _TextPrefix:
+    """
+    One way a "text" expected output can still be matched: the output (after
+    stripping leading whitespace, and an opening bracket if `closing` is set)
+    with quotes removed must be the unquoted expected text followed by
+    whitespace, and by the closing bracket when there is one.
+    """
+
+    def __init__(self, target: str, closing: Optional[str] = None):
+        self.target = target
+        self.closing = closing
+        self.position = 0
+        self.leading = True
+        self.closed = False
+        self.alive = True
+
+    def feed(self, text: str) -> bool:
+        if self.leading:
+            text = text.lstrip()
+            if not text:
+                return True
+            self.leading = False
+        text = text.replace('"', '').replace("'", '')
+        remaining = len(self.target) - self.position
+        if remaining:
+            head = text[:remaining]
+            if head != self.target[self.position:self.position + len(head)]:
+                self.alive = False
+                return False
+            self.position += len(head)
+            text = text[len(head):]
+        tail = text.lstrip()
+        if tail and self.closing is not None and not self.closed and tail[0] == self.closing:
+            self.closed = True
+            tail = tail[1:].lstrip()
+        if tail:
+            self.alive = False
+        return self.alive
+
+
+class StreamingMatcher(io.TextIOBase):
+    """
+    Checks an output against one expected output while it is produced.
+
+    `feed(chunk)` returns False as soon as the output can no longer be accepted
+    by smart_compare. For text expected outputs this is exact: the output must
+    spell the expected text (quotes ignored, optionally inside one pair of
+    brackets) followed only by whitespace. Outputs containing a backslash may
+    decode to the expected text as a JSON string, so they are never rejected
+    early. Numeric and literal expected outputs are only rejected once the
+    output is longer than 4x the expected output plus OUTPUT_LENGTH_MARGIN.
+
+    The whole output is kept while it can still match, so the final verdict
+    still comes from smart_compare(matcher.getvalue(), expected). After a
+    mismatch only the first OUTPUT_PREFIX_LIMIT characters are kept.
+
+    The matcher is also a writable text stream: `write` raises OutputMismatch
+    on a mismatch, so it can replace sys.stdout for in-process execution.
+    """
+
+    def __init__(self, expected: str, prefix_limit: int = OUTPUT_PREFIX_LIMIT):
+        super().__init__()
+        comparator = get_comparator(expected)
+        self.prefix_limit = prefix_limit
+        self.aborted = False
+        self._chunks: List[str] = []
+        self._length = 0
+        self._max_length = None
+        self._hypotheses = None
+        self._checking = True
+        if comparator.strategy == "text":
+            self._target = comparator._expected_unquoted
+        else:
+            self._target = None
+            self._max_length = 4 * len(expected) + OUTPUT_LENGTH_MARGIN
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of output. Returns False once the output can no longer match."""
+        if self.aborted:
+            return False
+        if not chunk:
+            return True
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        if self._max_length is not None:
+            if self._length > self._max_length:
+                self._abort()
+        elif self._checking and not self._check_text(chunk):
+            self._abort()
+        return not self.aborted
+
+    def _check_text(self, chunk: str) -> bool:
+        if '\\' in chunk:
+            self._checking = False  # may be a JSON escape; leave it to smart_compare
+            return True
+        if self._hypotheses is None:
+            stripped = chunk.lstrip()
+            if not stripped:
+                return True
+            self._hypotheses = [_TextPrefix(self._target)]
+            closing = _CLOSING_BRACKETS.get(stripped[0])
+            if closing is not None:
+                bracketed = _TextPrefix(self._target, closing)
+                bracketed.feed(stripped[1:])
+                self._hypotheses.append(bracketed)
+            chunk = stripped
+            self._hypotheses[0].feed(chunk)
+        else:
+            for hypothesis in self._hypotheses:
+                if hypothesis.alive:
+                    hypothesis.feed(chunk)
+        return any(hypothesis.alive for hypothesis in self._hypotheses)
+
+    def _abort(self) -> None:
+        self.aborted = True
+        prefix = "".join(self._chunks)[:self.prefix_limit]
+        self._chunks = [prefix]
+        self._length = len(prefix)
+
+    def getvalue(self) -> str:
+        """The output so far, or its first prefix_limit characters after a mismatch."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def output(self) -> str:
+        """Output for the result record: getvalue(), marked as truncated after a mismatch."""
+        if self.aborted:
+            return self.getvalue() + "\n... [输出与期望不符，已提前终止]"
+        return self.getvalue()
+
+    # Text stream interface, for use as sys.stdout
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if not self.feed(text):
+            raise OutputMismatch()
+        return len(text)
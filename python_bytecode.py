@@ -0,0 +1,99 @@
+"""
+Compile cache for Python submissions.
+
+`compile_submission` parses and compiles a submission once per sample and
+returns a `CompiledSubmission`: the marshalled code object (code objects cannot
+be pickled, bytes can be sent to pool workers and the zygote) and whether the
+code has an `if __name__ == "__main__"` guard. Test cases then only unmarshal
+and exec it, so parsing and compilation are neither repeated per test case nor
+part of the measured time.
+
+Compiled submissions are kept in memory and, with `cache_dir`, in marshal files
+named by the SHA-256 of the source, so reruns of the same submission skip
+compilation. Files written by another Python version are ignored.
+"""
+import ast
+import hashlib
+import marshal
+import os
+import tempfile
+from functools import lru_cache
+from importlib.util import MAGIC_NUMBER
+from types import CodeType
+from typing import NamedTuple, Optional
+
+FILENAME = "<string>"  # same as exec() of a source string, so tracebacks do not change
+
+
+class CompiledSubmission(NamedTuple):
+    bytecode: bytes       # marshal.dumps of the module code object
+    main_guard: bool      # the code has `if __name__ == "__main__"`, run it as the main module
+
+    def code_object(self) -> CodeType:
+        return marshal.loads(self.bytecode)
+
+
+def _is_main_guard(test: ast.expr) -> bool:
+    """True for `__name__ == "__main__"` in either operand order."""
+    if not (isinstance(test, ast.Compare) and len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq)):
+        return False
+    operands = [test.left, test.comparators[0]]
+    return (any(isinstance(node, ast.Name) and node.id == '__name__' for node in operands)
+            and any(isinstance(node, ast.Constant) and node.value == '__main__' for node in operands))
+
+
+def has_main_guard(tree: ast.AST) -> bool:
+    return any(isinstance(node, ast.If) and _is_main_guard(node.test) for node in ast.walk(tree))
+
+
+def _cache_path(cache_dir: str, source: str) -> str:
+    digest = hashlib.sha256(source.encode('utf-8', errors='surrogatepass')).hexdigest()
+    return os.path.join(cache_dir, digest + ".bin")
+
+
+def _read_cache(path: str) -> Optional[CompiledSubmission]:
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(MAGIC_NUMBER):
+        return None
+    try:
+        main_guard, bytecode = marshal.loads(data[len(MAGIC_NUMBER):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return CompiledSubmission(bytecode, main_guard)
+
+
+def _write_cache(path: str, submission: CompiledSubmission) -> None:
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so concurrent evaluators never read a partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC_NUMBER + marshal.dumps((submission.main_guard, submission.bytecode)))
+        os.replace(temp_path, path)
+    except OSError:
+        pass  # the cache is only an optimization
+
+
+@lru_cache(maxsize=64)
+def compile_submission(source: str, cache_dir: Optional[str] = None) -> CompiledSubmission:
+    """
+    Compile a submission, reusing a cached result when there is one.
+
+    Raises:
+        SyntaxError, ValueError: the source cannot be compiled (not cached)
+    """
+    path = _cache_path(cache_dir, source) if cache_dir else None
+    if path is not None:
+        cached = _read_cache(path)
+        if cached is not None:
+            return cached
+    tree = ast.parse(source, FILENAME)
+    submission = CompiledSubmission(marshal.dumps(compile(tree, FILENAME, 'exec')), has_main_guard(tree))
+    if path is not None:
+        _write_cache(path, submission)
+    return submission
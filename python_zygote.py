@@ -0,0 +1,171 @@
+"""
+Fork server ("zygote") for running Python submissions.
+
+The zygote is a process that imports a configurable set of modules once and
+then, for every test case, forks a fresh child that runs the submission and
+sends its result back. Children start with the modules already imported and
+share the zygote's memory copy-on-write, so a test case costs a fork instead of
+a new interpreter, and no state can leak from one submission or test case to
+the next because the zygote itself never runs submitted code.
+
+`run_batch` sends a submission with all of its test cases in one request; the
+zygote forks one child per case in turn and times each of them itself, so the
+submission crosses the pipe once and the per-case times exclude the IPC.
+
+Requires os.fork (not available on Windows).
+"""
+import gc
+import importlib
+import multiprocessing
+import os
+import pickle
+import select
+import signal
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Modules commonly imported by solutions
+DEFAULT_PRELOAD_MODULES = (
+    "array", "bisect", "collections", "copy", "decimal", "fractions", "functools", "heapq",
+    "itertools", "math", "operator", "random", "re", "string", "sys",
+)
+
+Runner = Callable[[Any, str, Optional[str]], Dict[str, Any]]
+CaseResult = Tuple[Optional[Dict[str, Any]], float]   # (result or None on timeout, milliseconds)
+
+
+def fork_supported() -> bool:
+    return hasattr(os, "fork") and "fork" in multiprocessing.get_all_start_methods()
+
+
+def _crash_result(message: str) -> Dict[str, Any]:
+    return {'success': False, 'output': '', 'memory_usage': 0, 'peak_memory_usage': 0, 'error': message}
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        os.kill(pid, signal.SIGKILL)  # the child has not created its group yet
+
+
+def _run_forked(conn, runner: Runner, code: Any, test_input: str, expected_output: Optional[str],
+                timeout: float) -> Optional[Dict[str, Any]]:
+    """Run one test case in a forked child. Returns None if it did not finish within `timeout` seconds."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Child: never returns to the zygote loop
+        status = 0
+        try:
+            os.setpgid(0, 0)  # own process group, so a timeout also kills what the submission started
+            os.close(read_fd)
+            conn.close()
+            try:
+                result = runner(code, test_input, expected_output)
+            except BaseException:
+                result = _crash_result(traceback.format_exc())
+            data = pickle.dumps(result)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(write_fd, view):]
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    chunks = []
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                _kill_group(pid)
+                os.waitpid(pid, 0)
+                return None
+            data = os.read(read_fd, 65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        os.close(read_fd)
+
+    _, status = os.waitpid(pid, 0)
+    if not chunks:
+        return _crash_result(f"子进程异常退出 (状态 {status})")
+    return pickle.loads(b"".join(chunks))
+
+
+def _serve(conn, preload_modules: Iterable[str], runner: Runner) -> None:
+    for name in preload_modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    # Objects created so far are never collected in the children, so the
+    # collector does not touch (and copy) their pages
+    gc.collect()
+    gc.freeze()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        code, cases, timeout = request
+        results = []
+        for test_input, expected_output in cases:
+            start_time = time.perf_counter()
+            result = _run_forked(conn, runner, code, test_input, expected_output, timeout)
+            results.append((result, (time.perf_counter() - start_time) * 1000))
+        conn.send(results)
+
+
+class PythonZygote:
+    """
+    Handle to a zygote process. `run` executes one test case in a fresh fork
+    with `runner(code, test_input, expected_output)` and returns its result, or
+    None on timeout (the child is killed). Test cases run one at a time.
+    `code` is passed to the runner as is and must be picklable.
+    """
+
+    def __init__(self, runner: Runner, preload_modules: Iterable[str] = DEFAULT_PRELOAD_MODULES):
+        context = multiprocessing.get_context("fork")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn, tuple(preload_modules), runner),
+                                        name="python-zygote", daemon=True)
+        self._process.start()
+        child_conn.close()
+
+    def run(self, code: Any, test_input: str, expected_output: Optional[str] = None,
+            timeout: float = 10) -> Optional[Dict[str, Any]]:
+        return self.run_batch(code, [(test_input, expected_output)], timeout)[0][0]
+
+    def run_batch(self, code: Any, cases: Sequence[Tuple[str, Optional[str]]],
+                  timeout: float = 10) -> List[CaseResult]:
+        """Run (test_input, expected_output) cases in order, each in its own fork with its own timeout."""
+        self._conn.send((code, list(cases), timeout))
+        return self._conn.recv()
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(timeout=3)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = None
+
+    def __enter__(self) -> "PythonZygote":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
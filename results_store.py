@@ -0,0 +1,255 @@
+"""
+SQLite table of evaluation results for analysis.
+
+Each evaluation result (one JSONL line of evaluation_all_turn.py output) becomes
+one `questions` row plus one `constraints` row per (turn, constraint). The
+runtime evaluation of turn 0 is stored as a constraint of type
+`runtime_evaluation`; later turns carry the runtime result of their own code
+(runtime_success, execution_time, memory_usage, passed/total test cases) on
+every constraint row. Rows are keyed by `source` (the evaluation output file by
+default), so several runs or models can live in one database.
+
+Usage:
+    python results_store.py results.db                      # all reports
+    python results_store.py results.db --report constraint --source out.jsonl
+    python results_store.py results.db --import out.jsonl [--source name]
+"""
+import argparse
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import jsonl_io
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    source TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    overall_success INTEGER NOT NULL,
+    mode TEXT,
+    error TEXT,
+    PRIMARY KEY (source, question_id)
+);
+CREATE TABLE IF NOT EXISTS constraints (
+    source TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    constraint_index INTEGER NOT NULL,
+    constraint_type TEXT,
+    success INTEGER,
+    turn_success INTEGER NOT NULL,
+    runtime_success INTEGER,
+    execution_time REAL,
+    memory_usage REAL,
+    passed INTEGER,
+    total INTEGER,
+    detail TEXT,
+    PRIMARY KEY (source, question_id, turn, constraint_index)
+);
+CREATE INDEX IF NOT EXISTS constraints_turn ON constraints (source, turn);
+CREATE INDEX IF NOT EXISTS constraints_type ON constraints (source, constraint_type);
+"""
+
+_CONSTRAINT_COLUMNS = ("source", "question_id", "turn", "constraint_index", "constraint_type", "success",
+                       "turn_success", "runtime_success", "execution_time", "memory_usage", "passed", "total",
+                       "detail")
+
+
+def _as_list(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+def _optional_bool(value: Any) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+def _runtime_columns(runtime: Optional[Dict[str, Any]]) -> Tuple:
+    """(runtime_success, execution_time, memory_usage, passed, total) of a runtime evaluation result."""
+    if not isinstance(runtime, dict):
+        return None, None, None, None, None
+    details = runtime.get("details") if isinstance(runtime.get("details"), dict) else {}
+    test_summary = details.get("test_summary") or {}
+    return (_optional_bool(runtime.get("success")), details.get("execution_time"), details.get("memory_usage"),
+            test_summary.get("passed"), test_summary.get("total"))
+
+
+def constraint_rows(result: Dict[str, Any], source: str) -> Iterator[Tuple]:
+    """Yield one constraints row per (turn, constraint) of an evaluation result."""
+    question_id = str(result.get("question_id"))
+    for turn in result.get("turns", []):
+        turn_num = turn.get("turn")
+        if turn_num is None:
+            continue
+        if turn.get("type") == "runtime_evaluation":
+            runtime = _runtime_columns(turn)
+            details = turn.get("details") if isinstance(turn.get("details"), dict) else {}
+            detail = details.get("compilation_error") or details.get("error")
+            yield (source, question_id, turn_num, 0, "runtime_evaluation", runtime[0], runtime[0] or 0,
+                   *runtime, detail)
+            continue
+
+        runtime = _runtime_columns(turn.get("runtime_turn"))
+        # Same rule as print_evaluation_summary: the turn's requirements and its runtime check must pass
+        turn_success = int(bool(turn.get("success", False)) and runtime[0] != 0)
+        types = _as_list(turn.get("type"))
+        successes = _as_list(turn.get("success"))
+        details = _as_list(turn.get("details"))
+        for index, constraint_type in enumerate(types):
+            success = successes[index] if index < len(successes) else None
+            detail = details[index] if index < len(details) else None
+            yield (source, question_id, turn_num, index, constraint_type, _optional_bool(success), turn_success,
+                   *runtime, None if detail is None else str(detail))
+
+
+class ResultsStore:
+    """
+    Writes evaluation results into the SQLite tables. Results are inserted as they
+    arrive and committed every `commit_every` results (and on close), replacing any
+    earlier rows of the same source and question.
+    """
+
+    def __init__(self, path: str, source: str, commit_every: int = 100):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.source = source
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+        self._commit_every = max(1, commit_every)
+        self._uncommitted = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        question_id = str(result.get("question_id"))
+        self._conn.execute("DELETE FROM constraints WHERE source = ? AND question_id = ?", (self.source, question_id))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO questions VALUES (?, ?, ?, ?, ?)",
+            (self.source, question_id, int(bool(result.get("overall_success", False))),
+             result.get("mode", "full"), result.get("error")))
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO constraints ({', '.join(_CONSTRAINT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(_CONSTRAINT_COLUMNS))})",
+            constraint_rows(result, self.source))
+        self._uncommitted += 1
+        if self._uncommitted >= self._commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self.commit()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def import_jsonl(db_path: str, results_file: str, source: Optional[str] = None) -> int:
+    """Load an existing evaluation output file into the database. Returns the number of results."""
+    count = 0
+    with ResultsStore(db_path, source or results_file, commit_every=1000) as store:
+        for result in jsonl_io.iter_jsonl(results_file):
+            store.add(result)
+            count += 1
+    return count
+
+
+def _source_filter(source: Optional[str]) -> Tuple[str, Tuple]:
+    return ("WHERE source = ?", (source,)) if source else ("", ())
+
+
+def _rate(success: int, total: int) -> str:
+    return f"{success}/{total} ({success / total * 100:.1f}%)" if total else "0/0"
+
+
+def report_overall(conn: sqlite3.Connection, source: Optional[str] = None):
+    where, params = _source_filter(source)
+    print("== 总体成功率 ==")
+    for row_source, success, total in conn.execute(
+            f"SELECT source, SUM(overall_success), COUNT(*) FROM questions {where} GROUP BY source ORDER BY source",
+            params):
+        print(f"{row_source}: {_rate(success, total)}")
+
+
+def report_turns(conn: sqlite3.Connection, source: Optional[str] = None):
+    where, params = _source_filter(source)
+    print("== 每轮成功率 ==")
+    rows = conn.execute(
+        f"SELECT source, turn, SUM(turn_success), COUNT(*) FROM ("
+        f"  SELECT source, question_id, turn, MAX(turn_success) AS turn_success FROM constraints {where}"
+        f"  GROUP BY source, question_id, turn"
+        f") GROUP BY source, turn ORDER BY source, turn", params)
+    for row_source, turn, success, total in rows:
+        print(f"{row_source} 第{turn}轮: {_rate(success, total)}")
+
+
+def report_constraints(conn: sqlite3.Connection, source: Optional[str] = None):
+    where, params = _source_filter(source)
+    print("== 每类约束通过率 ==")
+    rows = conn.execute(
+        f"SELECT source, constraint_type, SUM(success), COUNT(success), COUNT(*) FROM constraints {where}"
+        f" GROUP BY source, constraint_type ORDER BY source, COUNT(*) DESC", params)
+    for row_source, constraint_type, success, judged, total in rows:
+        unjudged = f"，{total - judged} 条无结果" if total != judged else ""
+        print(f"{row_source} {constraint_type}: {_rate(success or 0, judged)}{unjudged}")
+
+
+def report_runtime(conn: sqlite3.Connection, source: Optional[str] = None):
+    where, params = _source_filter(source)
+    print("== 运行结果（每轮代码） ==")
+    condition = f"{where} AND" if where else "WHERE"
+    rows = conn.execute(
+        f"SELECT source, turn, COUNT(*), SUM(runtime_success), AVG(execution_time), AVG(memory_usage),"
+        f"       SUM(passed), SUM(total) FROM ("
+        f"  SELECT source, question_id, turn, MAX(runtime_success) AS runtime_success,"
+        f"         MAX(execution_time) AS execution_time, MAX(memory_usage) AS memory_usage,"
+        f"         MAX(passed) AS passed, MAX(total) AS total"
+        f"  FROM constraints {condition} runtime_success IS NOT NULL GROUP BY source, question_id, turn"
+        f") GROUP BY source, turn ORDER BY source, turn", params)
+    for row_source, turn, count, success, exec_time, memory, passed, total in rows:
+        exec_time = f"{exec_time:.1f} ms" if exec_time is not None else "-"
+        memory = f"{memory:.0f} KB" if memory is not None else "-"
+        print(f"{row_source} 第{turn}轮: 运行成功 {_rate(success, count)}，测试用例 {_rate(passed or 0, total or 0)}，"
+              f"平均时间 {exec_time}，平均内存 {memory}")
+
+
+REPORTS = {
+    "overall": report_overall,
+    "turn": report_turns,
+    "constraint": report_constraints,
+    "runtime": report_runtime,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import evaluation results into SQLite and print reports")
+    parser.add_argument("db_path", help="SQLite database file (see evaluation_all_turn.py --results_db)")
+    parser.add_argument("--import", dest="import_files", nargs="*", default=[],
+                        help="Evaluation output JSONL files to import before reporting")
+    parser.add_argument("--source", type=str, default=None,
+                        help="Source name for --import (default: the file path), or the source to report on")
+    parser.add_argument("--report", choices=["all"] + list(REPORTS), default="all", help="Report to print")
+    args = parser.parse_args()
+
+    for results_file in args.import_files:
+        start_time = time.time()
+        count = import_jsonl(args.db_path, results_file, args.source)
+        print(f"已导入 {count} 条结果: {results_file} ({time.time() - start_time:.1f} 秒)")
+
+    conn = sqlite3.connect(args.db_path)
+    conn.executescript(_SCHEMA)
+    reports = REPORTS.values() if args.report == "all" else [REPORTS[args.report]]
+    for report in reports:
+        report(conn, args.source)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Asyncio subprocess runner shared by the C/C++ and Java evaluators.
+
+`run_process` starts a program in its own process group (a new session on
+Unix), writes its input and drains stdout/stderr concurrently, compares stdout
+with the expected output while it streams (StreamingMatcher), optionally samples
+the program's memory, and kills the whole group on timeout, output mismatch,
+output overflow or memory limit. All of this runs as tasks of one event loop,
+so `run_batch` can drive many test case processes concurrently from a single
+thread, without per-case timer or monitor threads. `run_many` can also stop
+early: after a result for which `stop_after` returns True, or once `deadline`
+has passed, cases that have not finished are cancelled (their processes are
+killed) and reported as None.
+"""
+import asyncio
+import codecs
+import io
+import os
+import signal
+import subprocess
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+import psutil
+
+from output_compare import StreamingMatcher
+
+MAX_OUTPUT_SIZE = 10 * 1024 * 1024   # characters of stdout / stderr kept per run
+MEMORY_POLL_INTERVAL = 0.1           # seconds between memory samples
+_READ_SIZE = 65536
+_STREAM_LIMIT = 2 ** 16
+
+if os.name == 'nt':
+    _NEW_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _NEW_GROUP = {"start_new_session": True}
+
+
+class RunResult(NamedTuple):
+    returncode: Optional[int]
+    stdout: str                       # after an output mismatch only a marked prefix (StreamingMatcher.output)
+    stderr: str
+    execution_time: float             # milliseconds from start to exit
+    peak_memory: float = 0            # KB, highest sampled RSS (only with memory_limit)
+    timed_out: bool = False
+    output_mismatch: bool = False     # stopped because stdout could no longer match the expected output
+    output_truncated: bool = False    # stopped because stdout exceeded max_output
+    memory_exceeded: bool = False     # stopped because RSS exceeded memory_limit
+    spawn_error: Optional[str] = None  # the program could not be started
+
+
+class _ExitProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+    """
+    Stream protocol that also reports the exit of the process. Process.wait()
+    only returns once the pipes are closed too, which a leftover descendant can
+    delay until the timeout.
+    """
+
+    def __init__(self, loop):
+        super().__init__(limit=_STREAM_LIMIT, loop=loop)
+        self.exited = loop.create_future()
+
+    def process_exited(self):
+        super().process_exited()
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+
+def _new_decoder():
+    # Same decoding as a text-mode Popen pipe
+    return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True)
+
+
+def kill_process_group(proc) -> None:
+    """Kill a process started by run_process together with everything it spawned."""
+    if os.name == 'nt':
+        try:
+            parent = psutil.Process(proc.pid)
+            for child in parent.children(recursive=True):
+                child.kill()
+            parent.kill()
+        except psutil.Error:
+            pass
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)  # the program is the leader of its own session
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_process(command: Sequence[str], input_str: str, timeout: float,
+                      expected_output: Optional[str] = None, memory_limit: Optional[float] = None,
+                      max_output: int = MAX_OUTPUT_SIZE, cwd: Optional[str] = None) -> RunResult:
+    """
+    Run one program on one input.
+
+    Args:
+        timeout: seconds before the process group is killed
+        expected_output: when given, stdout is compared while it streams and the
+            program is killed as soon as it can no longer match
+        memory_limit: KB of RSS; when given, memory is sampled every
+            MEMORY_POLL_INTERVAL seconds and the program is killed above it
+    """
+    matcher = StreamingMatcher(expected_output.strip()) if expected_output is not None else None
+    start_time = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        transport, protocol = await loop.subprocess_exec(
+            lambda: _ExitProtocol(loop), *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, cwd=cwd, **_NEW_GROUP)
+    except OSError as e:
+        return RunResult(None, "", "", 0, spawn_error=str(e))
+    proc = asyncio.subprocess.Process(transport, protocol, loop)
+
+    stdout_chunks: List[str] = []
+    stderr_chunks: List[str] = []
+    stopped = {"mismatch": False, "truncated": False, "memory": False}
+    peak_memory = 0.0
+    end_time = None
+
+    async def write_input():
+        try:
+            if input_str:
+                proc.stdin.write(input_str.encode('utf-8', errors='replace'))
+                await proc.stdin.drain()
+            proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the program exited without reading all of its input
+
+    async def read_stdout():
+        decoder = _new_decoder()
+        size = 0
+        while True:
+            data = await proc.stdout.read(_READ_SIZE)
+            chunk = decoder.decode(data, final=not data)
+            size += len(chunk)
+            if matcher is None:
+                stdout_chunks.append(chunk)
+            elif chunk and not matcher.feed(chunk):
+                stopped["mismatch"] = True
+            if size > max_output:
+                stopped["truncated"] = True
+            if stopped["mismatch"] or stopped["truncated"]:
+                kill_process_group(proc)
+                return
+            if not data:
+                return
+
+    async def read_stderr():
+        decoder = _new_decoder()
+        size = 0
+        while True:
+            data = await proc.stderr.read(_READ_SIZE)
+            chunk = decoder.decode(data, final=not data)
+            if size < max_output:
+                stderr_chunks.append(chunk)
+            size += len(chunk)
+            if not data:
+                return
+
+    async def wait_exit():
+        nonlocal end_time
+        await asyncio.shield(protocol.exited)  # a timeout must not cancel the shared future
+        end_time = time.perf_counter()
+        # Descendants left in the group would keep the pipes open
+        kill_process_group(proc)
+
+    async def monitor_memory():
+        nonlocal peak_memory
+        try:
+            process = psutil.Process(proc.pid)
+            while proc.returncode is None:
+                current_memory = process.memory_info().rss / 1024
+                peak_memory = max(peak_memory, current_memory)
+                if current_memory > memory_limit:
+                    stopped["memory"] = True
+                    kill_process_group(proc)
+                    return
+                await asyncio.sleep(MEMORY_POLL_INTERVAL)
+        except psutil.Error:
+            pass  # the process has exited
+
+    monitor = asyncio.ensure_future(monitor_memory()) if memory_limit is not None else None
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.gather(write_input(), read_stdout(), read_stderr(), wait_exit()), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        kill_process_group(proc)
+        await protocol.exited
+    except asyncio.CancelledError:
+        kill_process_group(proc)  # run_many stopped early
+        await asyncio.shield(protocol.exited)  # let the child watcher reap it before the transport closes
+        raise
+    finally:
+        if monitor is not None:
+            monitor.cancel()
+        transport.close()
+
+    if matcher is not None:
+        stdout = matcher.output
+    else:
+        stdout = "".join(stdout_chunks)
+    if stopped["truncated"]:
+        stdout = stdout[:max_output] + "\n... [输出被截断，超过限制大小]"
+    stderr = "".join(stderr_chunks)
+    if len(stderr) > max_output:
+        stderr = stderr[:max_output] + "\n... [stderr被截断]"
+    execution_time = timeout * 1000 if timed_out else ((end_time or time.perf_counter()) - start_time) * 1000
+    return RunResult(
+        returncode=transport.get_returncode(),
+        stdout=stdout,
+        stderr=stderr,
+        execution_time=execution_time,
+        peak_memory=peak_memory,
+        timed_out=timed_out,
+        output_mismatch=stopped["mismatch"],
+        output_truncated=stopped["truncated"],
+        memory_exceeded=stopped["memory"],
+    )
+
+
+StopCondition = Callable[[int, RunResult], bool]
+
+
+async def run_many(command: Sequence[str], inputs: Sequence[str], expected_outputs: Optional[Sequence[str]],
+                   timeout: float, concurrency: int, stop_after: Optional[StopCondition] = None,
+                   deadline: Optional[float] = None, **options) -> List[Optional[RunResult]]:
+    """
+    Run a program on every input, at most `concurrency` processes at a time. Results keep the input order.
+
+    Args:
+        stop_after: called with (index, result) for every finished case; once it returns True
+            the cases still waiting or running are cancelled
+        deadline: time.monotonic() value; each case's timeout is capped at the time left, and
+            cases that would start after it are not run
+    Returns:
+        one RunResult per input, None for cases that were cancelled or not started
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    if expected_outputs is None:
+        expected_outputs = [None] * len(inputs)
+    results: List[Optional[RunResult]] = [None] * len(inputs)
+
+    async def run_one(index, input_str, expected_output):
+        async with semaphore:
+            case_timeout = timeout
+            if deadline is not None:
+                case_timeout = min(timeout, deadline - time.monotonic())
+                if case_timeout <= 0:
+                    return False
+            results[index] = await run_process(command, input_str, case_timeout,
+                                               expected_output=expected_output, **options)
+            return stop_after is not None and stop_after(index, results[index])
+
+    tasks = [asyncio.ensure_future(run_one(index, input_str, expected_output))
+             for index, (input_str, expected_output) in enumerate(zip(inputs, expected_outputs))]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            if await finished:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+
+def run(command: Sequence[str], input_str: str, timeout: float, **options) -> RunResult:
+    """Synchronous run_process."""
+    return asyncio.run(run_process(command, input_str, timeout, **options))
+
+
+def run_batch(command: Sequence[str], inputs: Sequence[str], expected_outputs: Optional[Sequence[str]] = None,
+              timeout: float = 10, concurrency: Optional[int] = None, **options) -> List[Optional[RunResult]]:
+    """
+    Synchronous run_many; `concurrency` defaults to the number of CPUs. Results are
+    only None when `stop_after` or `deadline` is given.
+    """
+    concurrency = concurrency or os.cpu_count() or 1
+    return asyncio.run(run_many(command, inputs, expected_outputs, timeout, concurrency, **options))
@@ -0,0 +1,96 @@
+"""
+语言评估器共用的测试用例运行逻辑（--fail-fast和--time-budget）
+
+run_test_cases_sequential通过评估器的run_test_case逐个运行测试用例（evaluation.py）：
+第一个用例失败或总时间预算用完后，剩余用例不再运行，计为失败（skipped_test_result）。
+时间预算是硬限制：每个用例的超时不超过剩余预算，因预算被截断的用例报告为超时。
+
+C/C++和Java用一次sandbox_runner.run_batch运行所有测试用例：early_stop_options把这两个
+选项转换为run_batch的stop_after和deadline参数，fill_skipped把被取消或未开始的用例
+替换为未执行的结果。
+"""
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# run_case(输入, 期望输出, 用例编号, 超时秒数) -> 测试用例结果
+CaseRunner = Callable[[str, str, int, float], Dict[str, Any]]
+
+
+def skipped_test_result(reason: str) -> Dict[str, Any]:
+    """未执行的测试用例结果（计为失败）"""
+    return {
+        "correct": False,
+        "output": "",
+        "expected_output": "",
+        "execution_time": 0,
+        "memory_usage": 0,
+        "error": reason,
+        "skipped": True
+    }
+
+
+def remaining_timeout(case_timeout: float, time_budget: float, start_time: float) -> float:
+    """用例超时，不超过从start_time开始的剩余时间预算（time_budget为0表示不限制）"""
+    if not time_budget:
+        return case_timeout
+    return max(0.0, min(case_timeout, time_budget - (time.time() - start_time)))
+
+
+def run_test_cases_sequential(run_case: CaseRunner, inputs: List[str], outputs: List[str], case_timeout: float,
+                              fail_fast: bool = False, time_budget: float = 0) -> List[Dict[str, Any]]:
+    """
+    顺序运行测试用例
+
+    Args:
+        run_case: 运行并打印一个测试用例，参数为(输入, 期望输出, 用例编号, 超时秒数)
+        case_timeout: 每个测试用例的运行超时（秒）
+        fail_fast: 第一个测试用例失败（答案错误/超时/出错）后不再运行剩余用例
+        time_budget: 所有测试用例的总时间预算（秒），每个用例的超时不超过剩余预算，用完后剩余用例不再运行，0表示不限制
+
+    剩余未运行的用例计为失败，返回结果的数量始终与inputs一致
+    """
+    results = []
+    start_time = time.time()
+    for i, (test_input, expected_output) in enumerate(zip(inputs, outputs)):
+        timeout = remaining_timeout(case_timeout, time_budget, start_time)
+        if timeout <= 0:
+            print(f"\n总时间预算 {time_budget} 秒已用完，剩余 {len(inputs) - i} 个测试用例计为失败")
+            results.extend(skipped_test_result("超出总时间预算，未执行") for _ in range(i, len(inputs)))
+            break
+        result = run_case(test_input, expected_output, i + 1, timeout)
+        results.append(result)
+        if fail_fast and not result['correct'] and i + 1 < len(inputs):
+            print(f"\n测试用例 #{i+1} 失败，跳过剩余 {len(inputs) - i - 1} 个测试用例")
+            results.extend(skipped_test_result("前面的测试用例失败，未执行") for _ in range(i + 1, len(inputs)))
+            break
+    return results
+
+
+def early_stop_options(fail_fast: bool, time_budget: float,
+                       is_correct: Callable[[int, Any], bool]) -> Dict[str, Any]:
+    """
+    --fail-fast和--time-budget对应的sandbox_runner.run_batch参数（时间预算从调用时开始计算）
+    is_correct(序号, 运行结果)判断一个运行完的用例是否通过
+    """
+    options = {}
+    if fail_fast:
+        options['stop_after'] = lambda index, run: not is_correct(index, run)
+    if time_budget:
+        options['deadline'] = time.monotonic() + time_budget
+    return options
+
+
+def fill_skipped(results: List[Optional[Dict[str, Any]]], fail_fast: bool) -> List[Dict[str, Any]]:
+    """把None（没有运行完的用例）替换为未执行的结果"""
+    if fail_fast and any(result is not None and not result['correct'] for result in results):
+        reason = "其他测试用例失败，未执行"
+    else:
+        reason = "超出总时间预算，未执行"
+    return [result if result is not None else skipped_test_result(reason) for result in results]
+
+
+def print_skipped(results: List[Dict[str, Any]]) -> None:
+    """打印未执行的测试用例数量及原因"""
+    skipped = [result for result in results if result.get('skipped')]
+    if skipped:
+        print(f"\n{len(skipped)} 个测试用例计为失败（{skipped[0]['error']}）")
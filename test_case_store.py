@@ -0,0 +1,155 @@
+"""
+Per-problem test case files for the evaluation scripts.
+
+`decoded_private_test_cases` can be megabytes per problem. Kept inline in the
+evaluation input it is parsed with every record and written out again as
+`test_cases.json` for the language evaluators. A store directory holds one JSON
+file per problem in the format the evaluators read with `--test-cases-file`
+(a list of {"input": ..., "output": ...}), plus `index.json` with the file name
+and number of cases of every question_id, so the evaluation only passes the
+file path on.
+
+Usage (write the store and, optionally, a copy of the input without the inline test cases):
+    python test_case_store.py input.jsonl store_dir [--strip_output input.stripped.jsonl]
+    python evaluation_all_turn.py --input_file input.stripped.jsonl --test_case_store store_dir ...
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import jsonl_io
+
+INDEX_FILE = "index.json"
+TEST_CASES_FIELD = "decoded_private_test_cases"
+
+
+def standardize_test_cases(test_cases: List[Any]) -> List[Dict[str, Any]]:
+    """Convert test cases ({input, output}, {inputs, outputs} or [input, output]) to {input, output} dicts."""
+    standardized = []
+    for tc in test_cases or []:
+        # Accept the formats found in the datasets
+        if isinstance(tc, dict):
+            if 'input' in tc and 'output' in tc:
+                standardized.append(tc)
+            elif 'inputs' in tc and 'outputs' in tc:
+                standardized.append({
+                    'input': tc['inputs'],
+                    'output': tc['outputs']
+                })
+        elif isinstance(tc, (list, tuple)) and len(tc) >= 2:
+            standardized.append({
+                'input': tc[0],
+                'output': tc[1]
+            })
+    return standardized
+
+
+def write_test_cases_file(test_cases: List[Any], path: str) -> "TestCasesFile":
+    """Write standardized test cases to `path` and return a handle to the file."""
+    standardized = standardize_test_cases(test_cases)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(standardized, f)
+    return TestCasesFile(path, len(standardized))
+
+
+class TestCasesFile:
+    """
+    Handle to a test case file in the --test-cases-file format. CodeEvaluator.run_code
+    accepts it in place of a test case list and passes the path to the language
+    evaluator without reading the file.
+    """
+
+    def __init__(self, path: str, count: int):
+        self.path = path
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load(self) -> List[Dict[str, Any]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def _file_name(question_id: str) -> str:
+    # question_id may contain path separators; the hash keeps sanitized names unique
+    safe = re.sub(r'[^\w.-]', '_', question_id)[:80]
+    digest = hashlib.sha1(question_id.encode('utf-8')).hexdigest()[:8]
+    return f"{safe}-{digest}.json"
+
+
+class TestCaseStore:
+    """Directory of per-problem test case files, indexed by question_id."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        index_path = os.path.join(directory, INDEX_FILE)
+        self._index: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+
+    def __contains__(self, question_id: str) -> bool:
+        return str(question_id) in self._index
+
+    def get(self, question_id: str) -> Optional[TestCasesFile]:
+        """Return a handle to the question's test cases, or None if the store does not have them."""
+        entry = self._index.get(str(question_id))
+        if entry is None:
+            return None
+        return TestCasesFile(os.path.join(self.directory, entry["file"]), entry["count"])
+
+    def add(self, question_id: str, test_cases: List[Any]) -> TestCasesFile:
+        os.makedirs(self.directory, exist_ok=True)
+        question_id = str(question_id)
+        file_name = _file_name(question_id)
+        handle = write_test_cases_file(test_cases, os.path.join(self.directory, file_name))
+        self._index[question_id] = {"file": file_name, "count": handle.count}
+        return handle
+
+    def save_index(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+
+
+def build_store(input_file: str, directory: str, strip_output: Optional[str] = None) -> int:
+    """Write the test cases of every record to the store. Returns the number of problems stored."""
+    store = TestCaseStore(directory)
+    count = 0
+    writer = jsonl_io.JsonlWriter(strip_output) if strip_output else None
+    try:
+        for line_num, record in enumerate(jsonl_io.iter_jsonl(input_file)):
+            question_id = str(record.get("question_id", f"question_{line_num}"))
+            if record.get(TEST_CASES_FIELD) and question_id not in store:
+                store.add(question_id, record[TEST_CASES_FIELD])
+                count += 1
+            if writer is not None:
+                record.pop(TEST_CASES_FIELD, None)
+                writer.write(record)
+    finally:
+        if writer is not None:
+            writer.close()
+        store.save_index()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the test cases of an evaluation input file to per-problem files")
+    parser.add_argument("input_file", help="Evaluation input JSONL file with decoded_private_test_cases")
+    parser.add_argument("store_dir", help="Directory for the test case files")
+    parser.add_argument("--strip_output", type=str, default=None,
+                        help="Also write the input without decoded_private_test_cases to this file")
+    args = parser.parse_args()
+
+    count = build_store(args.input_file, args.store_dir, args.strip_output)
+    print(f"已保存 {count} 道题的测试用例: {args.store_dir}")
+    if args.strip_output:
+        print(f"已写入不含测试用例的输入文件: {args.strip_output}")
+
+
+if __name__ == "__main__":
+    main()
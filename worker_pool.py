@@ -0,0 +1,118 @@
+"""
+Managed multiprocessing pool for running submissions, and reaping of leftover
+child processes.
+
+`ManagedPool` creates its `multiprocessing.Pool` lazily and keeps it across
+calls. Workers are replaced after `maxtasksperchild` tasks, so state left
+behind by executed submissions (patched modules, leaked memory) does not build
+up. A task that timed out keeps its worker busy, so callers report it with
+`mark_unhealthy` and the next `get` replaces the pool instead of handing out
+one with stuck workers.
+
+`reap_descendants` kills the processes this process started (directly or
+through its children) that are still running, and `kill_process_tree` one
+process with everything it started. Both use psutil and never touch processes
+outside that tree.
+"""
+import multiprocessing
+import multiprocessing.pool
+import os
+import threading
+from typing import Iterable, List, Optional
+
+import psutil
+
+
+def reap_descendants(exclude: Iterable[int] = (), timeout: float = 3) -> List[int]:
+    """
+    Kill every descendant of this process except the pids in `exclude` (and
+    their descendants). Returns the pids that were killed.
+    """
+    try:
+        me = psutil.Process()
+        exclude = set(exclude)
+        kept = set()
+        for pid in exclude:
+            try:
+                kept.update(child.pid for child in psutil.Process(pid).children(recursive=True))
+            except psutil.Error:
+                pass
+        targets = [child for child in me.children(recursive=True)
+                   if child.pid not in exclude and child.pid not in kept]
+    except psutil.Error:
+        return []
+    killed = []
+    for process in targets:
+        try:
+            process.kill()
+            killed.append(process.pid)
+        except psutil.Error:
+            pass
+    psutil.wait_procs(targets, timeout=timeout)
+    return killed
+
+
+def kill_process_tree(pid: int, timeout: float = 3) -> None:
+    """Kill a process and all of its descendants, including ones in other sessions or process groups."""
+    try:
+        parent = psutil.Process(pid)
+        processes = [parent] + parent.children(recursive=True)
+    except psutil.Error:
+        return
+    # The parent first, so that it cannot start new children
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(processes, timeout=timeout)
+
+
+class ManagedPool:
+    """Lazily created multiprocessing pool that is recycled after a stuck task."""
+
+    def __init__(self, processes: Optional[int] = None, maxtasksperchild: Optional[int] = None):
+        self.processes = processes or max(2, min(4, os.cpu_count() or 1))
+        self.maxtasksperchild = maxtasksperchild
+        self._pool = None
+        self._healthy = True
+        self._lock = threading.Lock()
+
+    def get(self) -> multiprocessing.pool.Pool:
+        """The pool, created on first use and replaced if it was marked unhealthy."""
+        with self._lock:
+            if self._pool is not None and not self._healthy:
+                self._shutdown()
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(processes=self.processes, maxtasksperchild=self.maxtasksperchild)
+                self._healthy = True
+            return self._pool
+
+    def mark_unhealthy(self) -> None:
+        """A task did not finish in time; its worker may be stuck, so replace the pool on the next get()."""
+        self._healthy = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._shutdown()
+
+    def _shutdown(self) -> None:
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        # Remember what the workers started before they are terminated and
+        # those processes are reparented away from us
+        descendants = []
+        for worker in multiprocessing.active_children():
+            if "PoolWorker" in worker.name:
+                try:
+                    descendants.extend(psutil.Process(worker.pid).children(recursive=True))
+                except psutil.Error:
+                    pass
+        pool.terminate()
+        pool.join()
+        for process in descendants:
+            try:
+                process.kill()
+            except psutil.Error:
+                pass